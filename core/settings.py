@@ -182,7 +182,7 @@ JAZZMIN_SETTINGS = {
     ],
 
     "hide_apps": ["auth"], 
-    "hide_models": ["core_rh.RegistroPonto"], 
+    "hide_models": ["core_rh.RegistroPonto", "core_rh.FolhaMensal", "core_rh.Job"], 
 
     
     "custom_css": "css/admin_theme.css",
@@ -228,6 +228,14 @@ JAZZMIN_UI_TWEAKS = {
 
 
 
+# Carrega o funcionário (cargo/equipe) junto com o usuário a cada requisição.
+# O ModelBackend fica na lista para as sessões abertas antes da troca (gravadas com ele) continuarem válidas;
+# logins novos já passam pelo FuncionarioBackend.
+AUTHENTICATION_BACKENDS = [
+    'core_rh.backends.FuncionarioBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 LOGIN_URL = 'login' 
 
 
@@ -262,6 +270,18 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Cache em disco dos PDFs gerados (folhas de ponto)
+PDF_CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
+
+# Arquivos dos jobs (entradas e resultados). Fora do MEDIA_ROOT: só saem pelo download autorizado
+JOBS_ARQUIVOS_DIR = os.path.join(BASE_DIR, 'jobs_arquivos')
+
+# Fila de tarefas em segundo plano (PDFs e importação de contracheques).
+# Padrão: a tarefa roda na própria requisição, porque o deploy ainda não sobe workers
+# (sem processos paralelos e sem nova tentativa: se falhar, o job termina com erro).
+# Para usar a fila, inicie os workers (python manage.py run_workers) e defina JOBS_ASSINCRONOS=True.
+JOBS_ASSINCRONOS = os.environ.get('JOBS_ASSINCRONOS', 'False') == 'True'
 CSRF_TRUSTED_ORIGINS = ['https://portalrh.dividata360.com.br']
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 SECURE_CROSS_ORIGIN_OPENER_POLICY = None
\ No newline at end of file
@@ -1,16 +1,20 @@
 import json
-import io
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 from django.contrib.auth.models import User, Group
 from django.utils.html import format_html
 from django import forms
+from django.db import models
 from django.urls import reverse, path
 from django.shortcuts import redirect, render
 from django.contrib import messages
-from django.core.files.base import ContentFile
 
-from .models import Funcionario, RegistroPonto, Cargo, Equipe, Ferias, Contracheque
+from .models import Funcionario, RegistroPonto, FolhaMensal, Cargo, Equipe, Ferias, Contracheque, Job
 from .forms import UploadLoteContrachequeForm
+from .busca import buscar_funcionarios
+from .contracheques import dividir_contracheques
+from .jobs import enfileirar
+from .perfil import perfil_acesso
 
 # Tenta importar pypdf de forma segura
 try:
@@ -21,46 +25,52 @@ except ImportError:
 
 # --- PERMISSÕES PERSONALIZADAS (RH) ---
 
-def is_rh_member(user):
-    """Retorna True se o usuário é Superuser ou membro da Equipe RH"""
-    if not user or not user.is_authenticated: return False
-    if user.is_superuser: return True
-    
-    # 1. Verifica Grupo do Django
-    if user.groups.filter(name='RH').exists(): return True
-
-    # 2. Verifica Equipe do Funcionário
-    try:
-        if hasattr(user, 'funcionario'):
-            func = user.funcionario
-            rh_names = ['RH', 'Recursos Humanos', 'Gestão de Pessoas']
-            
-            # Equipe Principal
-            if func.equipe and func.equipe.nome in rh_names: return True
-            
-            # Equipes Secundárias
-            if func.outras_equipes.filter(nome__in=rh_names).exists(): return True
-    except Exception:
-        pass
-        
-    return False
-
 class RHAccessMixin:
     """Libera acesso total para quem é do RH, independente das flags do Django Admin"""
     def has_module_permission(self, request):
-        return is_rh_member(request.user) or super().has_module_permission(request)
+        return perfil_acesso(request).eh_rh or super().has_module_permission(request)
 
     def has_view_permission(self, request, obj=None):
-        return is_rh_member(request.user) or super().has_view_permission(request, obj)
+        return perfil_acesso(request).eh_rh or super().has_view_permission(request, obj)
 
     def has_add_permission(self, request):
-        return is_rh_member(request.user) or super().has_add_permission(request)
+        return perfil_acesso(request).eh_rh or super().has_add_permission(request)
 
     def has_change_permission(self, request, obj=None):
-        return is_rh_member(request.user) or super().has_change_permission(request, obj)
+        return perfil_acesso(request).eh_rh or super().has_change_permission(request, obj)
 
     def has_delete_permission(self, request, obj=None):
-        return is_rh_member(request.user) or super().has_delete_permission(request, obj)
+        return perfil_acesso(request).eh_rh or super().has_delete_permission(request, obj)
+
+
+class ChangeListPorRelevancia(ChangeList):
+    """Na busca, lista primeiro os mais parecidos (a menos que o usuário clique numa coluna)."""
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+        if self.query and ORDER_VAR not in self.params and 'relevancia' in queryset.query.annotations:
+            return ['-relevancia', *ordering]
+        return ordering
+
+
+class BuscaFuncionarioMixin:
+    """
+    Caixa de busca do admin por nome/matrícula usando buscar_funcionarios
+    (sem acento e com índice no PostgreSQL). `campo_funcionario` é o caminho
+    até o Funcionario; `outros_campos_busca` usam o icontains comum.
+    """
+    campo_funcionario = ''
+    outros_campos_busca = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        queryset = buscar_funcionarios(
+            queryset, search_term, prefixo=self.campo_funcionario, outros_campos=self.outros_campos_busca
+        )
+        return queryset, False
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListPorRelevancia
 
 
 # --- FORMULÁRIO PERSONALIZADO ---
@@ -86,11 +96,12 @@ class FuncionarioAdminForm(forms.ModelForm):
 # --- ADMINS ---
 
 @admin.register(Funcionario)
-class FuncionarioAdmin(RHAccessMixin, admin.ModelAdmin):
+class FuncionarioAdmin(BuscaFuncionarioMixin, RHAccessMixin, admin.ModelAdmin):
     form = FuncionarioAdminForm
     list_display = ('nome_completo', 'cargo', 'equipe', 'get_local_trabalho')
     list_filter = ('local_trabalho_estado', 'equipe', 'cargo') 
-    search_fields = ('nome_completo', 'cpf', 'usuario__username', 'email')
+    search_fields = ('nome_completo', 'matricula', 'cpf', 'usuario__username', 'email')
+    outros_campos_busca = ('cpf', 'usuario__username', 'email')
     filter_horizontal = ('outras_equipes',)
     
     class Media:
@@ -182,10 +193,17 @@ class CargoAdmin(RHAccessMixin, admin.ModelAdmin):
 
 @admin.register(RegistroPonto)
 class RegistroPontoAdmin(RHAccessMixin, admin.ModelAdmin):
-    list_display = ('funcionario', 'data', 'entrada_manha', 'saida_tarde', 'status_assinaturas')
-    list_filter = ('data', 'funcionario__equipe', 'assinado_funcionario', 'assinado_gestor')
+    list_display = ('funcionario', 'data', 'entrada_manha', 'saida_tarde')
+    list_filter = ('data', 'funcionario__equipe')
     search_fields = ('funcionario__nome_completo',)
     date_hierarchy = 'data'
+
+@admin.register(FolhaMensal)
+class FolhaMensalAdmin(RHAccessMixin, admin.ModelAdmin):
+    list_display = ('funcionario', 'competencia', 'status_assinaturas', 'updated_at')
+    list_filter = ('competencia', 'funcionario__equipe', 'assinado_funcionario', 'assinado_gestor')
+    search_fields = ('funcionario__nome_completo',)
+    list_select_related = ('funcionario', 'funcionario__cargo')
     def status_assinaturas(self, obj):
         func = "✅" if obj.assinado_funcionario else "❌"
         gest = "✅" if obj.assinado_gestor else "❌"
@@ -193,14 +211,40 @@ class RegistroPontoAdmin(RHAccessMixin, admin.ModelAdmin):
     status_assinaturas.short_description = "Assinaturas"
 
 
+@admin.register(Job)
+class JobAdmin(RHAccessMixin, admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'status', 'tentativas', 'criado_por', 'created_at', 'finalizado_em')
+    list_filter = ('status', 'tipo')
+    list_select_related = ('criado_por',)
+    # Os arquivos do job ficam em armazenamento privado (sem URL): o download passa pela view do job
+    exclude = ('arquivo_entrada', 'arquivo_resultado')
+    readonly_fields = [f.name for f in Job._meta.fields if not isinstance(f, models.FileField)] + ['download']
+
+    def has_add_permission(self, request):
+        return False
+
+    def download(self, obj):
+        if obj.status == 'concluido' and (obj.arquivo_resultado or obj.tipo == 'avisos_ferias_lote'):
+            return format_html('<a href="{}">Baixar</a>', reverse('job_download', args=[obj.id]))
+        return "-"
+    download.short_description = "Resultado"
+
+
 @admin.register(Ferias)
-class FeriasAdmin(RHAccessMixin, admin.ModelAdmin):
+class FeriasAdmin(BuscaFuncionarioMixin, RHAccessMixin, admin.ModelAdmin):
     autocomplete_fields = ['funcionario'] 
     
     list_display = ('funcionario', 'periodo_aquisitivo', 'data_inicio', 'status_etapas')
     list_filter = ('status', 'abono_pecuniario')
-    search_fields = ('funcionario__nome_completo',)
+    search_fields = ('funcionario__nome_completo', 'funcionario__matricula')
+    campo_funcionario = 'funcionario__'
+    actions = ['gerar_avisos_lote']
     
+    def gerar_avisos_lote(self, request, queryset):
+        job = enfileirar('avisos_ferias_lote', {'ferias_ids': list(queryset.values_list('id', flat=True))}, usuario=request.user)
+        return redirect('acompanhar_job', job_id=job.id)
+    gerar_avisos_lote.short_description = "Gerar avisos de férias (ZIP)"
+
     def status_etapas(self, obj):
         agendado = "✅" if obj.data_inicio else "⬜"
         arquivo = "✅" if obj.arquivo_aviso else "⬜"
@@ -214,7 +258,7 @@ class FeriasAdmin(RHAccessMixin, admin.ModelAdmin):
             'classes': ('wide', 'extrapretty'), 
         }),
         ('PASSO 2: GERAR DOCUMENTO', {
-            'description': 'Clique em "Salvar e Gerar PDF" abaixo. O arquivo será baixado. Depois, faça o upload aqui.',
+            'description': 'O aviso é gerado automaticamente ao salvar o agendamento e refeito quando as datas mudam. "Salvar e Gerar PDF" baixa o arquivo.',
             'fields': ('arquivo_aviso',),
         }),
         ('PASSO 3: UPLOAD DO RECIBO', {
@@ -227,6 +271,12 @@ class FeriasAdmin(RHAccessMixin, admin.ModelAdmin):
     )
     readonly_fields = ('aviso_assinado', 'recibo_assinado')
 
+    def save_model(self, request, obj, form, change):
+        if 'arquivo_aviso' in form.changed_data:
+            # Anexado à mão: a geração automática não sobrescreve
+            obj.hash_aviso = ''
+        super().save_model(request, obj, form, change)
+
     def response_change(self, request, obj):
         if "_save_pdf" in request.POST:
             url = reverse('gerar_aviso_ferias_pdf', args=[obj.id])
@@ -304,52 +354,12 @@ class ContrachequeAdmin(RHAccessMixin, admin.ModelAdmin):
     def processar_pdf(self, arquivo, mes, ano, request):
         if not PdfReader:
             raise ImportError("Biblioteca pypdf não está instalada.")
-            
-        reader = PdfReader(arquivo)
-        funcionarios = Funcionario.objects.all()
-        
-        count_sucesso = 0
-        nao_encontrados = []
-
-        for page_num, page in enumerate(reader.pages):
-            texto_pagina = page.extract_text()
-            if not texto_pagina: 
-                texto_pagina = ""
-            texto_pagina = texto_pagina.upper()
-            
-            funcionario_encontrado = None
-
-            for func in funcionarios:
-                nome_upper = func.nome_completo.upper().strip()
-                if nome_upper and nome_upper in texto_pagina:
-                    funcionario_encontrado = func
-                    break
-            
-            if funcionario_encontrado:
-                writer = PdfWriter()
-                writer.add_page(page)
-                
-                pdf_bytes = io.BytesIO()
-                writer.write(pdf_bytes)
-                pdf_content = ContentFile(pdf_bytes.getvalue())
-                
-                filename = f"contracheque_{funcionario_encontrado.id}_{mes}_{ano}.pdf"
-
-                Contracheque.objects.update_or_create(
-                    funcionario=funcionario_encontrado,
-                    mes=mes,
-                    ano=ano,
-                    defaults={'arquivo': None}
-                )
-                
-                cc = Contracheque.objects.get(funcionario=funcionario_encontrado, mes=mes, ano=ano)
-                cc.arquivo.save(filename, pdf_content, save=True)
-                
-                count_sucesso += 1
-            else:
-                nao_encontrados.append(f"Página {page_num + 1}")
 
-        messages.success(request, f"{count_sucesso} contracheques processados e enviados com sucesso!")
+        # Roda dentro da requisição: sem processos extras (forks do servidor web)
+        resultado = dividir_contracheques(arquivo, mes, ano, processos=1)
+        nao_encontrados = [f"Página {erro['pagina']}" for erro in resultado['log_erro']]
+
+        messages.success(request, f"{len(resultado['log_sucesso'])} contracheques processados e enviados com sucesso!")
         if nao_encontrados:
             messages.warning(request, f"Atenção: Não foi possível identificar o funcionário nas páginas: {', '.join(nao_encontrados)}")
 
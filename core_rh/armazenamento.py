@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+# Pasta (dentro de MEDIA_ROOT) onde ficam os PDFs endereçados por conteúdo
+PASTA_BLOBS = 'blobs'
+
+
+def sha256_do_conteudo(conteudo):
+    """SHA-256 (hex) de um File/UploadedFile, lido em blocos."""
+    digest = hashlib.sha256()
+    for bloco in conteudo.chunks():
+        digest.update(bloco if isinstance(bloco, bytes) else bloco.encode())
+    return digest.hexdigest()
+
+
+@deconstructible
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """
+    Grava cada arquivo com o nome do próprio SHA-256, em subpastas pelos
+    primeiros caracteres do hash (blobs/ab/cd/abcd....pdf). O nome sugerido
+    pelo upload_to é ignorado, só a extensão é mantida.
+
+    Reenviar os mesmos bytes (reimportar a folha do mês, regerar um aviso de
+    férias) não grava nada de novo: o campo passa a apontar para o blob que
+    já existe. Como um blob pode ser usado por várias linhas, ele só é
+    apagado quando nenhuma ReferenciaArquivo aponta mais para ele (ver
+    models.sincronizar_referencias e models.apagar_arquivos_orfaos).
+    """
+
+    def nome_do_blob(self, digest, extensao):
+        return f"{PASTA_BLOBS}/{digest[:2]}/{digest[2:4]}/{digest}{extensao}"
+
+    def _save(self, name, content):
+        extensao = os.path.splitext(name)[1].lower()
+        nome = self.nome_do_blob(sha256_do_conteudo(content), extensao)
+        try:
+            # Reaproveitado: o mtime renovado impede a varredura de órfãos de apagá-lo antes do commit de quem o usa
+            os.utime(self.path(nome))
+            return nome
+        except FileNotFoundError:
+            pass
+
+        salvo = super()._save(nome, content)
+        if salvo != nome:
+            # Outro processo gravou o mesmo conteúdo no meio tempo: fica o dele
+            os.remove(self.path(salvo))
+        return nome
+
+
+armazenamento_por_conteudo = ArmazenamentoPorConteudo()
+
+
+@deconstructible
+class ArmazenamentoPrivado(FileSystemStorage):
+    """
+    Arquivos dos jobs (PDF da folha enviado, ZIPs e PDFs gerados) em
+    settings.JOBS_ARQUIVOS_DIR, fora do MEDIA_ROOT: não há URL pública, o
+    download passa sempre por job_download_view, que confere o dono do job.
+    """
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.JOBS_ARQUIVOS_DIR)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        if setting == 'JOBS_ARQUIVOS_DIR':
+            setting = 'MEDIA_ROOT'
+        elif setting == 'MEDIA_ROOT':
+            return
+        super()._clear_cached_properties(setting, **kwargs)
+
+    def url(self, name):
+        raise ValueError("Arquivo privado: não tem URL pública.")
+
+
+armazenamento_privado = ArmazenamentoPrivado()
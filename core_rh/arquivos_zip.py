@@ -0,0 +1,61 @@
+import io
+import zipfile
+
+# Tamanho dos blocos lidos do disco e enviados ao navegador
+TAMANHO_BLOCO = 64 * 1024
+
+
+class _SaidaZip(io.RawIOBase):
+    """
+    Destino não-pesquisável para o ZipFile: acumula o que foi escrito até o
+    gerador repassar. Sem seek, o zipfile grava tamanho/CRC depois dos dados
+    (data descriptor), então nada precisa ficar inteiro em memória.
+    """
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def coletar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def zip_em_stream(arquivos, compressao=zipfile.ZIP_STORED):
+    """
+    Gera os bytes de um ZIP aos poucos, para um StreamingHttpResponse.
+
+    `arquivos` é um iterável de (nome_no_zip, FieldFile). Cada arquivo é lido
+    em blocos; os que não existirem mais no storage são ignorados. O padrão
+    ZIP_STORED não recomprime PDFs, que já são comprimidos.
+    """
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, 'w', compressao) as arquivo_zip:
+        for nome, campo in arquivos:
+            try:
+                origem = campo.open('rb')
+            except (OSError, ValueError):
+                continue
+
+            with origem, arquivo_zip.open(nome, 'w') as destino:
+                for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                    destino.write(bloco)
+                    dados = saida.coletar()
+                    if dados:
+                        yield dados
+            dados = saida.coletar()
+            if dados:
+                yield dados
+
+    yield saida.coletar()
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class FuncionarioBackend(ModelBackend):
+    """
+    ModelBackend que, ao carregar o usuário da sessão, já traz o funcionário
+    com cargo e equipe no mesmo SELECT. Assim request.user.funcionario (e
+    funcionario_logado) não custam consultas extras nas views.
+    """
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related(
+                'funcionario__cargo', 'funcionario__equipe'
+            ).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
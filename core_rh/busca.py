@@ -0,0 +1,84 @@
+"""
+Busca de funcionários por nome ou matrícula.
+
+No PostgreSQL a busca ignora acentos ("antonio" acha "Antônio"), tolera erros
+de digitação e usa os índices GIN de trigramas criados na migração 0016 sobre
+core_rh_unaccent(lower(campo)). As expressões abaixo precisam ser idênticas às
+dos índices, senão o banco volta a varrer a tabela inteira.
+
+Em outros bancos (SQLite dos testes) cai num icontains simples.
+"""
+import unicodedata
+
+from django.db import connections
+from django.db.models import BooleanField, Case, CharField, FloatField, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Lower
+from django.db.models.lookups import Contains
+
+
+def normalizar(texto):
+    """Minúsculas, sem acento e com espaços simples: o mesmo formato guardado no índice."""
+    sem_acento = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acento.lower().split())
+
+
+class SemAcento(Func):
+    """core_rh_unaccent(lower(campo)), a expressão indexada."""
+    function = 'core_rh_unaccent'
+    output_field = CharField()
+
+    def __init__(self, campo):
+        super().__init__(Lower(campo))
+
+
+class SimilaridadePalavra(Func):
+    """word_similarity(termo, campo): 0 a 1, quanto o termo se parece com algum trecho do campo."""
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+class PalavraParecida(Func):
+    """termo <% campo: o campo tem um trecho parecido com o termo (operador atendido pelo índice)."""
+    template = '(%(expressions)s)'
+    arg_joiner = ' <%% '
+    output_field = BooleanField()
+
+
+def buscar_funcionarios(queryset, termo, prefixo='', outros_campos=()):
+    """
+    Filtra `queryset` pelo nome ou matrícula do funcionário e anota
+    `relevancia` (inteiro de 0 a 1000, maior = mais parecido), usada para
+    ordenar os resultados.
+
+    `prefixo` é o caminho até o Funcionario quando o queryset é de outro
+    modelo (ex.: 'funcionario__' para Ferias). `outros_campos` entram na busca
+    com icontains comum (CPF, e-mail...).
+    """
+    termo = termo.strip()
+    extras = Q()
+    for campo in outros_campos:
+        extras |= Q(**{f'{campo}__icontains': termo})
+
+    if connections[queryset.db].vendor != 'postgresql':
+        nome, matricula = f'{prefixo}nome_completo', f'{prefixo}matricula'
+        return queryset.filter(
+            Q(**{f'{nome}__icontains': termo}) | Q(**{f'{matricula}__icontains': termo}) | extras
+        ).annotate(relevancia=Case(
+            When(Q(**{f'{matricula}__iexact': termo}) | Q(**{f'{nome}__istartswith': termo}), then=Value(1000)),
+            default=Value(500),
+            output_field=IntegerField(),
+        ))
+
+    termo = normalizar(termo)
+    nome = SemAcento(f'{prefixo}nome_completo')
+    matricula = SemAcento(f'{prefixo}matricula')
+
+    return queryset.filter(
+        Contains(nome, termo) | Contains(matricula, termo) | PalavraParecida(Value(termo), nome) | extras
+    ).annotate(relevancia=Cast(
+        Greatest(
+            SimilaridadePalavra(Value(termo), nome),
+            Coalesce(SimilaridadePalavra(Value(termo), matricula), Value(0.0)),
+        ) * 1000,
+        IntegerField(),
+    ))
@@ -0,0 +1,381 @@
+import io
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+import django
+from django.core.files.base import ContentFile, File
+
+from .busca import normalizar
+from .models import Contracheque, Funcionario, apagar_se_orfaos, sincronizar_referencias
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None
+    PdfWriter = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+
+class ArquivoInvalido(Exception):
+    """O PDF enviado não pôde ser aberto."""
+
+
+# CPF com ou sem pontuação e "Matrícula: 123" no texto normalizado (minúsculo, sem acento)
+RE_CPF = re.compile(r'(?<!\d)(\d{3})\.?(\d{3})\.?(\d{3})-?(\d{2})(?!\d)')
+RE_MATRICULA = re.compile(r'\bmatr(?:icula)?\b\.?\s*:?\s*([a-z0-9][a-z0-9./-]*)')
+
+
+class _Automato:
+    """
+    Aho-Corasick: acha todas as ocorrências de muitos padrões numa passada só
+    pelo texto, em vez de um `padrao in texto` por padrão.
+    """
+    def __init__(self, padroes):
+        self._proximo = [{}]
+        self._falha = [0]
+        self._saidas = [()]
+
+        for padrao, valor in padroes.items():
+            no = 0
+            for letra in padrao:
+                if letra not in self._proximo[no]:
+                    self._proximo[no][letra] = len(self._proximo)
+                    self._proximo.append({})
+                    self._falha.append(0)
+                    self._saidas.append(())
+                no = self._proximo[no][letra]
+            self._saidas[no] = ((len(padrao), valor),)
+
+        # Links de falha em largura: o maior sufixo do caminho que também é prefixo de algum padrão
+        fila = deque(self._proximo[0].values())
+        while fila:
+            no = fila.popleft()
+            for letra, filho in self._proximo[no].items():
+                fila.append(filho)
+                falha = self._falha[no]
+                while falha and letra not in self._proximo[falha]:
+                    falha = self._falha[falha]
+                destino = self._proximo[falha].get(letra, 0)
+                self._falha[filho] = destino if destino != filho else 0
+                self._saidas[filho] += self._saidas[self._falha[filho]]
+
+    def ocorrencias(self, texto):
+        """Gera (inicio, fim, valor) de cada padrão encontrado."""
+        proximo, falha, saidas = self._proximo, self._falha, self._saidas
+        no = 0
+        for fim, letra in enumerate(texto, 1):
+            while no and letra not in proximo[no]:
+                no = falha[no]
+            no = proximo[no].get(letra, 0)
+            for tamanho, valor in saidas[no]:
+                yield fim - tamanho, fim, valor
+
+
+class IdentificadorFuncionarios:
+    """
+    Descobre de quem é uma página de holerite. Montado uma vez por importação.
+
+    CPF e matrícula encontrados no texto têm prioridade; senão vale o nome
+    completo encontrado (palavras inteiras, sem acento). Um nome que aparece
+    só dentro de outro maior é ignorado, para que "ANA SILVA" não fique com a
+    página de "ANA SILVA SOUZA". Se sobrar mais de um candidato (homônimos ou
+    duas pessoas citadas na página), a página é recusada como ambígua.
+    """
+    def __init__(self, funcionarios):
+        self.por_cpf = {}
+        self.por_matricula = {}
+        por_nome = {}
+        for func in funcionarios:
+            nome = normalizar(func.nome_completo or '')
+            if nome:
+                por_nome.setdefault(nome, []).append(func)
+            cpf = re.sub(r'\D', '', func.cpf or '')
+            if cpf:
+                self.por_cpf[cpf] = func
+            if func.matricula:
+                self.por_matricula[normalizar(func.matricula)] = func
+        self._automato = _Automato(por_nome)
+
+    def _por_nome(self, texto):
+        encontrados = []
+        for inicio, fim, funcs in self._automato.ocorrencias(texto):
+            # Só palavras inteiras: "ANA SILVA" não casa dentro de "JOANA SILVA"
+            if (inicio and texto[inicio - 1].isalnum()) or (fim < len(texto) and texto[fim].isalnum()):
+                continue
+            encontrados.append((inicio, fim, funcs))
+        # Nome contido num nome maior encontrado no mesmo trecho ("ANA SILVA" dentro de "ANA SILVA SOUZA") sai;
+        # dois nomes em trechos diferentes continuam os dois (e a página fica ambígua)
+        candidatos = {}
+        for inicio, fim, funcs in encontrados:
+            if any(i <= inicio and fim <= f and f - i > fim - inicio for i, f, _ in encontrados):
+                continue
+            for func in funcs:
+                candidatos[func.pk] = func
+        return list(candidatos.values())
+
+    def identificar(self, texto):
+        """Retorna (funcionario, None) ou (None, motivo) para o log de erros."""
+        texto = normalizar(texto)
+
+        documentos = {}
+        for partes in RE_CPF.findall(texto):
+            func = self.por_cpf.get(''.join(partes))
+            if func:
+                documentos[func.pk] = func
+        for matricula in RE_MATRICULA.findall(texto):
+            func = self.por_matricula.get(matricula.rstrip('./-'))
+            if func:
+                documentos[func.pk] = func
+        if len(documentos) == 1:
+            return next(iter(documentos.values())), None
+
+        candidatos = self._por_nome(texto)
+        if documentos:
+            # Vários CPFs/matrículas na página: desempata pelo nome
+            candidatos = [f for f in candidatos if f.pk in documentos] or list(documentos.values())
+
+        if len(candidatos) == 1:
+            return candidatos[0], None
+        if not candidatos:
+            return None, 'Nome não encontrado no texto.'
+        nomes = ', '.join(sorted(f.nome_completo for f in candidatos))
+        return None, f'Mais de um funcionário encontrado ({nomes}).'
+
+
+# --- LEITURA DO PDF (DISCO + MMAP) E EXTRAÇÃO DE TEXTO EM PARALELO ---
+
+# Abaixo disso não compensa subir processos
+MIN_PAGINAS_PARALELO = 8
+# Intervalo mínimo (segundos) entre duas gravações de progresso
+INTERVALO_PROGRESSO = 1.0
+
+
+def _caminho_local(arquivo):
+    """Caminho em disco do arquivo, quando já existe um (upload grande ou FileField em storage local)."""
+    if hasattr(arquivo, 'temporary_file_path'):
+        return arquivo.temporary_file_path()
+    try:
+        caminho = arquivo.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
+    return caminho if os.path.exists(caminho) else None
+
+
+@contextmanager
+def arquivo_em_disco(arquivo):
+    """
+    Entrega um caminho em disco para o PDF (os processos abrem por ele).
+    Se o arquivo só existe em memória ou num storage remoto, é copiado em
+    blocos para um temporário, apagado no final.
+    """
+    caminho = _caminho_local(arquivo)
+    if caminho:
+        yield caminho
+        return
+
+    descritor, caminho = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(descritor, 'wb') as destino:
+            arquivo.seek(0)
+            shutil.copyfileobj(arquivo, destino)
+        yield caminho
+    finally:
+        os.remove(caminho)
+
+
+@contextmanager
+def pdf_mapeado(caminho):
+    """
+    PdfReader sobre o arquivo mapeado em memória (mmap): as páginas são lidas
+    do disco sob demanda, sem carregar o PDF inteiro na memória do processo.
+    """
+    with open(caminho, 'rb') as arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+        yield PdfReader(dados)
+
+
+def _texto_da_pagina(pagina):
+    try:
+        return pagina.extract_text() or ""
+    except Exception:
+        return ""
+
+
+def _extrair_intervalo(caminho, inicio, fim):
+    with pdf_mapeado(caminho) as reader:
+        return [_texto_da_pagina(reader.pages[i]) for i in range(inicio, fim)]
+
+
+def extrair_textos(caminho, total_paginas, processos=None):
+    """
+    Gera o texto de cada página do PDF em `caminho`, na ordem das páginas.
+
+    extract_text() é Python puro e pesado: as páginas são divididas em faixas
+    entre processos (um por núcleo). Cada faixa é entregue assim que fica
+    pronta, então quem consome já trabalha enquanto as seguintes são extraídas.
+    Os processos não usam o banco.
+    """
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or total_paginas <= MIN_PAGINAS_PARALELO:
+        with pdf_mapeado(caminho) as reader:
+            for i in range(total_paginas):
+                yield _texto_da_pagina(reader.pages[i])
+        return
+
+    # Várias faixas por processo equilibram páginas mais lentas que outras
+    tamanho = max(1, -(-total_paginas // (processos * 4)))
+    faixas = [(inicio, min(inicio + tamanho, total_paginas)) for inicio in range(0, total_paginas, tamanho)]
+
+    contexto = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    with ProcessPoolExecutor(max_workers=min(processos, len(faixas)), mp_context=contexto,
+                             initializer=django.setup) as pool:
+        futuros = [pool.submit(_extrair_intervalo, caminho, inicio, fim) for inicio, fim in faixas]
+        for futuro in futuros:
+            yield from futuro.result()
+
+
+def salvar_pagina(campo, nome_arquivo, pagina, save=True):
+    """Grava uma página como PDF próprio no FileField, passando por um temporário em disco."""
+    writer = PdfWriter()
+    writer.add_page(pagina)
+    with tempfile.TemporaryFile() as saida:
+        writer.write(saida)
+        saida.seek(0)
+        campo.save(nome_arquivo, File(saida), save=save)
+
+
+# --- DIVISÃO DO PDF DA FOLHA (usada pelo painel do RH e pelo admin) ---
+
+def dividir_contracheques(arquivo, mes, ano, progresso=None, processos=None):
+    """
+    Separa o PDF com os holerites do mês em um Contracheque por funcionário,
+    identificado pelo CPF/matrícula ou nome completo no texto de cada página
+    (ver IdentificadorFuncionarios).
+
+    Os arquivos vão para o storage à medida que as páginas são lidas; os
+    registros são gravados no final com um único bulk_create (upsert em
+    funcionario/mes/ano). Num contracheque que já existia só o arquivo muda:
+    a ciência do funcionário é mantida. Se a mesma pessoa aparecer em mais
+    de uma página, vale a última. Reimportar o mesmo PDF não grava nada de
+    novo no disco (ver armazenamento.ArmazenamentoPorConteudo).
+
+    `progresso(paginas_feitas, total_paginas, encontradas, nao_encontradas)`
+    é chamado no máximo a cada INTERVALO_PROGRESSO segundos e no final.
+    `processos` vai para extrair_textos (1 = sem fork, para rodar dentro da requisição).
+
+    Retorna um dict com total_paginas, criados, atualizados, log_sucesso e
+    log_erro (as listas no formato usado por upload_log.html).
+    """
+    with arquivo_em_disco(arquivo) as caminho, ExitStack() as pilha:
+        try:
+            reader = pilha.enter_context(pdf_mapeado(caminho))
+            total_paginas = len(reader.pages)
+        except Exception as e:
+            raise ArquivoInvalido(f"Arquivo inválido ou corrompido: {str(e)}")
+
+        identificador = IdentificadorFuncionarios(Funcionario.objects.only('id', 'nome_completo', 'cpf', 'matricula'))
+        existentes = set(Contracheque.objects.filter(mes=mes, ano=ano).values_list('funcionario_id', flat=True))
+        novos = {}
+        log_sucesso = []
+        log_erro = []
+        descartados = []
+        ultimo_aviso = time.monotonic()
+
+        for i, texto in enumerate(extrair_textos(caminho, total_paginas, processos)):
+            func, motivo = identificador.identificar(texto)
+            if func is None:
+                log_erro.append({
+                    'pagina': i + 1,
+                    'motivo': motivo
+                })
+            else:
+                anterior = novos.get(func.pk)
+                if anterior is not None:
+                    # Página repetida da mesma pessoa: o arquivo gravado antes pode sobrar
+                    descartados.append(anterior.arquivo.name)
+
+                cc = Contracheque(funcionario=func, mes=mes, ano=ano)
+                salvar_pagina(cc.arquivo, f"holerite_{func.id}_{mes}_{ano}.pdf", reader.pages[i], save=False)
+                novos[func.pk] = cc
+
+                log_sucesso.append({
+                    'pagina': i + 1,
+                    'funcionario_id': func.pk,
+                    'nome': func.nome_completo,
+                    'status': 'Atualizado' if func.pk in existentes or anterior is not None else 'Criado'
+                })
+
+            if progresso and time.monotonic() - ultimo_aviso >= INTERVALO_PROGRESSO:
+                progresso(i + 1, total_paginas, len(log_sucesso), len(log_erro))
+                ultimo_aviso = time.monotonic()
+
+    Contracheque.objects.bulk_create(
+        novos.values(),
+        update_conflicts=True,
+        unique_fields=['funcionario', 'mes', 'ano'],
+        update_fields=['arquivo'],
+    )
+    sincronizar_referencias(list(novos.values()), campos=['arquivo'])
+    apagar_se_orfaos(descartados)
+
+    if progresso:
+        progresso(total_paginas, total_paginas, len(log_sucesso), len(log_erro))
+    return {
+        'total_paginas': total_paginas,
+        'criados': len(novos.keys() - existentes),
+        'atualizados': len(novos.keys() & existentes),
+        'log_sucesso': log_sucesso,
+        'log_erro': log_erro,
+    }
+
+
+# --- MINIATURA (PRIMEIRA PÁGINA EM PNG) PARA "MEUS CONTRACHEQUES" ---
+
+LARGURA_MINIATURA = 480
+
+
+def miniatura_png(caminho):
+    """PNG da primeira página do PDF, com LARGURA_MINIATURA pixels de largura."""
+    documento = pypdfium2.PdfDocument(caminho)
+    try:
+        pagina = documento[0]
+        imagem = pagina.render(scale=LARGURA_MINIATURA / pagina.get_width()).to_pil()
+    finally:
+        documento.close()
+
+    saida = io.BytesIO()
+    imagem.save(saida, 'PNG', optimize=True)
+    return saida.getvalue()
+
+
+def obter_miniatura(contracheque):
+    """
+    Miniatura do contracheque, gerada na primeira vez que alguém pede e de
+    novo só se o PDF mudar (reimportação com outro conteúdo). Retorna None
+    se não houver PDF ou se o pypdfium2 não estiver instalado.
+    """
+    if not contracheque.arquivo:
+        return None
+    if contracheque.miniatura and contracheque.miniatura_origem == contracheque.arquivo.name:
+        return contracheque.miniatura
+    if pypdfium2 is None:
+        return None
+
+    with contracheque.arquivo.open('rb') as arquivo, arquivo_em_disco(arquivo) as caminho:
+        png = miniatura_png(caminho)
+
+    contracheque.miniatura.save(f"miniatura_{contracheque.mes}_{contracheque.ano}.png", ContentFile(png), save=False)
+    contracheque.miniatura_origem = contracheque.arquivo.name
+    contracheque.save(update_fields=['miniatura', 'miniatura_origem'])
+    return contracheque.miniatura
@@ -0,0 +1,386 @@
+"""
+Fila de tarefas em segundo plano guardada no próprio banco (modelo Job).
+
+As views chamam enfileirar() e respondem na hora; os processos iniciados
+por `python manage.py run_workers` pegam os jobs com
+SELECT ... FOR UPDATE SKIP LOCKED, então vários workers nunca executam o
+mesmo job. Falhas são repetidas até max_tentativas, com espera crescente.
+"""
+import logging
+import os
+import tempfile
+import traceback
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .contracheques import ArquivoInvalido, dividir_contracheques
+from .models import (
+    Equipe, Ferias, Funcionario, Job, apagar_arquivos_orfaos, apagar_se_orfaos, sincronizar_referencias,
+)
+from .pdf import (
+    aviso_ferias_pdf, avisos_ferias_em_paralelo, chave_aviso_ferias, folha_ponto_pdf, folhas_ponto_zip,
+    nome_arquivo_aviso_ferias, nome_arquivo_folha,
+)
+
+logger = logging.getLogger(__name__)
+
+# Job em 'executando' sem sinal de vida há mais tempo que isso ficou órfão (worker morreu) e volta para a fila
+TEMPO_MAXIMO_EXECUCAO = timedelta(minutes=15)
+# Espera antes de tentar de novo (multiplicada pelo número da tentativa)
+INTERVALO_RETENTATIVA = timedelta(seconds=30)
+# Jobs finalizados (e seus arquivos) são apagados depois desse prazo
+DIAS_RETENCAO = 7
+# Intervalo mínimo entre duas limpezas feitas por enfileirar() neste processo
+INTERVALO_LIMPEZA = timedelta(hours=1)
+_ultima_limpeza = None
+
+
+class ErroDefinitivo(Exception):
+    """Falha que não adianta repetir (registro apagado, arquivo inválido...)."""
+
+
+# --- REGISTRO DAS TAREFAS ---
+
+TAREFAS = {}
+
+
+def tarefa(tipo):
+    """Registra a função que executa os jobs de um tipo. Ela recebe o Job e retorna o 'resultado' (JSON)."""
+    def registrar(funcao):
+        TAREFAS[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def anexar_resultado(job, nome_arquivo, conteudo):
+    """Guarda o arquivo gerado pelo job (bytes ou arquivo aberto) para download em job_download_view."""
+    job.nome_arquivo = nome_arquivo
+    extensao = os.path.splitext(nome_arquivo)[1] or '.pdf'
+    conteudo = ContentFile(conteudo) if isinstance(conteudo, bytes) else File(conteudo)
+    # O nome gravado é aleatório (models.job_resultado_path); o do download fica em job.nome_arquivo
+    job.arquivo_resultado.save(f"resultado{extensao}", conteudo, save=False)
+
+
+def registrar_progresso(job, concluidos, total, detalhes=None):
+    """
+    Atualiza o percentual exibido na tela de espera e serve de sinal de vida do worker.
+    `detalhes` (dict) fica em job.resultado enquanto o job roda e é repassado por job_status_view.
+    """
+    job.progresso = int(concluidos * 100 / total) if total else 100
+    job.atualizado_em = timezone.now()
+    campos = {'progresso': job.progresso, 'atualizado_em': job.atualizado_em}
+    if detalhes is not None:
+        job.resultado = campos['resultado'] = detalhes
+    Job.objects.filter(pk=job.pk).update(**campos)
+
+
+# --- FILA ---
+
+def enfileirar(tipo, parametros=None, usuario=None, arquivo_entrada=None, max_tentativas=3):
+    """Cria um Job pendente. Com JOBS_ASSINCRONOS=False ele é executado na hora, uma vez só e sem processos extras."""
+    if tipo not in TAREFAS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    _limpar_se_preciso()
+
+    job = Job(
+        tipo=tipo,
+        parametros=parametros or {},
+        max_tentativas=max_tentativas,
+        criado_por=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    if arquivo_entrada is not None:
+        job.arquivo_entrada.save(arquivo_entrada.name, arquivo_entrada, save=False)
+    job.save()
+
+    if not getattr(settings, 'JOBS_ASSINCRONOS', False):
+        reservado = _reservar(Job.objects.filter(pk=job.pk))
+        if reservado:
+            reservado.na_requisicao = True
+            executar(reservado)
+        job.refresh_from_db()
+    return job
+
+
+def _processos(job):
+    """Processos para as tarefas de lote: dentro da requisição não se cria nenhum (o fork seria do servidor web)."""
+    return 1 if getattr(job, 'na_requisicao', False) else None
+
+
+def _reservar(candidatos):
+    agora = timezone.now()
+    with transaction.atomic():
+        job = candidatos.select_for_update(skip_locked=True).first()
+        if job is None:
+            return None
+        job.status = 'executando'
+        job.tentativas += 1
+        job.iniciado_em = job.atualizado_em = agora
+        job.progresso = 0
+        job.save(update_fields=['status', 'tentativas', 'iniciado_em', 'atualizado_em', 'progresso'])
+    return job
+
+
+def proximo_job():
+    """Reserva o próximo job disponível para este worker (ou None se a fila estiver vazia)."""
+    agora = timezone.now()
+    return _reservar(
+        Job.objects.filter(
+            Q(status='pendente', executar_apos__lte=agora)
+            | Q(status='executando', atualizado_em__lt=agora - TEMPO_MAXIMO_EXECUCAO)
+        ).order_by('executar_apos', 'id')
+    )
+
+
+def _finalizar(job, status, erro=''):
+    job.status = status
+    job.erro = erro
+    job.finalizado_em = job.atualizado_em = timezone.now()
+    if status == 'concluido':
+        job.progresso = 100
+    job.save(update_fields=[
+        'status', 'erro', 'resultado', 'arquivo_entrada', 'arquivo_resultado', 'nome_arquivo',
+        'finalizado_em', 'atualizado_em', 'progresso',
+    ])
+    return job
+
+
+def executar(job):
+    """Roda um job já reservado e grava o status final (ou agenda nova tentativa)."""
+    if job.tentativas > job.max_tentativas:
+        return _finalizar(job, 'erro', "Tarefa interrompida: o worker parou durante a execução.")
+
+    funcao = TAREFAS.get(job.tipo)
+    if funcao is None:
+        return _finalizar(job, 'erro', f"Tipo de tarefa desconhecido: {job.tipo}")
+
+    try:
+        job.resultado = funcao(job)
+    except ErroDefinitivo as e:
+        return _finalizar(job, 'erro', str(e))
+    except Exception:
+        logger.exception("Falha no job %s (tentativa %s)", job.pk, job.tentativas)
+        erro = traceback.format_exc()
+        # Executado na requisição não há worker para a nova tentativa: a tela de espera ficaria rodando para sempre
+        if job.tentativas >= job.max_tentativas or getattr(job, 'na_requisicao', False):
+            return _finalizar(job, 'erro', erro)
+        job.status = 'pendente'
+        job.erro = erro
+        job.executar_apos = timezone.now() + INTERVALO_RETENTATIVA * job.tentativas
+        job.save(update_fields=['status', 'erro', 'executar_apos'])
+        return job
+
+    return _finalizar(job, 'concluido')
+
+
+def limpar_jobs_antigos(dias=DIAS_RETENCAO):
+    """Apaga jobs finalizados há mais de `dias` dias; os arquivos saem pelo signal_job_apagado."""
+    global _ultima_limpeza
+    _ultima_limpeza = timezone.now()
+    antigos = Job.objects.filter(status__in=['concluido', 'erro'], finalizado_em__lt=timezone.now() - timedelta(days=dias))
+    return antigos.delete()[1].get(Job._meta.label, 0)
+
+
+def _limpar_se_preciso():
+    # Sem run_workers (JOBS_ASSINCRONOS=False) ninguém chama as limpezas: a própria fila faz isso de hora em hora
+    if _ultima_limpeza is None or timezone.now() - _ultima_limpeza >= INTERVALO_LIMPEZA:
+        try:
+            limpar_jobs_antigos()
+            apagar_arquivos_orfaos()
+        except Exception:
+            logger.exception("Erro ao apagar jobs antigos e arquivos órfãos")
+
+
+# --- TAREFAS ---
+
+@tarefa('folha_ponto_pdf')
+def _tarefa_folha_ponto(job):
+    p = job.parametros
+    try:
+        funcionario = Funcionario.objects.select_related('cargo', 'equipe', 'usuario').get(pk=p['funcionario_id'])
+    except Funcionario.DoesNotExist:
+        raise ErroDefinitivo("Funcionário não encontrado.")
+
+    anexar_resultado(job, nome_arquivo_folha(funcionario, p['mes'], p['ano']), folha_ponto_pdf(funcionario, p['mes'], p['ano']))
+
+
+def aviso_ferias_atualizado(ferias, chave=None):
+    """O arquivo_aviso guardado vale para os dados atuais? Aviso anexado à mão (sem hash) é mantido."""
+    if not ferias.arquivo_aviso:
+        return False
+    return not ferias.hash_aviso or ferias.hash_aviso == (chave or chave_aviso_ferias(ferias))
+
+
+def _gravar_avisos(novos):
+    """
+    Aponta arquivo_aviso para os avisos recém-gerados, `novos` = {ferias_id:
+    (chave, nome do arquivo já gravado no storage)}. As linhas são relidas
+    travadas: enquanto o WeasyPrint rodava, o RH pode ter anexado um arquivo
+    à mão ou outro job pode ter gerado o mesmo aviso, e esses ficam.
+    Retorna ({ferias_id: Ferias atual}, [férias que receberam o novo aviso]).
+    """
+    atuais, gerados = {}, []
+    with transaction.atomic():
+        for atual in Ferias.objects.select_for_update().filter(pk__in=novos).order_by('pk'):
+            atuais[atual.pk] = atual
+            chave, nome = novos[atual.pk]
+            if not aviso_ferias_atualizado(atual, chave):
+                atual.arquivo_aviso.name = nome
+                atual.hash_aviso = chave
+                gerados.append(atual)
+
+        # bulk_update não dispara post_save: as referências dos arquivos são atualizadas à parte
+        Ferias.objects.bulk_update(gerados, ['arquivo_aviso', 'hash_aviso'])
+        sincronizar_referencias(gerados)
+        # Aviso recusado (ou férias apagadas no meio tempo): o arquivo gravado fica sem dono
+        usados = {f.pk for f in gerados}
+        apagar_se_orfaos(nome for ferias_id, (chave, nome) in novos.items() if ferias_id not in usados)
+    return atuais, gerados
+
+
+def enfileirar_aviso_ferias(ferias_id, usuario=None, baixar=False):
+    """
+    Agenda a geração do aviso. Se já houver um job pendente para as mesmas
+    férias (ex.: o do signal, logo depois de salvar), ele é reaproveitado.
+    """
+    pendente = Job.objects.filter(tipo='aviso_ferias_pdf', status='pendente', parametros__ferias_id=ferias_id).first()
+    if pendente is not None:
+        if not baixar or pendente.parametros.get('baixar'):
+            return pendente
+        parametros = dict(pendente.parametros, baixar=True)
+        if Job.objects.filter(pk=pendente.pk, status='pendente').update(parametros=parametros):
+            return pendente
+    return enfileirar('aviso_ferias_pdf', {'ferias_id': ferias_id, 'baixar': baixar}, usuario=usuario)
+
+
+@tarefa('aviso_ferias_pdf')
+def _tarefa_aviso_ferias(job):
+    try:
+        ferias = Ferias.objects.select_related('funcionario__cargo', 'funcionario__equipe').get(pk=job.parametros['ferias_id'])
+    except Ferias.DoesNotExist:
+        raise ErroDefinitivo("Férias não encontradas.")
+
+    nome_arquivo = nome_arquivo_aviso_ferias(ferias)
+    chave = chave_aviso_ferias(ferias)
+    gerado = False
+    if not aviso_ferias_atualizado(ferias, chave):
+        # WeasyPrint só roda quando algum dado do aviso mudou desde a última geração
+        arquivo = ferias.arquivo_aviso
+        arquivo.save(nome_arquivo, ContentFile(aviso_ferias_pdf(ferias)), save=False)
+        atuais, gerados = _gravar_avisos({ferias.pk: (chave, arquivo.name)})
+        if ferias.pk not in atuais:
+            raise ErroDefinitivo("Férias não encontradas.")
+        ferias, gerado = atuais[ferias.pk], bool(gerados)
+
+    if job.parametros.get('baixar'):
+        with ferias.arquivo_aviso.open('rb') as arquivo:
+            anexar_resultado(job, nome_arquivo, arquivo)
+    return {'ferias_id': ferias.pk, 'gerado': gerado}
+
+
+@tarefa('contracheques')
+def _tarefa_contracheques(job):
+    mes, ano = job.parametros['mes'], job.parametros['ano']
+    def progresso(paginas, total, encontradas, nao_encontradas):
+        registrar_progresso(job, paginas, total, {
+            'paginas': paginas, 'total_paginas': total,
+            'encontradas': encontradas, 'nao_encontradas': nao_encontradas,
+        })
+
+    try:
+        with job.arquivo_entrada.open('rb') as arquivo:
+            resultado = dividir_contracheques(arquivo, mes, ano, progresso=progresso, processos=_processos(job))
+    except ArquivoInvalido as e:
+        raise ErroDefinitivo(str(e))
+
+    # O PDF original tem os holerites de todo mundo: não fica guardado depois de dividido
+    job.arquivo_entrada.delete(save=False)
+    return {'mes': mes, 'ano': ano, **resultado}
+
+
+@tarefa('folhas_ponto_lote')
+def _tarefa_folhas_ponto_lote(job):
+    """Folhas de toda a equipe (principal ou secundária) ou da empresa inteira, num único ZIP."""
+    p = job.parametros
+    mes, ano = p['mes'], p['ano']
+    funcionarios = Funcionario.objects.filter(usuario__is_active=True)
+    nome_lote = 'Empresa'
+
+    if p.get('equipe_id'):
+        try:
+            equipe = Equipe.objects.get(pk=p['equipe_id'])
+        except Equipe.DoesNotExist:
+            raise ErroDefinitivo("Equipe não encontrada.")
+        funcionarios = funcionarios.filter(Q(equipe=equipe) | Q(outras_equipes=equipe)).distinct()
+        nome_lote = equipe.nome.strip().replace(' ', '_')
+
+    ids = list(funcionarios.order_by('nome_completo').values_list('id', flat=True))
+    if not ids:
+        raise ErroDefinitivo("Nenhum colaborador ativo encontrado.")
+
+    with tempfile.TemporaryFile() as arquivo_zip:
+        erros = folhas_ponto_zip(
+            ids, mes, ano, arquivo_zip, processos=_processos(job),
+            progresso=lambda concluidos: registrar_progresso(job, concluidos, len(ids)),
+        )
+        arquivo_zip.seek(0)
+        anexar_resultado(job, f"Folhas_{nome_lote}_{mes:02d}_{ano}.zip", arquivo_zip)
+
+    return {'total': len(ids), 'geradas': len(ids) - len(erros), 'erros': erros}
+
+
+@tarefa('avisos_ferias_lote')
+def _tarefa_avisos_ferias_lote(job):
+    """
+    Avisos de todas as férias que começam no mês (ou das selecionadas no
+    admin), gerados em paralelo e guardados em arquivo_aviso. O ZIP não é
+    montado aqui: job_download_view lê os arquivos guardados em stream.
+    """
+    p = job.parametros
+    ferias_qs = Ferias.objects.select_related('funcionario__cargo', 'funcionario__equipe')
+    if p.get('ferias_ids'):
+        ferias_qs = ferias_qs.filter(pk__in=p['ferias_ids'])
+        nome_lote = 'Selecionadas'
+    else:
+        mes, ano = p['mes'], p['ano']
+        ferias_qs = ferias_qs.filter(data_inicio__range=[date(ano, mes, 1), date(ano, mes, monthrange(ano, mes)[1])])
+        nome_lote = f"{mes:02d}_{ano}"
+
+    ferias = {f.pk: f for f in ferias_qs.order_by('funcionario__nome_completo', 'data_inicio')}
+    if not ferias:
+        raise ErroDefinitivo("Nenhum agendamento de férias encontrado para o período.")
+
+    # Avisos já gerados com os dados atuais (ou anexados à mão) não passam pelo WeasyPrint de novo
+    pendentes = [pk for pk, f in ferias.items() if not aviso_ferias_atualizado(f)]
+    gerados = []
+    erros = []
+    concluidos = len(ferias) - len(pendentes)
+    if pendentes:
+        novos = {}
+        for ferias_id, chave, conteudo, erro in avisos_ferias_em_paralelo(pendentes, processos=_processos(job)):
+            if erro is None:
+                f = ferias[ferias_id]
+                f.arquivo_aviso.save(nome_arquivo_aviso_ferias(f), ContentFile(conteudo), save=False)
+                novos[ferias_id] = (chave, f.arquivo_aviso.name)
+            else:
+                erros.append({'ferias_id': ferias_id, 'erro': erro})
+            concluidos += 1
+            registrar_progresso(job, concluidos, len(ferias))
+
+        # Mesma checagem do aviso avulso: o que o RH anexou enquanto o lote rodava não é sobrescrito
+        atuais, gerados = _gravar_avisos(novos)
+        ferias.update(atuais)
+
+    job.nome_arquivo = f"Avisos_Ferias_{nome_lote}.zip"
+    return {
+        'ferias_ids': [pk for pk, f in ferias.items() if f.arquivo_aviso],
+        'total': len(ferias),
+        'gerados': len(gerados),
+        'reaproveitados': len(ferias) - len(pendentes),
+        'erros': erros,
+    }
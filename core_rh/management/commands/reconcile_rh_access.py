@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core_rh.models import GRUPO_GESTORES_RH, grupo_gestores_rh_id, reconciliar_acesso_rh
+
+
+class Command(BaseCommand):
+    help = "Acerta is_staff e o grupo 'Gestores RH' de todos os usuários conforme as equipes de RH."
+
+    def handle(self, *args, **options):
+        if not grupo_gestores_rh_id():
+            self.stderr.write(f"Grupo '{GRUPO_GESTORES_RH}' não existe: só o is_staff será ajustado.")
+
+        resultado = reconciliar_acesso_rh()
+        self.stdout.write(self.style.SUCCESS(
+            f"Acesso ao admin: {resultado['staff_concedido']} concedido(s), {resultado['staff_removido']} removido(s). "
+            f"Grupo '{GRUPO_GESTORES_RH}': {resultado['grupo_adicionado']} adicionado(s), "
+            f"{resultado['grupo_removido']} removido(s)."
+        ))
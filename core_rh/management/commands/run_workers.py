@@ -0,0 +1,119 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core_rh.jobs import executar, limpar_jobs_antigos, proximo_job
+from core_rh.models import apagar_arquivos_orfaos
+
+logger = logging.getLogger(__name__)
+
+# De quanto em quanto tempo o processo principal apaga jobs antigos e arquivos sem referência
+INTERVALO_LIMPEZA = 3600
+
+
+def _processar_fila(intervalo, *paradas, uma_vez=False):
+    """Executa jobs até algum dos eventos em `paradas` ser sinalizado (espera no primeiro)."""
+    def parado():
+        return any(evento.is_set() for evento in paradas)
+
+    while not parado():
+        try:
+            job = proximo_job()
+        except Exception:
+            # Banco fora do ar: descarta a conexão e tenta de novo depois
+            logger.exception("Erro ao consultar a fila de jobs")
+            connections.close_all()
+            paradas[0].wait(intervalo)
+            continue
+
+        if job is None:
+            if uma_vez:
+                return
+            paradas[0].wait(intervalo)
+            continue
+
+        executar(job)
+
+
+def _worker(intervalo, parar):
+    django.setup()  # necessário quando o processo é criado com 'spawn' (Windows)
+
+    # Ctrl+C é tratado pelo processo principal; SIGTERM termina o job atual antes de sair.
+    # O handler usa um Event local: setar o Event do multiprocessing dentro de um
+    # sinal enquanto a mesma thread espera nele trava o processo.
+    encerrar = threading.Event()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: encerrar.set())
+
+    _processar_fila(intervalo, encerrar, parar)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Executa os workers da fila de tarefas em segundo plano (PDFs e importação de contracheques)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Número de processos worker (padrão: 2).')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas com a fila vazia.')
+        parser.add_argument('--uma-vez', action='store_true', help='Processa os jobs pendentes neste processo e sai.')
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+
+        if options['uma_vez']:
+            _processar_fila(intervalo, threading.Event(), uma_vez=True)
+            return
+
+        contexto = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        parar = contexto.Event()
+        processos = {}
+
+        def iniciar(numero):
+            # Conexões abertas não podem ser herdadas pelos filhos
+            connections.close_all()
+            # Não-daemon: os jobs de lote criam processos próprios (ProcessPoolExecutor)
+            processo = contexto.Process(target=_worker, args=(intervalo, parar), name=f"rh-worker-{numero}")
+            processo.start()
+            processos[numero] = processo
+
+        for numero in range(max(1, options['workers'])):
+            iniciar(numero)
+
+        # SIGTERM encerra como o Ctrl+C (KeyboardInterrupt); os workers terminam o job atual
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.stdout.write(self.style.SUCCESS(f"{len(processos)} worker(s) iniciados. Ctrl+C para encerrar."))
+
+        proxima_limpeza = 0
+        try:
+            while True:
+                for numero, processo in list(processos.items()):
+                    if not processo.is_alive():
+                        self.stderr.write(f"Worker {processo.name} parou (código {processo.exitcode}); reiniciando.")
+                        iniciar(numero)
+
+                if time.monotonic() >= proxima_limpeza:
+                    removidos = limpar_jobs_antigos()
+                    if removidos:
+                        self.stdout.write(f"{removidos} job(s) antigo(s) removido(s).")
+                    orfaos = apagar_arquivos_orfaos()
+                    if orfaos:
+                        self.stdout.write(f"{orfaos} arquivo(s) sem referência removido(s).")
+                    proxima_limpeza = time.monotonic() + INTERVALO_LIMPEZA
+
+                time.sleep(5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            parar.set()
+            for processo in processos.values():
+                processo.join(timeout=60)
+                if processo.is_alive():
+                    processo.terminate()
+            self.stdout.write("Workers encerrados.")
@@ -1,5 +1,26 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
 from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils.functional import cached_property
+
+# Guardado na sessão no login e limpo em trocar_senha_obrigatoria
+SESSAO_PRIMEIRO_ACESSO = 'primeiro_acesso'
+
+
+def _primeiro_acesso_do_usuario(user):
+    try:
+        return user.funcionario.primeiro_acesso
+    except AttributeError:
+        # Usuário sem perfil de funcionário (ex: superuser puro)
+        return False
+
+
+@receiver(user_logged_in)
+def guardar_primeiro_acesso(sender, request, user, **kwargs):
+    """Consulta o funcionário só no login; as requisições seguintes leem da sessão."""
+    request.session[SESSAO_PRIMEIRO_ACESSO] = _primeiro_acesso_do_usuario(user)
+
 
 class TrocaSenhaObrigatoriaMiddleware:
     """
@@ -9,28 +30,22 @@ class TrocaSenhaObrigatoriaMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
+    @cached_property
+    def urls_liberadas(self):
+        # Resolvidas uma vez por processo, e só quando alguém precisar trocar a senha
+        return frozenset([reverse('trocar_senha_obrigatoria'), reverse('logout'), reverse('admin:logout')])
+
     def __call__(self, request):
         if request.user.is_authenticated:
-            # BLINDAGEM: Tenta pegar o funcionário, se não tiver (admin puro), ignora
-            try:
-                funcionario = request.user.funcionario
-                
-                # Se for o primeiro acesso, força a troca de senha
-                if funcionario.primeiro_acesso:
-                    current_url = request.path
-                    # Define as URLs permitidas (para não criar loop infinito de redirecionamento)
-                    url_troca = reverse('trocar_senha')
-                    url_logout = reverse('logout')
-                    url_admin_logout = reverse('admin:logout') 
-                    
-                    # Se não estiver na página de troca ou logout, redireciona
-                    if current_url not in [url_troca, url_logout, url_admin_logout]:
-                        return redirect('trocar_senha')
-            
-            except AttributeError:
-                # O usuário logado não tem perfil de funcionário (ex: superuser puro)
-                # Segue o fluxo normal
-                pass
+            primeiro_acesso = request.session.get(SESSAO_PRIMEIRO_ACESSO)
+            if primeiro_acesso is None:
+                # Sessão aberta antes desse controle existir: consulta uma vez e guarda
+                primeiro_acesso = _primeiro_acesso_do_usuario(request.user)
+                request.session[SESSAO_PRIMEIRO_ACESSO] = primeiro_acesso
+
+            # Se for o primeiro acesso e não estiver na página de troca ou logout, redireciona
+            if primeiro_acesso and request.path not in self.urls_liberadas:
+                return redirect('trocar_senha_obrigatoria')
 
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+def _minutos_entre(inicio, fim):
+    if not inicio or not fim:
+        return 0
+    diferenca = (fim.hour * 60 + fim.minute) - (inicio.hour * 60 + inicio.minute)
+    return diferenca if diferenca > 0 else 0
+
+
+def preencher_minutos(apps, schema_editor):
+    """Calcula as durações dos registros que já existiam antes dos novos campos."""
+    RegistroPonto = apps.get_model('core_rh', 'RegistroPonto')
+    lote = []
+    for registro in RegistroPonto.objects.all().iterator(chunk_size=2000):
+        registro.minutos_normais = _minutos_entre(registro.entrada_manha, registro.saida_almoco) + _minutos_entre(registro.volta_almoco, registro.saida_tarde)
+        registro.minutos_extras = _minutos_entre(registro.extra_entrada, registro.extra_saida)
+        lote.append(registro)
+        if len(lote) >= 2000:
+            RegistroPonto.objects.bulk_update(lote, ['minutos_normais', 'minutos_extras'])
+            lote = []
+    if lote:
+        RegistroPonto.objects.bulk_update(lote, ['minutos_normais', 'minutos_extras'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0011_contracheque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registroponto',
+            name='minutos_extras',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Minutos Extras'),
+        ),
+        migrations.AddField(
+            model_name='registroponto',
+            name='minutos_normais',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Minutos Normais'),
+        ),
+        migrations.RunPython(preencher_minutos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0 on 2026-10-18 17:31
+
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _competencia(data):
+    """Mês de referência de um dia (a folha vai do dia 16 ao dia 15)."""
+    if data.day >= 16:
+        return date(data.year + 1, 1, 1) if data.month == 12 else date(data.year, data.month + 1, 1)
+    return date(data.year, data.month, 1)
+
+
+def migrar_assinaturas(apps, schema_editor):
+    """Consolida as flags e o anexo espalhados nos registros diários em uma FolhaMensal por competência."""
+    RegistroPonto = apps.get_model('core_rh', 'RegistroPonto')
+    FolhaMensal = apps.get_model('core_rh', 'FolhaMensal')
+
+    folhas = {}
+    tem_anexo = models.Q(arquivo_anexo__isnull=False) & ~models.Q(arquivo_anexo='')
+    registros = RegistroPonto.objects.filter(
+        models.Q(assinado_funcionario=True) | models.Q(assinado_gestor=True) | tem_anexo
+    ).order_by('data')
+
+    for reg in registros.iterator(chunk_size=2000):
+        chave = (reg.funcionario_id, _competencia(reg.data))
+        folha = folhas.get(chave)
+        if folha is None:
+            folha = folhas[chave] = FolhaMensal(funcionario_id=chave[0], competencia=chave[1])
+        folha.assinado_funcionario = folha.assinado_funcionario or reg.assinado_funcionario
+        folha.assinado_gestor = folha.assinado_gestor or reg.assinado_gestor
+        if not folha.arquivo_assinado and reg.arquivo_anexo:
+            folha.arquivo_assinado = reg.arquivo_anexo.name
+
+    FolhaMensal.objects.bulk_create(folhas.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0012_registroponto_minutos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolhaMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField(help_text='Dia 1 do mês de referência (a folha vai do dia 16 anterior ao dia 15).', verbose_name='Competência')),
+                ('assinado_funcionario', models.BooleanField(default=False, verbose_name='Assinada pelo Colaborador')),
+                ('assinado_gestor', models.BooleanField(default=False, verbose_name='Assinada pelo Gestor')),
+                ('arquivo_assinado', models.FileField(blank=True, null=True, upload_to='ponto_assinado/', verbose_name='PDF Assinado')),
+                ('data_assinatura_funcionario', models.DateTimeField(blank=True, null=True)),
+                ('data_assinatura_gestor', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('funcionario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folhas', to='core_rh.funcionario', verbose_name='Funcionário')),
+            ],
+            options={
+                'verbose_name': 'Folha Mensal',
+                'verbose_name_plural': 'Folhas Mensais',
+                'ordering': ['-competencia'],
+                'indexes': [models.Index(fields=['competencia', 'assinado_gestor'], name='core_rh_fol_compete_35fba7_idx')],
+                'unique_together': {('funcionario', 'competencia')},
+            },
+        ),
+        migrations.RunPython(migrar_assinaturas, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='registroponto',
+            name='arquivo_anexo',
+        ),
+        migrations.RemoveField(
+            model_name='registroponto',
+            name='assinado_funcionario',
+        ),
+        migrations.RemoveField(
+            model_name='registroponto',
+            name='assinado_gestor',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0014_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='atualizado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='progresso',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Progresso (%)'),
+        ),
+    ]
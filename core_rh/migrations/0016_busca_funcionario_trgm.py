@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 18:30
+
+from django.db import migrations
+
+# unaccent() não é IMMUTABLE e por isso não pode ser usada num índice;
+# core_rh_unaccent() fixa o dicionário e pode. Ver core_rh/busca.py.
+CRIAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION core_rh_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    "CREATE INDEX IF NOT EXISTS core_rh_func_nome_trgm ON core_rh_funcionario "
+    "USING gin (core_rh_unaccent(lower(nome_completo)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS core_rh_func_matricula_trgm ON core_rh_funcionario "
+    "USING gin (core_rh_unaccent(lower(matricula)) gin_trgm_ops)",
+]
+
+REMOVER = [
+    "DROP INDEX IF EXISTS core_rh_func_matricula_trgm",
+    "DROP INDEX IF EXISTS core_rh_func_nome_trgm",
+    "DROP FUNCTION IF EXISTS core_rh_unaccent(text)",
+]
+
+
+def _executar(comandos):
+    def rodar(apps, schema_editor):
+        # Só o PostgreSQL tem pg_trgm/unaccent; no SQLite a busca usa icontains
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in comandos:
+            schema_editor.execute(sql)
+    return rodar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0015_job_progresso'),
+    ]
+
+    operations = [
+        migrations.RunPython(_executar(CRIAR), _executar(REMOVER)),
+    ]
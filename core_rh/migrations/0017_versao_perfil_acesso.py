@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0016_busca_funcionario_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoPerfilAcesso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão dos Perfis de Acesso',
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-18 19:40
+
+import core_rh.armazenamento
+import core_rh.models
+from django.db import migrations, models
+
+CAMPOS = {
+    'folhamensal': ['arquivo_assinado'],
+    'ferias': ['arquivo_aviso', 'arquivo_recibo', 'aviso_assinado', 'recibo_assinado'],
+    'contracheque': ['arquivo'],
+}
+
+
+def registrar_arquivos_existentes(apps, schema_editor):
+    # Os arquivos antigos continuam com o nome de antes; só passam a ter referência
+    ReferenciaArquivo = apps.get_model('core_rh', 'ReferenciaArquivo')
+    for modelo, campos in CAMPOS.items():
+        Modelo = apps.get_model('core_rh', modelo)
+        ReferenciaArquivo.objects.bulk_create([
+            ReferenciaArquivo(nome=linha[campo], modelo=f'core_rh.{modelo}', objeto_id=linha['pk'], campo=campo)
+            for linha in Modelo.objects.values('pk', *campos).iterator()
+            for campo in campos if linha[campo]
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0017_versao_perfil_acesso'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contracheque',
+            name='arquivo',
+            field=models.FileField(storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to=core_rh.models.contracheque_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='ferias',
+            name='arquivo_aviso',
+            field=models.FileField(blank=True, help_text='Gere o arquivo no Passo 2 e anexe aqui.', null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to='ferias/avisos_originais/', verbose_name='Aviso de Férias (Original)'),
+        ),
+        migrations.AlterField(
+            model_name='ferias',
+            name='arquivo_recibo',
+            field=models.FileField(blank=True, null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to='ferias/recibos_originais/', verbose_name='Recibo de Férias (Original)'),
+        ),
+        migrations.AlterField(
+            model_name='ferias',
+            name='aviso_assinado',
+            field=models.FileField(blank=True, null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to='ferias/avisos_assinados/', verbose_name='Aviso Assinado (Pelo Colaborador)'),
+        ),
+        migrations.AlterField(
+            model_name='ferias',
+            name='recibo_assinado',
+            field=models.FileField(blank=True, null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to='ferias/recibos_assinados/', verbose_name='Recibo Assinado (Pelo Colaborador)'),
+        ),
+        migrations.AlterField(
+            model_name='folhamensal',
+            name='arquivo_assinado',
+            field=models.FileField(blank=True, null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to='ponto_assinado/', verbose_name='PDF Assinado'),
+        ),
+        migrations.CreateModel(
+            name='ReferenciaArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(db_index=True, max_length=255, verbose_name='Arquivo')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('campo', models.CharField(max_length=50)),
+            ],
+            options={
+                'verbose_name': 'Referência de Arquivo',
+                'verbose_name_plural': 'Referências de Arquivos',
+                'unique_together': {('modelo', 'objeto_id', 'campo')},
+            },
+        ),
+        migrations.RunPython(registrar_arquivos_existentes, migrations.RunPython.noop),
+    ]
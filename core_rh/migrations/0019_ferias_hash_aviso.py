@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 20:10
+
+import core_rh.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0018_arquivos_por_conteudo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ferias',
+            name='hash_aviso',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='ferias',
+            name='arquivo_aviso',
+            field=models.FileField(blank=True, help_text='Gerado automaticamente ao salvar o agendamento. Só anexe se precisar substituir.', null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to='ferias/avisos_originais/', verbose_name='Aviso de Férias (Original)'),
+        ),
+    ]
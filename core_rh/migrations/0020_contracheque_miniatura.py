@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 20:45
+
+import core_rh.armazenamento
+import core_rh.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0019_ferias_hash_aviso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contracheque',
+            name='miniatura',
+            field=models.FileField(blank=True, editable=False, null=True, storage=core_rh.armazenamento.ArmazenamentoPorConteudo(), upload_to=core_rh.models.contracheque_upload_path),
+        ),
+        migrations.AddField(
+            model_name='contracheque',
+            name='miniatura_origem',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='PDF de origem da miniatura'),
+        ),
+    ]
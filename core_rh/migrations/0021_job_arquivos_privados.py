@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 21:40
+
+import os
+import uuid
+
+import core_rh.armazenamento
+import core_rh.models
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+CAMPOS = {'arquivo_entrada': 'entrada', 'arquivo_resultado': 'resultado'}
+
+
+def mover_para_armazenamento_privado(apps, schema_editor):
+    # Tira do MEDIA_ROOT os arquivos dos jobs já existentes, trocando o nome job_<id> por um aleatório
+    Job = apps.get_model('core_rh', 'Job')
+    privado = core_rh.armazenamento.armazenamento_privado
+    for job in Job.objects.exclude(arquivo_entrada='', arquivo_resultado='').iterator():
+        for campo, pasta in CAMPOS.items():
+            antigo = getattr(job, campo).name
+            if not antigo:
+                continue
+            if not default_storage.exists(antigo):
+                setattr(job, campo, None)
+                continue
+            with default_storage.open(antigo, 'rb') as arquivo:
+                novo = privado.save(f'{pasta}/{uuid.uuid4().hex}{os.path.splitext(antigo)[1].lower()}', arquivo)
+            default_storage.delete(antigo)
+            setattr(job, campo, novo)
+        job.save(update_fields=list(CAMPOS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0020_contracheque_miniatura'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='arquivo_entrada',
+            field=models.FileField(blank=True, null=True, storage=core_rh.armazenamento.ArmazenamentoPrivado(), upload_to=core_rh.models.job_entrada_path),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='arquivo_resultado',
+            field=models.FileField(blank=True, null=True, storage=core_rh.armazenamento.ArmazenamentoPrivado(), upload_to=core_rh.models.job_resultado_path),
+        ),
+        migrations.RunPython(mover_para_armazenamento_privado, migrations.RunPython.noop),
+    ]
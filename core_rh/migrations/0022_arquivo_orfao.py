@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 23:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_rh', '0021_job_arquivos_privados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArquivoOrfao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255, unique=True, verbose_name='Arquivo')),
+                ('desde', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Arquivo sem Referência',
+                'verbose_name_plural': 'Arquivos sem Referência',
+            },
+        ),
+    ]
@@ -1,10 +1,19 @@
-from django.db import models
+import os
+import threading
+import uuid
+
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from datetime import date, timedelta
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_delete, post_save, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
 
+from .armazenamento import ArmazenamentoPorConteudo, armazenamento_por_conteudo, armazenamento_privado
+
 # 1. Tabela de Cargos
 class Cargo(models.Model):
     titulo = models.CharField("Nome do Cargo", max_length=100, unique=True)
@@ -41,6 +50,21 @@ class Equipe(models.Model):
 
 
 # 3. Tabela de Funcionários
+class FuncionarioQuerySet(models.QuerySet):
+    def com_status_folha(self, mes, ano):
+        """
+        Anota o status da FolhaMensal da competência em cada funcionário, com
+        subconsultas correlacionadas (não duplica linhas nem quebra o distinct):
+        folha_assinado_funcionario, folha_assinado_gestor e folha_arquivo (None se não houver).
+        """
+        folha = FolhaMensal.objects.filter(funcionario=OuterRef('pk'), competencia=FolhaMensal.competencia_de(mes, ano))
+        return self.select_related('cargo', 'equipe').annotate(
+            folha_assinado_funcionario=Exists(folha.filter(assinado_funcionario=True)),
+            folha_assinado_gestor=Exists(folha.filter(assinado_gestor=True)),
+            folha_arquivo=Subquery(folha.exclude(arquivo_assinado='').values('arquivo_assinado')[:1]),
+        )
+
+
 class Funcionario(models.Model):
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)
     nome_completo = models.CharField(max_length=100)
@@ -76,6 +100,8 @@ class Funcionario(models.Model):
     jornada_saida = models.TimeField("Saída Padrão", default='18:00')
     intervalo_padrao = models.CharField("Intervalo", max_length=50, default="13:00 às 14:12")
 
+    objects = FuncionarioQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Funcionário"
         verbose_name_plural = "Funcionários"
@@ -84,30 +110,37 @@ class Funcionario(models.Model):
         return f"{self.nome_completo} - {self.cargo.titulo}"
 
     def save(self, *args, **kwargs):
-        # 1. Sincroniza o Nome do Usuário com o do Funcionário
-        if self.nome_completo and self.usuario:
+        # Sincroniza o Nome do Usuário com o do Funcionário.
+        # O acesso de RH (is_staff/grupo) fica só com reconciliar_acesso_rh, disparado pelos signals abaixo.
+        update_fields = kwargs.get('update_fields')
+        if self.nome_completo and self.usuario and (update_fields is None or 'nome_completo' in update_fields):
             partes = self.nome_completo.strip().split()
             if partes:
                 self.usuario.first_name = partes[0].title()
                 self.usuario.last_name = ' '.join(partes[1:]).title() if len(partes) > 1 else ''
-        
-        # 2. AUTOMATIZAÇÃO RH: Se for da equipe RH, ganha acesso Admin
-        eh_rh = False
-        if self.equipe and self.equipe.nome in ['RH', 'Recursos Humanos', 'Gestão de Pessoas']:
-            eh_rh = True
-        
-        if eh_rh:
-            self.usuario.is_staff = True
-        else:
-            # Só tira o acesso se não for superusuário (para não te bloquear)
-            if not self.usuario.is_superuser:
-                self.usuario.is_staff = False
-
-        self.usuario.save() # Salva a permissão no User
+                self.usuario.save(update_fields=['first_name', 'last_name'])
+
         super().save(*args, **kwargs) # Salva o Funcionário
 
 
 # 4. Tabela da Folha de Ponto
+def minutos_entre(inicio, fim):
+    """Minutos entre dois horários do mesmo dia (0 se faltar algum ou se fim <= inicio)."""
+    if not inicio or not fim:
+        return 0
+    diferenca = (fim.hour * 60 + fim.minute) - (inicio.hour * 60 + inicio.minute)
+    return diferenca if diferenca > 0 else 0
+
+
+class RegistroPontoQuerySet(models.QuerySet):
+    def totais(self):
+        """Soma (em SQL) das horas normais e extras do queryset, em minutos."""
+        return self.aggregate(
+            minutos_normais=Coalesce(Sum('minutos_normais'), 0),
+            minutos_extras=Coalesce(Sum('minutos_extras'), 0),
+        )
+
+
 class RegistroPonto(models.Model):
     funcionario = models.ForeignKey(Funcionario, on_delete=models.CASCADE)
     data = models.DateField()
@@ -121,10 +154,12 @@ class RegistroPonto(models.Model):
     extra_saida = models.TimeField("Extra Saída", null=True, blank=True)
     
     observacao = models.CharField("Observação / Faltas", max_length=100, blank=True, null=True)
-    arquivo_anexo = models.FileField(upload_to='ponto_assinado/', null=True, blank=True)
-    
-    assinado_funcionario = models.BooleanField(default=False)
-    assinado_gestor = models.BooleanField(default=False)
+
+    # Durações calculadas na gravação (permite somar horas direto no banco)
+    minutos_normais = models.PositiveIntegerField("Minutos Normais", default=0, editable=False)
+    minutos_extras = models.PositiveIntegerField("Minutos Extras", default=0, editable=False)
+
+    objects = RegistroPontoQuerySet.as_manager()
 
     class Meta:
         unique_together = ('funcionario', 'data')
@@ -135,6 +170,55 @@ class RegistroPonto(models.Model):
     def __str__(self):
         return f"{self.funcionario.nome_completo} - {self.data}"
 
+    def calcular_minutos(self):
+        """Atualiza minutos_normais/minutos_extras a partir dos horários batidos."""
+        self.minutos_normais = minutos_entre(self.entrada_manha, self.saida_almoco) + minutos_entre(self.volta_almoco, self.saida_tarde)
+        self.minutos_extras = minutos_entre(self.extra_entrada, self.extra_saida)
+
+    def save(self, *args, **kwargs):
+        self.calcular_minutos()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'minutos_normais', 'minutos_extras'}
+        super().save(*args, **kwargs)
+
+
+# 5. Cabeçalho da Folha (uma linha por funcionário/competência)
+class FolhaMensal(models.Model):
+    """Assinaturas e PDF assinado da competência (16 a 15), fora dos registros diários."""
+    funcionario = models.ForeignKey(Funcionario, on_delete=models.CASCADE, related_name='folhas', verbose_name="Funcionário")
+    competencia = models.DateField("Competência", help_text="Dia 1 do mês de referência (a folha vai do dia 16 anterior ao dia 15).")
+
+    assinado_funcionario = models.BooleanField("Assinada pelo Colaborador", default=False)
+    assinado_gestor = models.BooleanField("Assinada pelo Gestor", default=False)
+    arquivo_assinado = models.FileField("PDF Assinado", upload_to='ponto_assinado/', storage=armazenamento_por_conteudo, null=True, blank=True)
+
+    data_assinatura_funcionario = models.DateTimeField(null=True, blank=True)
+    data_assinatura_gestor = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Folha Mensal"
+        verbose_name_plural = "Folhas Mensais"
+        ordering = ['-competencia']
+        unique_together = ('funcionario', 'competencia')
+        indexes = [models.Index(fields=['competencia', 'assinado_gestor'])]
+
+    def __str__(self):
+        return f"{self.funcionario.nome_completo} - {self.competencia:%m/%Y}"
+
+    @staticmethod
+    def competencia_de(mes, ano):
+        return date(int(ano), int(mes), 1)
+
+    @classmethod
+    def obter(cls, funcionario, mes, ano):
+        """Retorna (criando se preciso) a folha do funcionário na competência."""
+        folha, _ = cls.objects.get_or_create(funcionario=funcionario, competencia=cls.competencia_de(mes, ano))
+        return folha
+
+
 # Corrige representação do Usuário no Admin
 def user_string_representation(self):
     if self.first_name:
@@ -145,49 +229,191 @@ User.__str__ = user_string_representation
 # Equipes que dão poderes de Admin
 NOMES_EQUIPE_RH = ['RH', 'Recursos Humanos', 'Gestão de Pessoas']
 
-def garantir_acesso_rh(funcionario):
-    """Verifica se é RH e dá os poderes necessários"""
-    eh_rh = False
-    
-    # 1. Verifica Principal
-    if funcionario.equipe and funcionario.equipe.nome in NOMES_EQUIPE_RH:
-        eh_rh = True
-    
-    # 2. Verifica Secundárias
-    if not eh_rh and funcionario.outras_equipes.filter(nome__in=NOMES_EQUIPE_RH).exists():
-        eh_rh = True
-    
-    # Aplica ou Remove poderes
-    user = funcionario.usuario
-    grupo_rh = Group.objects.filter(name='Gestores RH').first()
-    
-    if eh_rh:
-        # Dá acesso ao Admin
-        if not user.is_staff:
-            user.is_staff = True
-            user.save()
-        # Adiciona ao Grupo de Permissões (para poder editar)
-        if grupo_rh and not user.groups.filter(name='Gestores RH').exists():
-            user.groups.add(grupo_rh)
-    else:
-        # Se saiu do RH, remove os poderes (se não for superusuário)
-        if not user.is_superuser:
-            if user.is_staff:
-                user.is_staff = False
-                user.save()
-            if grupo_rh:
-                user.groups.remove(grupo_rh)
+GRUPO_GESTORES_RH = 'Gestores RH'
+
+# Id do grupo 'Gestores RH' (buscado uma vez por processo; limpo quando algum Group muda)
+_cache_grupo_rh = {}
+
+
+def grupo_gestores_rh_id():
+    if 'id' not in _cache_grupo_rh:
+        _cache_grupo_rh['id'] = Group.objects.filter(name=GRUPO_GESTORES_RH).values_list('id', flat=True).first()
+    return _cache_grupo_rh['id']
+
+
+def reconciliar_acesso_rh(funcionario_ids=None):
+    """
+    Dá ou tira os poderes de RH (is_staff + grupo 'Gestores RH') conforme a
+    equipe principal ou as secundárias estarem em NOMES_EQUIPE_RH.
+    Superusuários nunca perdem acesso. Sem `funcionario_ids`, revisa todos.
+    Tudo em consultas por conjunto; retorna quantos usuários mudaram.
+    """
+    funcionarios = Funcionario.objects.exclude(usuario__isnull=True)
+    if funcionario_ids is not None:
+        funcionarios = funcionarios.filter(id__in=funcionario_ids)
+    rh = funcionarios.filter(Q(equipe__nome__in=NOMES_EQUIPE_RH) | Q(outras_equipes__nome__in=NOMES_EQUIPE_RH))
+
+    usuarios_rh = User.objects.filter(funcionario__in=rh.values('id'))
+    usuarios_fora = User.objects.filter(funcionario__in=funcionarios.values('id'), is_superuser=False).exclude(
+        funcionario__in=rh.values('id')
+    )
+
+    resultado = {
+        'staff_concedido': usuarios_rh.filter(is_staff=False).update(is_staff=True),
+        'staff_removido': usuarios_fora.filter(is_staff=True).update(is_staff=False),
+        'grupo_adicionado': 0,
+        'grupo_removido': 0,
+    }
+
+    grupo_id = grupo_gestores_rh_id()
+    if grupo_id:
+        Membro = User.groups.through
+        faltando = usuarios_rh.exclude(groups__id=grupo_id).values_list('id', flat=True)
+        resultado['grupo_adicionado'] = len(Membro.objects.bulk_create(
+            [Membro(user_id=user_id, group_id=grupo_id) for user_id in faltando], ignore_conflicts=True
+        ))
+        resultado['grupo_removido'], _ = Membro.objects.filter(
+            group_id=grupo_id, user__in=usuarios_fora.values('id')
+        ).delete()
+    return resultado
+
+
+# Funcionários alterados na transação atual; revisados uma vez só, depois do commit
+_pendentes_rh = threading.local()
+
+
+def _revisar_pendentes():
+    ids = getattr(_pendentes_rh, 'ids', None)
+    if ids:
+        _pendentes_rh.ids = set()
+        reconciliar_acesso_rh(ids)
+
+
+def marcar_para_revisao_rh(funcionario_ids):
+    """
+    Agenda a revisão dos poderes de RH. Vários saves na mesma transação (form
+    do admin + filter_horizontal, importação em lote) viram uma revisão só.
+    """
+    if not hasattr(_pendentes_rh, 'ids'):
+        _pendentes_rh.ids = set()
+    _pendentes_rh.ids.update(funcionario_ids)
+    # Um callback por marcação: o primeiro a rodar revisa tudo e os demais encontram a lista vazia.
+    # Se a transação for desfeita, os ids ficam para a próxima revisão (que é idempotente).
+    transaction.on_commit(_revisar_pendentes)
+
 
 @receiver(post_save, sender=Funcionario)
-def signal_equipe_principal(sender, instance, created, **kwargs):
+def signal_equipe_principal(sender, instance, created, update_fields=None, **kwargs):
     """Roda toda vez que salva o funcionário (Equipe Principal)"""
-    garantir_acesso_rh(instance)
+    if update_fields is None or {'equipe', 'usuario'} & set(update_fields):
+        marcar_para_revisao_rh([instance.pk])
+
+
+@receiver(m2m_changed, sender=Funcionario.outras_equipes.through)
+def signal_equipes_secundarias(sender, instance, action, reverse, pk_set, **kwargs):
+    """Roda toda vez que mexe nas equipes secundárias (pelo funcionário ou pela equipe)"""
+    if not reverse:
+        if action in ["post_add", "post_remove", "post_clear"]:
+            marcar_para_revisao_rh([instance.pk])
+    elif action == "pre_clear":
+        marcar_para_revisao_rh(instance.funcionarios_secundarios.values_list('id', flat=True))
+    elif action in ["post_add", "post_remove"]:
+        marcar_para_revisao_rh(pk_set)
+
+
+@receiver(post_save, sender=Equipe)
+def signal_equipe_renomeada(sender, instance, created, update_fields=None, **kwargs):
+    """Equipe renomeada para (ou de) um nome de RH muda o acesso de todos os membros"""
+    if created or (update_fields is not None and 'nome' not in update_fields):
+        return
+    marcar_para_revisao_rh(
+        Funcionario.objects.filter(Q(equipe=instance) | Q(outras_equipes=instance)).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def signal_grupo_alterado(sender, **kwargs):
+    _cache_grupo_rh.clear()
+
+# --- VERSÃO DOS PERFIS DE ACESSO (ver core_rh/perfil.py) ---
+
+class VersaoPerfilAcesso(models.Model):
+    """
+    Linha única com um contador. O perfil de acesso guardado na sessão vale só
+    enquanto a versão for a mesma; qualquer mudança em equipes, gestores ou
+    grupos incrementa o contador e todas as sessões recalculam o perfil.
+    """
+    versao = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versão dos Perfis de Acesso"
+
+    @classmethod
+    def atual(cls):
+        return cls.objects.filter(pk=1).values_list('versao', flat=True).first() or 0
+
+    @classmethod
+    def incrementar(cls):
+        if not cls.objects.filter(pk=1).update(versao=F('versao') + 1):
+            cls.objects.get_or_create(pk=1, defaults={'versao': 1})
+
+
+# Perfis invalidados na transação atual; a versão sobe uma vez só, depois do commit
+_versao_pendente = threading.local()
+
+
+def _incrementar_versao_pendente():
+    if getattr(_versao_pendente, 'pendente', False):
+        _versao_pendente.pendente = False
+        VersaoPerfilAcesso.incrementar()
+
+
+def invalidar_perfis_acesso():
+    """
+    Agenda o incremento de VersaoPerfilAcesso. Salvar o funcionário, revisar o
+    acesso de RH e mexer nas equipes na mesma transação sobem a versão uma vez.
+    """
+    _versao_pendente.pendente = True
+    # Mesmo esquema de marcar_para_revisao_rh: o primeiro callback incrementa, os demais não fazem nada
+    transaction.on_commit(_incrementar_versao_pendente)
+
+
+def _invalidar_perfis(update_fields, campos_relevantes):
+    # save(update_fields=[...]) que não mexe em nada relevante (ex.: last_login no login) não invalida
+    if update_fields is not None and not set(update_fields) & campos_relevantes:
+        return
+    invalidar_perfis_acesso()
+
+
+@receiver(post_save, sender=Funcionario)
+@receiver(post_delete, sender=Funcionario)
+def signal_perfil_funcionario(sender, instance, update_fields=None, **kwargs):
+    _invalidar_perfis(update_fields, {'usuario', 'equipe'})
+
+
+@receiver(post_save, sender=Equipe)
+@receiver(post_delete, sender=Equipe)
+def signal_perfil_equipe(sender, instance, update_fields=None, **kwargs):
+    _invalidar_perfis(update_fields, {'nome'})
+
+
+@receiver(post_save, sender=User)
+def signal_perfil_usuario(sender, instance, update_fields=None, **kwargs):
+    _invalidar_perfis(update_fields, {'is_superuser', 'is_active'})
+
+
+@receiver(post_save, sender=Group)
+def signal_perfil_grupo(sender, instance, update_fields=None, **kwargs):
+    _invalidar_perfis(update_fields, {'name'})
+
 
 @receiver(m2m_changed, sender=Funcionario.outras_equipes.through)
-def signal_equipes_secundarias(sender, instance, action, **kwargs):
-    """Roda toda vez que mexe nas equipes secundárias"""
+@receiver(m2m_changed, sender=Equipe.gestores.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def signal_perfil_relacoes(sender, action, **kwargs):
     if action in ["post_add", "post_remove", "post_clear"]:
-        garantir_acesso_rh(instance)
+        invalidar_perfis_acesso()
 
 # --- Adicione isto ao core_rh/models.py ---
 
@@ -201,12 +427,14 @@ class Ferias(models.Model):
     data_fim = models.DateField("Fim das Férias (Retorno)")
 
     # --- PASSO 2: ARQUIVOS GERADOS PELO RH (Para o funcionário assinar) ---
-    arquivo_aviso = models.FileField("Aviso de Férias (Original)", upload_to='ferias/avisos_originais/', null=True, blank=True, help_text="Gere o arquivo no Passo 2 e anexe aqui.")
-    arquivo_recibo = models.FileField("Recibo de Férias (Original)", upload_to='ferias/recibos_originais/', null=True, blank=True)
+    arquivo_aviso = models.FileField("Aviso de Férias (Original)", upload_to='ferias/avisos_originais/', storage=armazenamento_por_conteudo, null=True, blank=True, help_text="Gerado automaticamente ao salvar o agendamento. Só anexe se precisar substituir.")
+    # Hash dos dados usados no aviso gerado (pdf.chave_aviso_ferias); vazio se o arquivo foi anexado à mão
+    hash_aviso = models.CharField(max_length=64, blank=True, editable=False)
+    arquivo_recibo = models.FileField("Recibo de Férias (Original)", upload_to='ferias/recibos_originais/', storage=armazenamento_por_conteudo, null=True, blank=True)
 
     # --- DEVOLUÇÃO DO FUNCIONÁRIO ---
-    aviso_assinado = models.FileField("Aviso Assinado (Pelo Colaborador)", upload_to='ferias/avisos_assinados/', null=True, blank=True)
-    recibo_assinado = models.FileField("Recibo Assinado (Pelo Colaborador)", upload_to='ferias/recibos_assinados/', null=True, blank=True)
+    aviso_assinado = models.FileField("Aviso Assinado (Pelo Colaborador)", upload_to='ferias/avisos_assinados/', storage=armazenamento_por_conteudo, null=True, blank=True)
+    recibo_assinado = models.FileField("Recibo Assinado (Pelo Colaborador)", upload_to='ferias/recibos_assinados/', storage=armazenamento_por_conteudo, null=True, blank=True)
 
     status = models.CharField(max_length=20, default='Pendente', choices=[
         ('Pendente', 'Pendente'),
@@ -223,7 +451,20 @@ class Ferias(models.Model):
 
     def __str__(self):
         return f"{self.funcionario.nome_completo} - {self.periodo_aquisitivo}"
-    
+
+    # Campos do próprio agendamento que aparecem no aviso
+    CAMPOS_AVISO = ('funcionario_id', 'periodo_aquisitivo', 'abono_pecuniario', 'data_inicio', 'data_fim')
+
+    def dados_aviso(self):
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_AVISO)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores como vieram do banco, para o signal saber se o aviso precisa ser refeito
+        instance._dados_aviso_salvos = instance.dados_aviso()
+        return instance
+
 
  # 1. PRIMEIRO: Defina a função aqui
 def contracheque_upload_path(instance, filename):
@@ -245,7 +486,10 @@ class Contracheque(models.Model):
     ano = models.IntegerField()
     
     # Aqui a função é chamada, então ela já precisa ter sido lida pelo Python acima
-    arquivo = models.FileField(upload_to=contracheque_upload_path)
+    arquivo = models.FileField(upload_to=contracheque_upload_path, storage=armazenamento_por_conteudo)
+    # PNG da primeira página para a lista de "Meus Contracheques" (ver contracheques.obter_miniatura)
+    miniatura = models.FileField(upload_to=contracheque_upload_path, storage=armazenamento_por_conteudo, null=True, blank=True, editable=False)
+    miniatura_origem = models.CharField("PDF de origem da miniatura", max_length=255, blank=True, editable=False)
     
     data_upload = models.DateTimeField(auto_now_add=True)
     data_ciencia = models.DateTimeField(null=True, blank=True, verbose_name="Data de Recebimento")
@@ -260,4 +504,240 @@ class Contracheque(models.Model):
 
     @property
     def assinado(self):
-        return self.data_ciencia is not None
\ No newline at end of file
+        return self.data_ciencia is not None
+
+
+# --- FILA DE TAREFAS EM SEGUNDO PLANO (sem broker externo) ---
+def job_entrada_path(instance, filename):
+    # Nome aleatório: o id do job é sequencial e não pode servir para adivinhar o arquivo de outra pessoa
+    return f'entrada/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}'
+
+
+def job_resultado_path(instance, filename):
+    return f'resultado/{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}'
+
+
+class Job(models.Model):
+    """Trabalho pesado (PDFs, importações) executado pelo comando run_workers."""
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    tipo = models.CharField("Tipo", max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=3)
+    executar_apos = models.DateTimeField(default=timezone.now)
+
+    arquivo_entrada = models.FileField(upload_to=job_entrada_path, storage=armazenamento_privado, null=True, blank=True)
+    arquivo_resultado = models.FileField(upload_to=job_resultado_path, storage=armazenamento_privado, null=True, blank=True)
+    nome_arquivo = models.CharField("Nome do Arquivo para Download", max_length=255, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+
+    criado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+    # Sinal de vida do worker: job 'executando' sem atualização por muito tempo é considerado órfão
+    atualizado_em = models.DateTimeField(null=True, blank=True)
+    progresso = models.PositiveSmallIntegerField("Progresso (%)", default=0)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'executar_apos'])]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def finalizado(self):
+        return self.status in ('concluido', 'erro')
+
+
+@receiver(post_delete, sender=Job)
+def signal_job_apagado(sender, instance, **kwargs):
+    """Os arquivos do job (entrada e resultado) saem do disco junto com ele, depois do commit."""
+    nomes = [arquivo.name for arquivo in (instance.arquivo_entrada, instance.arquivo_resultado) if arquivo]
+    if not nomes:
+        return
+
+    def apagar():
+        for nome in nomes:
+            armazenamento_privado.delete(nome)
+
+    transaction.on_commit(apagar)
+
+
+# --- ARQUIVOS ENDEREÇADOS POR CONTEÚDO (ver core_rh/armazenamento.py) ---
+class ReferenciaArquivo(models.Model):
+    """
+    Qual linha aponta para qual arquivo. Vários registros podem usar o mesmo
+    blob (mesmo conteúdo); o arquivo só sai do disco quando a última
+    referência some.
+    """
+    nome = models.CharField("Arquivo", max_length=255, db_index=True)
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.PositiveBigIntegerField()
+    campo = models.CharField(max_length=50)
+
+    class Meta:
+        verbose_name = "Referência de Arquivo"
+        verbose_name_plural = "Referências de Arquivos"
+        unique_together = ('modelo', 'objeto_id', 'campo')
+
+    def __str__(self):
+        return f"{self.modelo}#{self.objeto_id}.{self.campo} -> {self.nome}"
+
+
+class ArquivoOrfao(models.Model):
+    """
+    Blob que perdeu a última referência e aguarda a varredura
+    (apagar_arquivos_orfaos). Não é apagado na hora: outro upload com o mesmo
+    conteúdo pode estar apontando para ele numa transação ainda aberta.
+    """
+    nome = models.CharField("Arquivo", max_length=255, unique=True)
+    desde = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Arquivo sem Referência"
+        verbose_name_plural = "Arquivos sem Referência"
+
+    def __str__(self):
+        return self.nome
+
+
+def campos_por_conteudo(model):
+    return [
+        f.name for f in model._meta.concrete_fields
+        if isinstance(f, models.FileField) and isinstance(f.storage, ArmazenamentoPorConteudo)
+    ]
+
+
+# Tempo mínimo sem referência (e sem reaproveitamento) antes de um blob sair do disco
+CARENCIA_ARQUIVOS_ORFAOS = timedelta(hours=1)
+
+
+def apagar_se_orfaos(nomes):
+    """
+    Marca para a varredura os arquivos que podem ter ficado sem referência.
+    A marcação faz parte da transação de quem chamou: se ela for desfeita, nada é marcado.
+    """
+    nomes = {n for n in nomes if n}
+    if nomes:
+        ArquivoOrfao.objects.bulk_create([ArquivoOrfao(nome=nome) for nome in nomes], ignore_conflicts=True)
+
+
+def apagar_arquivos_orfaos(carencia=CARENCIA_ARQUIVOS_ORFAOS):
+    """
+    Apaga do disco os blobs marcados há mais de `carencia` que continuam sem
+    ReferenciaArquivo. Um blob reaproveitado nesse meio tempo tem o mtime
+    renovado (ArmazenamentoPorConteudo._save) e fica para a próxima varredura:
+    quem o reaproveitou pode ainda não ter feito commit das referências.
+    Retorna quantos arquivos foram apagados.
+    """
+    limite = timezone.now() - carencia
+    candidatos = set(ArquivoOrfao.objects.filter(desde__lt=limite).values_list('nome', flat=True))
+    if not candidatos:
+        return 0
+
+    resolvidos = set(ReferenciaArquivo.objects.filter(nome__in=candidatos).values_list('nome', flat=True))
+    apagados = 0
+    for nome in candidatos - resolvidos:
+        try:
+            if armazenamento_por_conteudo.get_modified_time(nome) >= limite:
+                continue
+        except OSError:
+            # Já não está no disco
+            resolvidos.add(nome)
+            continue
+        armazenamento_por_conteudo.delete(nome)
+        resolvidos.add(nome)
+        apagados += 1
+
+    ArquivoOrfao.objects.filter(nome__in=resolvidos).delete()
+    return apagados
+
+
+def sincronizar_referencias(instancias, campos=None):
+    """
+    Atualiza ReferenciaArquivo para os registros (todos do mesmo modelo) e
+    apaga os arquivos que deixaram de ser usados. Uma consulta quando nada
+    mudou; usada pelos signals abaixo e depois de bulk_create/bulk_update
+    (com `campos` = os campos que o bulk gravou).
+    """
+    instancias = [i for i in instancias if i.pk is not None]
+    if not instancias:
+        return
+    model = type(instancias[0])
+    modelo = model._meta.label_lower
+    campos = campos or campos_por_conteudo(model)
+
+    atuais = {
+        (objeto_id, campo): nome
+        for objeto_id, campo, nome in ReferenciaArquivo.objects.filter(
+            modelo=modelo, campo__in=campos, objeto_id__in=[i.pk for i in instancias]
+        ).values_list('objeto_id', 'campo', 'nome')
+    }
+    novas = {
+        (i.pk, campo): getattr(i, campo).name
+        for i in instancias for campo in campos if getattr(i, campo)
+    }
+    alteradas = {chave for chave in atuais.keys() | novas.keys() if atuais.get(chave) != novas.get(chave)}
+    if not alteradas:
+        return
+
+    ids_alterados = {objeto_id for objeto_id, _ in alteradas}
+    ReferenciaArquivo.objects.filter(modelo=modelo, campo__in=campos, objeto_id__in=ids_alterados).delete()
+    ReferenciaArquivo.objects.bulk_create([
+        ReferenciaArquivo(nome=nome, modelo=modelo, objeto_id=objeto_id, campo=campo)
+        for (objeto_id, campo), nome in novas.items() if objeto_id in ids_alterados
+    ])
+    apagar_se_orfaos(atuais[chave] for chave in alteradas if chave in atuais)
+
+
+@receiver(post_save, sender=FolhaMensal)
+@receiver(post_save, sender=Ferias)
+@receiver(post_save, sender=Contracheque)
+def signal_referencias_salvas(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(campos_por_conteudo(sender)):
+        return
+    sincronizar_referencias([instance])
+
+
+@receiver(post_delete, sender=FolhaMensal)
+@receiver(post_delete, sender=Ferias)
+@receiver(post_delete, sender=Contracheque)
+def signal_referencias_apagadas(sender, instance, **kwargs):
+    referencias = ReferenciaArquivo.objects.filter(modelo=sender._meta.label_lower, objeto_id=instance.pk)
+    nomes = list(referencias.values_list('nome', flat=True))
+    referencias.delete()
+    apagar_se_orfaos(nomes)
+
+
+# Registrado depois de signal_referencias_salvas de propósito: fora de transação o on_commit roda
+# na hora e o job troca o arquivo; as referências desta instância já precisam estar gravadas.
+@receiver(post_save, sender=Ferias)
+def signal_gerar_aviso_ferias(sender, instance, created, **kwargs):
+    """Agenda o aviso de férias quando o agendamento é criado ou muda (datas, período, abono)."""
+    dados = instance.dados_aviso()
+    mudou = created or dados != getattr(instance, '_dados_aviso_salvos', None)
+    instance._dados_aviso_salvos = dados
+    # Aviso anexado pelo RH já no cadastro: não há o que gerar
+    if not mudou or (created and instance.arquivo_aviso):
+        return
+
+    ferias_id = instance.pk
+
+    def agendar():
+        from .jobs import enfileirar_aviso_ferias
+        enfileirar_aviso_ferias(ferias_id)
+
+    transaction.on_commit(agendar)
@@ -0,0 +1,452 @@
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+
+from .models import Ferias, Funcionario, RegistroPonto
+from .ponto import MESES_PT, format_delta, get_calendario_competencia
+
+try:
+    import fcntl
+except ImportError:  # Windows (ambiente de desenvolvimento)
+    fcntl = None
+
+try:
+    from weasyprint import HTML
+except ImportError:
+    HTML = None
+
+
+TEMPLATE_FOLHA = 'core_rh/pdf_folha_ponto.html'
+TEMPLATE_AVISO_FERIAS = 'core_rh/pdf_aviso_ferias.html'
+
+# Pasta do cache de PDFs gerados (não é servida publicamente)
+PDF_CACHE_DIR = getattr(settings, 'PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'pdf_cache'))
+
+
+# --- CACHE EM DISCO COM RENDERIZAÇÃO ÚNICA (SINGLE-FLIGHT) ---
+
+_locks_locais = {}
+_locks_locais_guard = threading.Lock()
+
+
+@contextmanager
+def _trava_exclusiva(caminho_lock):
+    """
+    Trava exclusiva por chave, válida entre threads e entre workers do gunicorn.
+    Sem fcntl (Windows) cai para uma trava só do processo.
+    """
+    if fcntl is None:
+        with _locks_locais_guard:
+            trava = _locks_locais.setdefault(caminho_lock, threading.Lock())
+        with trava:
+            yield
+        return
+
+    with open(caminho_lock, 'a') as arquivo_lock:
+        fcntl.flock(arquivo_lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo_lock, fcntl.LOCK_UN)
+
+
+def ler_cache(pasta, prefixo, chave):
+    """Bytes do PDF em cache para a chave, ou None se ainda não foi gerado."""
+    try:
+        with open(os.path.join(PDF_CACHE_DIR, pasta, f"{prefixo}_{chave}.pdf"), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def obter_ou_renderizar(pasta, prefixo, chave, renderizar):
+    """
+    Devolve os bytes do PDF em cache para a chave ou renderiza uma única vez.
+
+    Requisições simultâneas com a mesma chave esperam a primeira terminar e
+    reaproveitam o arquivo gerado. Versões antigas com o mesmo prefixo
+    (mesmo funcionário/competência) são apagadas ao gravar a nova.
+    """
+    # Caminho rápido: já existe, nem precisa travar
+    conteudo = ler_cache(pasta, prefixo, chave)
+    if conteudo is not None:
+        return conteudo
+
+    pasta = os.path.join(PDF_CACHE_DIR, pasta)
+    os.makedirs(pasta, exist_ok=True)
+    destino = os.path.join(pasta, f"{prefixo}_{chave}.pdf")
+
+    with _trava_exclusiva(destino + '.lock'):
+        # Outro worker pode ter gerado enquanto esperávamos a trava
+        if os.path.exists(destino):
+            with open(destino, 'rb') as f:
+                return f.read()
+
+        conteudo = renderizar()
+
+        fd, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(conteudo)
+        os.replace(temporario, destino)
+
+        for nome in os.listdir(pasta):
+            if nome.startswith(f"{prefixo}_") and nome.endswith('.pdf') and nome != os.path.basename(destino):
+                for antigo in (nome, nome + '.lock'):
+                    try:
+                        os.remove(os.path.join(pasta, antigo))
+                    except OSError:
+                        pass
+
+    try:
+        os.remove(destino + '.lock')
+    except OSError:
+        pass
+    return conteudo
+
+
+_versoes_template = {}
+
+
+def versao_template(nome_template):
+    """Hash do arquivo do template; muda sozinho quando o layout é alterado."""
+    caminho = get_template(nome_template).origin.name
+    mtime = os.path.getmtime(caminho)
+    versao = _versoes_template.get(caminho)
+    if versao is None or versao[0] != mtime:
+        with open(caminho, 'rb') as f:
+            versao = (mtime, hashlib.sha256(f.read()).hexdigest()[:16])
+        _versoes_template[caminho] = versao
+    return versao[1]
+
+
+def _hash(dados):
+    return hashlib.sha256(json.dumps(dados, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+# --- IDENTIDADE VISUAL (LOGO E CABEÇALHO) ---
+
+EMPRESA = {
+    'empresa': 'Dividata Processamento de Dados Ltda',
+    'cnpj': '20.914.172/0001-88',
+    'endereco': 'Praça Governador Benedito Valadares, 84 - Sobreloja',
+    'cidade': 'Divinópolis - Minas Gerais',
+}
+
+CAMINHOS_LOGO = [
+    os.path.join(settings.BASE_DIR, 'core', 'static', 'images', 'dividata-logo.png'),
+    os.path.join(settings.BASE_DIR, 'staticfiles', 'images', 'dividata-logo.png'),
+    os.path.join(settings.BASE_DIR, 'static', 'images', 'dividata-logo.png')
+]
+
+
+class MarcaRegistry:
+    """
+    Logo (em base64) e dados da empresa usados nos PDFs.
+    O arquivo é lido uma vez por processo e só é relido se o mtime mudar.
+    """
+    def __init__(self, caminhos):
+        self.caminhos = caminhos
+        self._lock = threading.Lock()
+        self._caminho = None
+        self._mtime = None
+        self._logo_b64 = None
+
+    def _localizar(self):
+        for path in self.caminhos:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def logo(self):
+        """Retorna (logo_b64, mtime) — logo_b64 é None se o arquivo não existir."""
+        with self._lock:
+            try:
+                mtime = os.stat(self._caminho).st_mtime if self._caminho else None
+            except OSError:
+                mtime = None
+
+            if mtime is None:
+                self._caminho = self._localizar()
+                if not self._caminho:
+                    self._mtime = self._logo_b64 = None
+                    return None, None
+                mtime = os.stat(self._caminho).st_mtime
+
+            if mtime != self._mtime:
+                with open(self._caminho, "rb") as image_file:
+                    self._logo_b64 = base64.b64encode(image_file.read()).decode('utf-8')
+                self._mtime = mtime
+            return self._logo_b64, self._mtime
+
+    def contexto(self):
+        """Variáveis de cabeçalho para os templates de PDF."""
+        logo_b64, mtime = self.logo()
+        return dict(EMPRESA, logo_b64=logo_b64, versao_logo=mtime)
+
+
+marca = MarcaRegistry(CAMINHOS_LOGO)
+
+
+# --- FOLHA DE PONTO ---
+
+def chave_folha_ponto(funcionario, calendario, registros):
+    """
+    Hash de tudo que aparece no PDF: cadastro, competência (com os feriados), registros e versão do template.
+    Todo valor novo impresso em TEMPLATE_FOLHA precisa entrar aqui, senão o PDF antigo continua saindo do cache.
+    """
+    equipe = funcionario.equipe
+    return _hash({
+        'template': versao_template(TEMPLATE_FOLHA),
+        'marca': [EMPRESA, marca.logo()[1]],
+        'funcionario': [
+            funcionario.id,
+            funcionario.nome_completo or (funcionario.usuario.get_full_name() if funcionario.usuario_id else ''),
+            funcionario.cargo.titulo, funcionario.numero_contrato,
+            equipe.nome if equipe else '', equipe.local_trabalho if equipe else '',
+            funcionario.jornada_entrada, funcionario.jornada_saida, funcionario.intervalo_padrao,
+        ],
+        'competencia': [
+            calendario.estado, calendario.mes, calendario.ano,
+            [[dia.data, dia.nome_feriado] for dia in calendario.dias if dia.eh_feriado],
+        ],
+        'registros': [
+            [r.data, r.entrada_manha, r.saida_almoco, r.volta_almoco, r.saida_tarde,
+             r.extra_entrada, r.extra_saida, r.observacao, r.minutos_normais, r.minutos_extras]
+            for r in registros
+        ],
+    })
+
+
+def _html_folha_ponto(funcionario, calendario, registros):
+    dias_do_mes = calendario.com_registros(registros)
+    total_minutos_normais = 0
+    total_minutos_extras = 0
+
+    # Durações já vêm calculadas do banco (RegistroPonto.calcular_minutos)
+    for dia in dias_do_mes:
+        registro = dia['registro']
+        if registro:
+            total_minutos_normais += registro.minutos_normais
+            total_minutos_extras += registro.minutos_extras
+            registro.horas_extra = format_delta(timedelta(minutes=registro.minutos_extras)) if registro.minutos_extras else ""
+
+    mes, ano = calendario.mes, calendario.ano
+    context = {
+        **marca.contexto(),
+        'funcionario': funcionario,
+        'mes_ano': f"{mes:02d}/{ano}",
+        'dias_do_mes': dias_do_mes,
+        'nome_mes': f"{MESES_PT[calendario.data_inicio.month]}/{MESES_PT[mes]} {ano}",
+        'total_horas': format_delta(timedelta(minutes=total_minutos_normais)),
+        'total_horas_extras': format_delta(timedelta(minutes=total_minutos_extras)),
+        'user_mock': funcionario.usuario,
+    }
+
+    return render_to_string(TEMPLATE_FOLHA, context)
+
+
+def _renderizar_folha_ponto(funcionario, calendario, registros):
+    html_string = _html_folha_ponto(funcionario, calendario, registros)
+    return HTML(string=html_string, base_url=str(settings.BASE_DIR)).write_pdf()
+
+
+def nome_arquivo_folha(funcionario, mes, ano):
+    nome_func = funcionario.nome_completo.strip().replace(' ', '_')
+    return f"Folha_{nome_func}_{mes:02d}_{ano}.pdf"
+
+
+def folha_ponto_pdf(funcionario, mes, ano, somente_cache=False):
+    """
+    Bytes do PDF da folha de ponto da competência.
+    Só chama o WeasyPrint quando os dados mudaram desde a última geração.
+    Com somente_cache=True devolve None em vez de renderizar (a view enfileira o Job).
+    """
+    calendario = get_calendario_competencia(funcionario.estado, mes, ano)
+    registros = list(RegistroPonto.objects.filter(
+        funcionario=funcionario, data__range=[calendario.data_inicio, calendario.data_fim]
+    ).order_by('data'))
+
+    if HTML is None:
+        # Sem WeasyPrint (ambiente de desenvolvimento): devolve o HTML, sem cache
+        return _html_folha_ponto(funcionario, calendario, registros).encode('utf-8')
+
+    pasta, prefixo = os.path.join('folhas', str(funcionario.id)), f"{ano}_{mes:02d}"
+    chave = chave_folha_ponto(funcionario, calendario, registros)
+    if somente_cache:
+        return ler_cache(pasta, prefixo, chave)
+    return obter_ou_renderizar(
+        pasta, prefixo, chave,
+        lambda: _renderizar_folha_ponto(funcionario, calendario, registros),
+    )
+
+
+# --- GERAÇÃO EM LOTE (EQUIPE OU EMPRESA) ---
+
+_renderizacao_preparada = False
+
+
+def preparar_renderizacao():
+    """
+    Carrega templates, logo e as fontes do WeasyPrint (fontconfig/Pango) uma vez.
+    Chamado antes de criar os processos do lote, que herdam tudo já carregado via fork.
+    """
+    global _renderizacao_preparada
+    if _renderizacao_preparada:
+        return
+    versao_template(TEMPLATE_FOLHA)
+    versao_template(TEMPLATE_AVISO_FERIAS)
+    marca.logo()
+    if HTML is not None:
+        HTML(string='<p style="font-family: Arial, sans-serif">.</p>').write_pdf()
+    _renderizacao_preparada = True
+
+
+def _inicializar_processo_lote():
+    django.setup()  # necessário no 'spawn' (Windows); no fork já está pronto
+    preparar_renderizacao()
+
+
+def _folha_do_lote(funcionario_id, mes, ano):
+    funcionario = Funcionario.objects.select_related('cargo', 'equipe', 'usuario').get(pk=funcionario_id)
+    return nome_arquivo_folha(funcionario, mes, ano), folha_ponto_pdf(funcionario, mes, ano)
+
+
+def _em_processos(funcao, tarefas, processos):
+    """
+    Roda funcao(*argumentos) para cada (chave, argumentos) de `tarefas` e gera
+    (chave, resultado, erro) na ordem em que ficam prontos.
+
+    Com processos=1 tudo roda no próprio processo, sem fork: é o caso do job
+    executado dentro da requisição (JOBS_ASSINCRONOS=False), em que o processo
+    é um worker do servidor web.
+    """
+    if processos == 1:
+        for chave, argumentos in tarefas:
+            try:
+                resultado = funcao(*argumentos)
+            except Exception as e:
+                yield chave, None, e
+            else:
+                yield chave, resultado, None
+        return
+
+    preparar_renderizacao()
+    # Os processos filhos não podem herdar a conexão aberta com o banco
+    connections.close_all()
+
+    contexto = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto, initializer=_inicializar_processo_lote) as pool:
+        futuros = {pool.submit(funcao, *argumentos): chave for chave, argumentos in tarefas}
+
+        for futuro in as_completed(futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                yield futuros[futuro], None, e
+            else:
+                yield futuros[futuro], resultado, None
+
+
+def folhas_ponto_zip(funcionario_ids, mes, ano, destino, processos=None, progresso=None):
+    """
+    Renderiza as folhas da competência em paralelo (um processo por núcleo)
+    e grava cada PDF no ZIP `destino` assim que fica pronto.
+
+    Folhas que não mudaram saem direto do cache em disco. `progresso(concluidos)`
+    é chamado a cada folha. Retorna a lista de erros [{'funcionario_id', 'erro'}].
+    """
+    processos = processos or min(os.cpu_count() or 1, len(funcionario_ids)) or 1
+    erros = []
+    nomes_usados = set()
+
+    tarefas = [(funcionario_id, (funcionario_id, mes, ano)) for funcionario_id in funcionario_ids]
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as arquivo_zip:
+        resultados = _em_processos(_folha_do_lote, tarefas, processos)
+        for concluidos, (funcionario_id, resultado, erro) in enumerate(resultados, start=1):
+            if erro is not None:
+                erros.append({'funcionario_id': funcionario_id, 'erro': str(erro)})
+            else:
+                nome_arquivo, conteudo = resultado
+                # PDF já é comprimido: ZIP_STORED evita gastar CPU à toa
+                if nome_arquivo in nomes_usados:
+                    nome_arquivo = f"{funcionario_id}_{nome_arquivo}"
+                nomes_usados.add(nome_arquivo)
+                arquivo_zip.writestr(nome_arquivo, conteudo)
+
+            if progresso:
+                progresso(concluidos)
+
+    return erros
+
+
+# --- AVISO DE FÉRIAS ---
+
+def nome_arquivo_aviso_ferias(ferias):
+    nome_func = ferias.funcionario.nome_completo.strip().replace(' ', '_')
+    periodo_limpo = ferias.periodo_aquisitivo.replace('/', '-')
+    return f"Notificação_de_Férias-{nome_func}-{periodo_limpo}.pdf"
+
+
+def chave_aviso_ferias(ferias):
+    """Hash de tudo que aparece no aviso (mesma ideia de chave_folha_ponto)."""
+    func = ferias.funcionario
+    return _hash({
+        'template': versao_template(TEMPLATE_AVISO_FERIAS),
+        'ferias': [ferias.periodo_aquisitivo, ferias.abono_pecuniario, ferias.data_inicio, ferias.data_fim],
+        'funcionario': [
+            func.nome_completo, func.cargo.titulo, func.equipe.nome if func.equipe else '',
+            func.matricula, func.carteira_trabalho, func.serie_ctps, func.data_admissao,
+        ],
+    })
+
+
+def aviso_ferias_pdf(ferias):
+    """Bytes do PDF da Notificação de Férias."""
+    func = ferias.funcionario
+
+    html_string = render_to_string(TEMPLATE_AVISO_FERIAS, {
+        'ferias': ferias,
+        'func': func,
+        'dias_ferias': (ferias.data_fim - ferias.data_inicio).days + 1,
+        'hoje': timezone.now()
+    })
+
+    # 'optimize_size' ajuda um pouco na velocidade e tamanho final
+    return HTML(string=html_string).write_pdf(optimize_size=('fonts', 'images'))
+
+
+def _aviso_do_lote(ferias_id):
+    ferias = Ferias.objects.select_related('funcionario__cargo', 'funcionario__equipe').get(pk=ferias_id)
+    return chave_aviso_ferias(ferias), aviso_ferias_pdf(ferias)
+
+
+def avisos_ferias_em_paralelo(ferias_ids, processos=None):
+    """
+    Renderiza os avisos de férias em paralelo, nos mesmos processos de
+    folhas_ponto_zip (template e fontes carregados uma vez por processo).
+
+    Gera (ferias_id, chave, conteudo, erro) na ordem em que ficam prontos;
+    quem chama grava os arquivos enquanto os outros ainda estão sendo gerados.
+    """
+    processos = processos or min(os.cpu_count() or 1, len(ferias_ids)) or 1
+    tarefas = [(ferias_id, (ferias_id,)) for ferias_id in ferias_ids]
+    for ferias_id, resultado, erro in _em_processos(_aviso_do_lote, tarefas, processos):
+        if erro is not None:
+            yield ferias_id, None, None, str(erro)
+        else:
+            chave, conteudo = resultado
+            yield ferias_id, chave, conteudo, None
@@ -0,0 +1,106 @@
+"""
+Perfil de acesso do usuário logado: se é do RH e de quais equipes é gestor
+ou membro.
+
+É calculado uma vez por requisição e guardado na sessão junto com a versão
+atual (VersaoPerfilAcesso). Enquanto ninguém alterar equipes, gestores ou
+grupos, cada requisição custa uma única consulta (a da versão) em vez das
+várias de antes, repetidas em cada has_*_permission do admin.
+
+funcionario_logado() entrega o Funcionario do usuário sem nova consulta.
+"""
+from dataclasses import dataclass
+
+from django.db.models import prefetch_related_objects
+
+from .models import NOMES_EQUIPE_RH, VersaoPerfilAcesso
+
+CHAVE_SESSAO = 'perfil_acesso'
+
+
+@dataclass(frozen=True)
+class PerfilAcesso:
+    eh_rh: bool = False
+    equipes_lideradas: frozenset = frozenset()
+    equipes_membro: frozenset = frozenset()
+
+    @property
+    def eh_gestor(self):
+        return bool(self.equipes_lideradas)
+
+    def lidera_alguma(self, equipe_ids):
+        """True se o usuário é gestor de alguma das equipes (ids) informadas."""
+        return not self.equipes_lideradas.isdisjoint(equipe_ids)
+
+
+ANONIMO = PerfilAcesso()
+
+
+def funcionario_logado(request, com_equipes=False):
+    """
+    Funcionário do usuário logado (ou None), reaproveitado durante a requisição.
+    Cargo e equipe já vêm no SELECT do usuário (FuncionarioBackend);
+    `com_equipes` busca também outras_equipes e equipes_lideradas, uma vez só.
+    """
+    if not hasattr(request, '_funcionario'):
+        try:
+            request._funcionario = request.user.funcionario if request.user.is_authenticated else None
+        except AttributeError:
+            request._funcionario = None
+        request._funcionario_com_equipes = False
+
+    if com_equipes and request._funcionario is not None and not request._funcionario_com_equipes:
+        prefetch_related_objects([request._funcionario], 'outras_equipes', 'equipes_lideradas')
+        request._funcionario_com_equipes = True
+    return request._funcionario
+
+
+def calcular_perfil(user, funcionario):
+    """
+    RH: superusuário, grupo 'RH' do Django ou equipe (principal ou secundária)
+    com um dos NOMES_EQUIPE_RH. `funcionario` deve vir com as equipes pré-carregadas.
+    """
+    eh_rh = user.is_superuser or user.groups.filter(name='RH').exists()
+    if funcionario is None:
+        return PerfilAcesso(eh_rh=eh_rh)
+
+    equipes = [(equipe.id, equipe.nome) for equipe in funcionario.outras_equipes.all()]
+    if funcionario.equipe_id:
+        equipes.append((funcionario.equipe_id, funcionario.equipe.nome))
+
+    return PerfilAcesso(
+        eh_rh=eh_rh or any(nome in NOMES_EQUIPE_RH for _, nome in equipes),
+        equipes_lideradas=frozenset(equipe.id for equipe in funcionario.equipes_lideradas.all()),
+        equipes_membro=frozenset(id_equipe for id_equipe, _ in equipes),
+    )
+
+
+def perfil_acesso(request):
+    """Perfil do request.user, reaproveitando o da requisição ou o da sessão quando ainda válido."""
+    perfil = getattr(request, '_perfil_acesso', None)
+    if perfil is not None:
+        return perfil
+
+    user = request.user
+    if not user.is_authenticated:
+        perfil = ANONIMO
+    elif not hasattr(request, 'session'):
+        perfil = calcular_perfil(user, funcionario_logado(request, com_equipes=True))
+    else:
+        # A versão é lida antes do cálculo: se algo mudar no meio, o próximo acesso recalcula
+        versao = VersaoPerfilAcesso.atual()
+        salvo = request.session.get(CHAVE_SESSAO)
+        if salvo and salvo['versao'] == versao and salvo['usuario'] == user.pk:
+            perfil = PerfilAcesso(salvo['eh_rh'], frozenset(salvo['lideradas']), frozenset(salvo['membro']))
+        else:
+            perfil = calcular_perfil(user, funcionario_logado(request, com_equipes=True))
+            request.session[CHAVE_SESSAO] = {
+                'versao': versao,
+                'usuario': user.pk,
+                'eh_rh': perfil.eh_rh,
+                'lideradas': sorted(perfil.equipes_lideradas),
+                'membro': sorted(perfil.equipes_membro),
+            }
+
+    request._perfil_acesso = perfil
+    return perfil
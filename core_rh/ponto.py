@@ -0,0 +1,257 @@
+from collections import namedtuple
+from datetime import date, time, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+
+import holidays
+from django.db import connection, transaction
+
+from .models import FolhaMensal, Funcionario, RegistroPonto
+
+
+DIAS_SEMANA_PT = {
+    0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira',
+    4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'
+}
+
+MESES_PT = {
+    1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
+    5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
+    9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
+}
+
+# UF usada quando o funcionário não tem estado cadastrado (ou é inválido)
+ESTADO_PADRAO = 'DF'
+
+
+# Campos editáveis da folha: (prefixo do input no formulário, campo do modelo)
+CAMPOS_HORARIO = [
+    ('entrada_1', 'entrada_manha'),
+    ('saida_1', 'saida_almoco'),
+    ('entrada_2', 'volta_almoco'),
+    ('saida_2', 'saida_tarde'),
+    ('entrada_extra', 'extra_entrada'),
+    ('saida_extra', 'extra_saida'),
+]
+CAMPOS_EDITAVEIS = [campo for _, campo in CAMPOS_HORARIO] + ['observacao']
+# Mantidos por RegistroPonto.calcular_minutos()
+CAMPOS_CALCULADOS = ['minutos_normais', 'minutos_extras']
+
+
+def get_datas_competencia(mes_referencia, ano_referencia):
+    if mes_referencia == 1:
+        mes_anterior = 12
+        ano_anterior = ano_referencia - 1
+    else:
+        mes_anterior = mes_referencia - 1
+        ano_anterior = ano_referencia
+        
+    data_inicio = date(ano_anterior, mes_anterior, 16)
+    data_fim = date(ano_referencia, mes_referencia, 15)
+    
+    return data_inicio, data_fim
+
+
+def format_delta(td):
+    total_seconds = int(td.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    return f"{hours:02}:{minutes:02}"
+
+
+# --- CALENDÁRIO DA COMPETÊNCIA (16 a 15) ---
+
+DiaCompetencia = namedtuple('DiaCompetencia', ['data', 'dia_semana_nome', 'eh_fim_de_semana', 'eh_feriado', 'nome_feriado'])
+
+
+def normalizar_estado(estado):
+    """Converte o campo Funcionario.estado numa UF aceita pela lib holidays."""
+    uf = (estado or '').strip().upper()
+    return uf if uf in holidays.BR.subdivisions else ESTADO_PADRAO
+
+
+@lru_cache(maxsize=64)
+def _feriados_ano(estado, ano):
+    """Expande os feriados de uma UF/ano uma única vez por processo."""
+    return MappingProxyType({d: nome.upper() for d, nome in holidays.BR(subdiv=estado, years=ano).items()})
+
+
+class CompetenceCalendar:
+    """
+    Dias de uma competência (16 do mês anterior até 15 do mês de referência),
+    já com dia da semana, fim de semana e feriado da UF.
+    Imutável: a mesma instância é compartilhada entre requisições.
+    """
+    __slots__ = ('estado', 'mes', 'ano', 'data_inicio', 'data_fim', 'dias')
+
+    def __init__(self, estado, mes, ano):
+        data_inicio, data_fim = get_datas_competencia(mes, ano)
+        dias = []
+        for i in range((data_fim - data_inicio).days + 1):
+            data_atual = data_inicio + timedelta(days=i)
+            nome_feriado = _feriados_ano(estado, data_atual.year).get(data_atual, "")
+            dias.append(DiaCompetencia(
+                data=data_atual,
+                dia_semana_nome=DIAS_SEMANA_PT[data_atual.weekday()],
+                eh_fim_de_semana=data_atual.weekday() >= 5,
+                eh_feriado=bool(nome_feriado),
+                nome_feriado=nome_feriado,
+            ))
+
+        for nome, valor in (('estado', estado), ('mes', mes), ('ano', ano), ('data_inicio', data_inicio),
+                            ('data_fim', data_fim), ('dias', tuple(dias))):
+            object.__setattr__(self, nome, valor)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("CompetenceCalendar é imutável.")
+
+    def __iter__(self):
+        return iter(self.dias)
+
+    def com_registros(self, registros):
+        """Monta a lista usada nos templates, juntando cada dia ao seu RegistroPonto (ou None)."""
+        por_data = {r.data: r for r in registros}
+        return [dict(dia._asdict(), registro=por_data.get(dia.data)) for dia in self.dias]
+
+
+@lru_cache(maxsize=256)
+def _calendario(estado, mes, ano):
+    return CompetenceCalendar(estado, mes, ano)
+
+
+def get_calendario_competencia(estado, mes, ano):
+    """Calendário memoizado (LRU) por UF e competência."""
+    return _calendario(normalizar_estado(estado), mes, ano)
+
+
+# --- GRAVAÇÃO DA FOLHA ---
+
+def ler_dia_formulario(dados, dia_num):
+    """
+    Lê os inputs de um dia do formulário da folha.
+    Retorna None se o dia veio vazio, ou um dict {campo: valor}.
+    Lança ValueError se algum horário for inválido.
+    """
+    brutos = {campo: dados.get(f'{prefixo}_{dia_num}', '').strip() for prefixo, campo in CAMPOS_HORARIO}
+    observacao = dados.get(f'observacoes_{dia_num}', '').strip()
+
+    if not any(brutos.values()) and not observacao:
+        return None
+
+    valores = {campo: time.fromisoformat(valor) if valor else None for campo, valor in brutos.items()}
+    valores['observacao'] = observacao
+    return valores
+
+
+def salvar_competencia(funcionario, mes, ano, dados):
+    """
+    Grava a folha de uma competência a partir do POST do formulário.
+
+    Carrega os registros do período uma única vez, compara com o que foi
+    enviado e escreve tudo com um bulk_create, um bulk_update e um delete
+    dentro da mesma transação.
+
+    Retorna False (sem gravar nada) se a folha já foi assinada pelo gestor.
+    """
+    data_inicio, data_fim = get_datas_competencia(mes, ano)
+
+    with transaction.atomic():
+        # Trava o cabeçalho da competência (assinado ou não, se existir) e os registros já gravados até o
+        # fim da gravação: duas gravações da mesma folha não se intercalam. Folha fechada pelo gestor não muda.
+        folha = FolhaMensal.objects.select_for_update().filter(
+            funcionario=funcionario, competencia=FolhaMensal.competencia_de(mes, ano)
+        ).only('pk', 'assinado_gestor').first()
+        if folha is not None and folha.assinado_gestor:
+            return False
+
+        existentes = {
+            r.data: r for r in RegistroPonto.objects.select_for_update().filter(
+                funcionario=funcionario, data__range=[data_inicio, data_fim]
+            )
+        }
+
+        novos, alterados, remover = [], [], []
+
+        for i in range((data_fim - data_inicio).days + 1):
+            data_ponto = data_inicio + timedelta(days=i)
+            registro = existentes.get(data_ponto)
+
+            try:
+                valores = ler_dia_formulario(dados, data_ponto.day)
+            except ValueError:
+                # Horário inválido: mantém o que já estava gravado
+                continue
+
+            if valores is None:
+                if registro:
+                    remover.append(registro.pk)
+                continue
+
+            if registro is None:
+                registro = RegistroPonto(funcionario=funcionario, data=data_ponto, **valores)
+                registro.calcular_minutos()
+                novos.append(registro)
+            elif any(getattr(registro, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(registro, campo, valor)
+                registro.calcular_minutos()
+                alterados.append(registro)
+
+        if novos:
+            RegistroPonto.objects.bulk_create(novos)
+        if alterados:
+            RegistroPonto.objects.bulk_update(alterados, CAMPOS_EDITAVEIS + CAMPOS_CALCULADOS)
+        if remover:
+            RegistroPonto.objects.filter(pk__in=remover).delete()
+
+    return True
+
+
+# --- RESUMO POR EQUIPE ---
+
+def totais_horas(registros):
+    """Horas normais e extras (HH:MM) de um queryset de RegistroPonto, somadas no banco."""
+    totais = registros.totais()
+    return {
+        'total_horas': format_delta(timedelta(minutes=totais['minutos_normais'])),
+        'total_horas_extras': format_delta(timedelta(minutes=totais['minutos_extras'])),
+    }
+
+
+RESUMO_VAZIO = {'total_membros': 0, 'total_pontos_enviados': 0, 'total_assinados_gestor': 0}
+
+
+def resumo_equipes(mes, ano):
+    """
+    Contagens da competência para todas as equipes numa única consulta agrupada:
+    {equipe_id: {'total_membros', 'total_pontos_enviados', 'total_assinados_gestor'}}.
+
+    Membro é quem tem a equipe como principal ou secundária (o UNION elimina
+    quem aparece nas duas). Equipes sem membros não aparecem; use RESUMO_VAZIO.
+    """
+    data_inicio, data_fim = get_datas_competencia(mes, ano)
+    secundarias = Funcionario.outras_equipes.through._meta
+
+    sql = f"""
+        SELECT m.equipe_id,
+               COUNT(*),
+               COUNT(r.funcionario_id),
+               COUNT(f.funcionario_id)
+        FROM (
+            SELECT id AS funcionario_id, equipe_id FROM {Funcionario._meta.db_table} WHERE equipe_id IS NOT NULL
+            UNION
+            SELECT funcionario_id, equipe_id FROM {secundarias.db_table}
+        ) m
+        LEFT JOIN (
+            SELECT DISTINCT funcionario_id FROM {RegistroPonto._meta.db_table} WHERE data BETWEEN %s AND %s
+        ) r ON r.funcionario_id = m.funcionario_id
+        LEFT JOIN {FolhaMensal._meta.db_table} f
+            ON f.funcionario_id = m.funcionario_id AND f.competencia = %s AND f.assinado_gestor = %s
+        GROUP BY m.equipe_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [data_inicio, data_fim, FolhaMensal.competencia_de(mes, ano), True])
+        return {
+            equipe_id: {'total_membros': membros, 'total_pontos_enviados': com_ponto, 'total_assinados_gestor': assinados}
+            for equipe_id, membros, com_ponto, assinados in cursor.fetchall()
+        }
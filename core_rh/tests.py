@@ -1,3 +1,911 @@
-from django.test import TestCase
+import importlib
+import io
+import os
+import tempfile
+import zipfile
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
+from . import arquivos_zip, contracheques
+from .arquivos_zip import zip_em_stream
+from .busca import buscar_funcionarios, normalizar
+from .contracheques import IdentificadorFuncionarios, _Automato, obter_miniatura
+from .jobs import TAREFAS, anexar_resultado, aviso_ferias_atualizado, enfileirar, enfileirar_aviso_ferias, limpar_jobs_antigos
+from .armazenamento import armazenamento_por_conteudo
+from .models import (
+    ArquivoOrfao, Cargo, Contracheque, Equipe, Ferias, FolhaMensal, Funcionario, Job, ReferenciaArquivo,
+    RegistroPonto, VersaoPerfilAcesso, apagar_arquivos_orfaos,
+)
+from .pdf import chave_folha_ponto
+from .ponto import (
+    RESUMO_VAZIO, get_calendario_competencia, get_datas_competencia, resumo_equipes, salvar_competencia, totais_horas,
+)
+from .views import get_competencia_atual, paginar_por_nome
+
+
+def criar_funcionario(username, **kwargs):
+    cargo, _ = Cargo.objects.get_or_create(titulo='Analista')
+    dados = {
+        'nome_completo': f'Funcionario {username}',
+        'cpf': username,
+        'email': f'{username}@exemplo.com',
+        'cargo': cargo,
+        'primeiro_acesso': False,
+    }
+    dados.update(kwargs)
+    return Funcionario.objects.create(usuario=User.objects.create_user(username, password='senha-teste'), **dados)
+
+
+class AcessoRhTests(TestCase):
+    def setUp(self):
+        self.rh = Equipe.objects.create(nome='RH')
+        self.ti = Equipe.objects.create(nome='TI')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.funcionario = criar_funcionario('rh_secundario', equipe=self.ti)
+            self.funcionario.outras_equipes.add(self.rh)
+
+    def test_rh_por_equipe_secundaria_ganha_staff(self):
+        self.funcionario.usuario.refresh_from_db()
+        self.assertTrue(self.funcionario.usuario.is_staff)
+
+    def test_save_parcial_nao_remove_staff(self):
+        funcionario = Funcionario.objects.select_related('usuario').get(pk=self.funcionario.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            funcionario.primeiro_acesso = False
+            funcionario.save(update_fields=['primeiro_acesso'])
+
+        funcionario.usuario.refresh_from_db()
+        self.assertTrue(funcionario.usuario.is_staff)
+
+    def test_troca_de_senha_obrigatoria_mantem_staff(self):
+        Funcionario.objects.filter(pk=self.funcionario.pk).update(primeiro_acesso=True)
+        self.client.login(username='rh_secundario', password='senha-teste')
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('trocar_senha_obrigatoria'), {
+                'old_password': 'senha-teste',
+                'new_password1': 'Nova-senha-123',
+                'new_password2': 'Nova-senha-123',
+            })
+
+        self.assertRedirects(resposta, reverse('home'), fetch_redirect_response=False)
+        usuario = User.objects.get(pk=self.funcionario.usuario_id)
+        self.assertTrue(usuario.is_staff)
+        self.assertFalse(usuario.funcionario.primeiro_acesso)
+
+
+class VersaoPerfilAcessoTests(TestCase):
+    def setUp(self):
+        self.rh = Equipe.objects.create(nome='RH')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.funcionario = criar_funcionario('versao')
+
+    def test_form_do_admin_sobe_a_versao_uma_vez(self):
+        antes = VersaoPerfilAcesso.atual()
+        # Como o admin: save() do funcionário e depois as equipes secundárias, na mesma transação
+        with self.captureOnCommitCallbacks(execute=True):
+            self.funcionario.save()
+            self.funcionario.outras_equipes.set([self.rh])
+        self.assertTrue(User.objects.get(pk=self.funcionario.usuario_id).is_staff)
+        self.assertEqual(VersaoPerfilAcesso.atual(), antes + 1)
+
+    def test_cadastro_sobe_a_versao_uma_vez(self):
+        antes = VersaoPerfilAcesso.atual()
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_funcionario('versao_novo')
+        self.assertEqual(VersaoPerfilAcesso.atual(), antes + 1)
+
+    def test_save_irrelevante_nao_sobe_a_versao(self):
+        antes = VersaoPerfilAcesso.atual()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.funcionario.save(update_fields=['primeiro_acesso'])
+        self.assertEqual(VersaoPerfilAcesso.atual(), antes)
+
+
+class ResumoEquipesTests(TestCase):
+    def setUp(self):
+        self.suporte = Equipe.objects.create(nome='Suporte')
+        self.vendas = Equipe.objects.create(nome='Vendas')
+        self.vazia = Equipe.objects.create(nome='Sem Membros')
+        competencia = FolhaMensal.competencia_de(3, 2026)
+
+        # Principal e secundária na mesma equipe, e secundária em outra
+        duplicado = criar_funcionario('duplicado', equipe=self.suporte)
+        duplicado.outras_equipes.set([self.suporte, self.vendas])
+        RegistroPonto.objects.create(funcionario=duplicado, data=date(2026, 2, 20))
+        RegistroPonto.objects.create(funcionario=duplicado, data=date(2026, 3, 2))
+        FolhaMensal.objects.create(funcionario=duplicado, competencia=competencia, assinado_gestor=True)
+
+        inativo = criar_funcionario('inativo', equipe=self.suporte)
+        User.objects.filter(pk=inativo.usuario_id).update(is_active=False)
+        RegistroPonto.objects.create(funcionario=inativo, data=date(2026, 3, 10))
+
+        vendedor = criar_funcionario('vendedor', equipe=self.vendas)
+        # Fora da competência (16/02 a 15/03) e folha de outro mês
+        RegistroPonto.objects.create(funcionario=vendedor, data=date(2026, 3, 16))
+        FolhaMensal.objects.create(funcionario=vendedor, competencia=FolhaMensal.competencia_de(4, 2026), assinado_gestor=True)
+
+        assinado_sem_ponto = criar_funcionario('sem_ponto', equipe=self.vendas)
+        FolhaMensal.objects.create(funcionario=assinado_sem_ponto, competencia=competencia, assinado_gestor=True)
+
+        criar_funcionario('sem_equipe')
+
+    def resumo_por_equipe(self, equipe, mes, ano):
+        # Cálculo antigo, uma equipe por vez, que resumo_equipes substituiu
+        data_inicio, data_fim = get_datas_competencia(mes, ano)
+        membros = Funcionario.objects.filter(Q(equipe=equipe) | Q(outras_equipes=equipe)).distinct()
+        return {
+            'total_membros': membros.count(),
+            'total_pontos_enviados': RegistroPonto.objects.filter(
+                funcionario__in=membros, data__range=[data_inicio, data_fim]
+            ).values('funcionario').distinct().count(),
+            'total_assinados_gestor': FolhaMensal.objects.filter(
+                funcionario__in=membros, competencia=FolhaMensal.competencia_de(mes, ano), assinado_gestor=True
+            ).count(),
+        }
+
+    def test_igual_ao_calculo_por_equipe(self):
+        for mes, ano in [(3, 2026), (4, 2026)]:
+            contagens = resumo_equipes(mes, ano)
+            for equipe in Equipe.objects.all():
+                with self.subTest(equipe=equipe.nome, mes=mes):
+                    self.assertEqual(contagens.get(equipe.id, RESUMO_VAZIO), self.resumo_por_equipe(equipe, mes, ano))
+
+    def test_contagens_esperadas(self):
+        contagens = resumo_equipes(3, 2026)
+        self.assertEqual(contagens[self.suporte.id], {
+            'total_membros': 2, 'total_pontos_enviados': 2, 'total_assinados_gestor': 1,
+        })
+        self.assertEqual(contagens[self.vendas.id], {
+            'total_membros': 3, 'total_pontos_enviados': 1, 'total_assinados_gestor': 2,
+        })
+        self.assertNotIn(self.vazia.id, contagens)
+
+
+class PaginarPorNomeTests(TestCase):
+    def setUp(self):
+        nomes = ['Ana | Silva', 'Ana|', '|Bia', 'Bia', 'Carla', 'Maria Souza', 'Maria Souza', 'Maria Souza',
+                 'Maria Souza', 'Maria Souza', 'Zeca']
+        for i, nome in enumerate(nomes):
+            criar_funcionario(f'pag{i}', nome_completo=nome)
+
+    def todas_as_paginas(self, funcionarios, tamanho, **kwargs):
+        vistos, cursor = [], ''
+        while True:
+            itens, cursor = paginar_por_nome(funcionarios, cursor, tamanho=tamanho, **kwargs)
+            self.assertLessEqual(len(itens), tamanho)
+            vistos += [f.pk for f in itens]
+            if cursor is None:
+                return vistos
+
+    def test_percorre_tudo_sem_repetir_nem_pular(self):
+        esperado = list(Funcionario.objects.order_by('nome_completo', 'id').values_list('pk', flat=True))
+        for tamanho in (1, 2, 3, 4, len(esperado), len(esperado) + 1):
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(self.todas_as_paginas(Funcionario.objects.all(), tamanho), esperado)
+
+    def test_nome_com_barra_vertical_no_cursor(self):
+        itens, cursor = paginar_por_nome(Funcionario.objects.filter(nome_completo__contains='|'), '', tamanho=1)
+        self.assertEqual(cursor, f'{itens[0].nome_completo}|{itens[0].pk}')
+        seguintes, _ = paginar_por_nome(Funcionario.objects.filter(nome_completo__contains='|'), cursor, tamanho=5)
+        self.assertNotIn(itens[0].pk, [f.pk for f in seguintes])
+        self.assertEqual(len(seguintes), 2)
+
+    def test_ultimo_da_pagina_apagado_antes_da_proxima(self):
+        itens, cursor = paginar_por_nome(Funcionario.objects.all(), '', tamanho=6)
+        itens[-1].delete()
+        seguintes, _ = paginar_por_nome(Funcionario.objects.all(), cursor, tamanho=50)
+        self.assertEqual(len(itens) + len(seguintes), Funcionario.objects.count() + 1)
+
+    def test_cursor_invalido_nao_volta_ao_inicio(self):
+        for cursor in ('abc', 'Ana', 'Ana|x', 'Ana|-1', '|'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(paginar_por_nome(Funcionario.objects.all(), cursor), ([], None))
+        for cursor in ('Ana|3', 'x|Ana|3', '-5|Ana|3', '500|Ana|'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(paginar_por_nome(self.com_relevancia(), cursor, por_relevancia=True), ([], None))
+
+    def com_relevancia(self):
+        # Como buscar_funcionarios: um inteiro, com muitos empates
+        return Funcionario.objects.annotate(relevancia=Case(
+            When(nome_completo__startswith='Maria', then=Value(900)),
+            When(nome_completo__contains='|', then=Value(700)),
+            default=Value(500), output_field=IntegerField(),
+        ))
+
+    def test_empates_de_relevancia(self):
+        esperado = list(self.com_relevancia().order_by('-relevancia', 'nome_completo', 'id').values_list('pk', flat=True))
+        for tamanho in (1, 2, 3, 5):
+            with self.subTest(tamanho=tamanho):
+                self.assertEqual(self.todas_as_paginas(self.com_relevancia(), tamanho, por_relevancia=True), esperado)
+
+
+class BackendAutenticacaoTests(TestCase):
+    def test_sessao_gravada_com_model_backend_continua_valida(self):
+        funcionario = criar_funcionario('sessao_antiga')
+        self.client.force_login(funcionario.usuario, backend='django.contrib.auth.backends.ModelBackend')
+        resposta = self.client.get(reverse('home'))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.wsgi_request.user, funcionario.usuario)
+
+    def test_login_novo_usa_funcionario_backend(self):
+        criar_funcionario('sessao_nova')
+        self.client.login(username='sessao_nova', password='senha-teste')
+        self.assertEqual(self.client.session['_auth_user_backend'], 'core_rh.backends.FuncionarioBackend')
+
+
+class SalvarCompetenciaTests(TestCase):
+    def setUp(self):
+        self.funcionario = criar_funcionario('ponto')
+        # Competência 03/2026: de 16/02 a 15/03
+        self.dados = {'entrada_1_20': '08:00', 'saida_1_20': '12:00'}
+
+    def test_grava_com_cabecalho_ainda_nao_assinado(self):
+        FolhaMensal.obter(self.funcionario, 3, 2026)
+        self.assertTrue(salvar_competencia(self.funcionario, 3, 2026, self.dados))
+        self.assertTrue(RegistroPonto.objects.filter(funcionario=self.funcionario, data=date(2026, 2, 20)).exists())
+
+    def test_folha_assinada_pelo_gestor_nao_muda(self):
+        folha = FolhaMensal.obter(self.funcionario, 3, 2026)
+        folha.assinado_gestor = True
+        folha.save()
+        self.assertFalse(salvar_competencia(self.funcionario, 3, 2026, self.dados))
+        self.assertFalse(RegistroPonto.objects.filter(funcionario=self.funcionario).exists())
+
+
+class TotaisHorasTests(TestCase):
+    def setUp(self):
+        self.equipe = Equipe.objects.create(nome='Suporte')
+        self.mes, self.ano = get_competencia_atual()
+        self.data_inicio, _ = get_datas_competencia(self.mes, self.ano)
+        self.funcionario = criar_funcionario('horas', equipe=self.equipe)
+        outro = criar_funcionario('outra_equipe', equipe=Equipe.objects.create(nome='Vendas'))
+
+        # 3h normais gravadas pelo formulário (bulk_create), 8h normais + 1h30 extra pelo save()
+        salvar_competencia(self.funcionario, self.mes, self.ano, {
+            f'entrada_1_{(self.data_inicio + timedelta(days=1)).day}': '09:00',
+            f'saida_1_{(self.data_inicio + timedelta(days=1)).day}': '12:00',
+        })
+        RegistroPonto.objects.create(
+            funcionario=self.funcionario, data=self.data_inicio,
+            entrada_manha=time(8), saida_almoco=time(12), volta_almoco=time(13), saida_tarde=time(17),
+            extra_entrada=time(18), extra_saida=time(19, 30),
+        )
+        RegistroPonto.objects.create(funcionario=outro, data=self.data_inicio, entrada_manha=time(8), saida_almoco=time(10))
+        # Fora da competência
+        RegistroPonto.objects.create(
+            funcionario=self.funcionario, data=self.data_inicio - timedelta(days=1), entrada_manha=time(8), saida_almoco=time(9),
+        )
+
+    def registros(self, **filtros):
+        _, data_fim = get_datas_competencia(self.mes, self.ano)
+        return RegistroPonto.objects.filter(data__range=[self.data_inicio, data_fim], **filtros)
+
+    def test_soma_minutos_no_banco(self):
+        self.assertEqual(self.registros(funcionario=self.funcionario).totais(), {'minutos_normais': 660, 'minutos_extras': 90})
+        self.assertEqual(self.registros().totais(), {'minutos_normais': 780, 'minutos_extras': 90})
+        self.assertEqual(RegistroPonto.objects.none().totais(), {'minutos_normais': 0, 'minutos_extras': 0})
+
+    def test_totais_formatados(self):
+        with self.assertNumQueries(1):
+            horas = totais_horas(self.registros(funcionario__equipe=self.equipe))
+        self.assertEqual(horas, {'total_horas': '11:00', 'total_horas_extras': '01:30'})
+
+    def test_paineis_do_rh(self):
+        User.objects.create_superuser('rh', 'rh@exemplo.com', 'senha-teste')
+        self.client.login(username='rh', password='senha-teste')
+        competencia = {'mes': self.mes, 'ano': self.ano}
+
+        resposta = self.client.get(reverse('rh_summary'), competencia)
+        self.assertEqual((resposta.context['total_horas'], resposta.context['total_horas_extras']), ('13:00', '01:30'))
+
+        resposta = self.client.get(reverse('rh_team_detail', args=[self.equipe.id]), competencia)
+        self.assertEqual((resposta.context['total_horas'], resposta.context['total_horas_extras']), ('11:00', '01:30'))
+
+
+class ChaveFolhaPontoTests(TestCase):
+    def setUp(self):
+        equipe = Equipe.objects.create(nome='Suporte', local_trabalho='Matriz')
+        self.funcionario = criar_funcionario('chave', equipe=equipe, numero_contrato='100', estado='MG')
+        self.calendario = get_calendario_competencia('MG', 5, 2026)
+
+    def chave(self):
+        funcionario = Funcionario.objects.select_related('cargo', 'equipe', 'usuario').get(pk=self.funcionario.pk)
+        return chave_folha_ponto(funcionario, self.calendario, [])
+
+    def test_numero_contrato_muda_a_chave(self):
+        antes = self.chave()
+        Funcionario.objects.filter(pk=self.funcionario.pk).update(numero_contrato='200')
+        self.assertNotEqual(self.chave(), antes)
+
+    def test_local_de_trabalho_muda_a_chave(self):
+        antes = self.chave()
+        Equipe.objects.filter(pk=self.funcionario.equipe_id).update(local_trabalho='Brasília-DF')
+        self.assertNotEqual(self.chave(), antes)
+
+    def test_nome_do_feriado_muda_a_chave(self):
+        # Competência 05/2026 (16/04 a 15/05) tem Tiradentes e o Dia do Trabalho
+        dias = list(self.calendario.dias)
+        indice = next(i for i, dia in enumerate(dias) if dia.eh_feriado)
+        dias[indice] = dias[indice]._replace(nome_feriado='OUTRO FERIADO')
+        alterado = SimpleNamespace(
+            estado=self.calendario.estado, mes=self.calendario.mes, ano=self.calendario.ano, dias=dias
+        )
+        funcionario = Funcionario.objects.select_related('cargo', 'equipe', 'usuario').get(pk=self.funcionario.pk)
+        self.assertNotEqual(chave_folha_ponto(funcionario, alterado, []), self.chave())
+
+
+def pdf_falso(ferias):
+    return f'%PDF-aviso {ferias.pk} {ferias.data_inicio}'.encode()
+
+
+class AvisoFeriasMixin:
+    """Jobs rodando na hora, MEDIA_ROOT temporário e WeasyPrint trocado por um PDF falso."""
+    def setUp(self):
+        super().setUp()
+        pasta_media = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta_media.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta_media.name, JOBS_ASSINCRONOS=False)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        renderizar = mock.patch('core_rh.jobs.aviso_ferias_pdf', side_effect=pdf_falso)
+        self.renderizar = renderizar.start()
+        self.addCleanup(renderizar.stop)
+        self.funcionario = criar_funcionario('ferias')
+
+    def criar_ferias(self, **kwargs):
+        dados = {'periodo_aquisitivo': '2025/2026', 'data_inicio': date(2026, 1, 5), 'data_fim': date(2026, 1, 24)}
+        dados.update(kwargs)
+        return Ferias.objects.create(funcionario=self.funcionario, **dados)
+
+    def assertAvisoValido(self, ferias):
+        ferias = Ferias.objects.get(pk=ferias.pk)
+        with ferias.arquivo_aviso.open('rb') as arquivo:
+            conteudo = arquivo.read()
+        self.assertTrue(ReferenciaArquivo.objects.filter(
+            modelo='core_rh.ferias', objeto_id=ferias.pk, campo='arquivo_aviso', nome=ferias.arquivo_aviso.name
+        ).exists())
+        return conteudo
+
+
+class AvisoFeriasAutocommitTests(AvisoFeriasMixin, TransactionTestCase):
+    def test_criar_e_mudar_datas_sem_transacao(self):
+        ferias = self.criar_ferias()
+        self.assertEqual(self.assertAvisoValido(ferias), pdf_falso(ferias))
+
+        ferias.data_inicio = date(2026, 1, 6)
+        ferias.save()
+        self.assertEqual(self.assertAvisoValido(ferias), pdf_falso(ferias))
+        self.assertEqual(self.renderizar.call_count, 2)
+
+
+class AvisoFeriasTests(AvisoFeriasMixin, TestCase):
+    def test_criar_e_mudar_datas_em_transacao(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            ferias = self.criar_ferias()
+        self.assertEqual(self.assertAvisoValido(ferias), pdf_falso(ferias))
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            ferias.data_inicio = date(2026, 1, 6)
+            ferias.save()
+        self.assertEqual(self.assertAvisoValido(ferias), pdf_falso(ferias))
+
+    def test_aviso_anexado_a_mao_nao_e_sobrescrito(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ferias = self.criar_ferias(arquivo_aviso=SimpleUploadedFile('aviso.pdf', b'%PDF-manual'))
+        self.renderizar.assert_not_called()
+        self.assertEqual(self.assertAvisoValido(ferias), b'%PDF-manual')
+
+        # Mesmo pedindo o job (ex.: "Salvar e Gerar PDF"), o arquivo do RH fica
+        enfileirar_aviso_ferias(ferias.pk)
+        self.renderizar.assert_not_called()
+        self.assertEqual(self.assertAvisoValido(ferias), b'%PDF-manual')
+
+    def test_lote_nao_sobrescreve_aviso_anexado_durante_a_geracao(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            anexada = self.criar_ferias()
+            gerada = self.criar_ferias(data_inicio=date(2026, 1, 26), data_fim=date(2026, 2, 4))
+        Ferias.objects.update(arquivo_aviso='', hash_aviso='')
+
+        def renderizar(ferias):
+            if ferias.pk == anexada.pk:
+                # O RH anexa o aviso dele enquanto o lote ainda está renderizando
+                manual = Ferias.objects.get(pk=anexada.pk)
+                manual.arquivo_aviso = SimpleUploadedFile('aviso.pdf', b'%PDF-manual')
+                manual.save()
+            return pdf_falso(ferias)
+
+        with mock.patch('core_rh.pdf.aviso_ferias_pdf', side_effect=renderizar), \
+                self.captureOnCommitCallbacks(execute=True):
+            job = enfileirar('avisos_ferias_lote', {'ferias_ids': [anexada.pk, gerada.pk]})
+
+        self.assertEqual(job.status, 'concluido', job.erro)
+        self.assertEqual(job.resultado['gerados'], 1)
+        self.assertEqual(self.assertAvisoValido(anexada), b'%PDF-manual')
+        self.assertEqual(self.assertAvisoValido(gerada), pdf_falso(gerada))
+
+
+class JobArquivosTests(TestCase):
+    def setUp(self):
+        pastas = {}
+        for setting in ('MEDIA_ROOT', 'JOBS_ARQUIVOS_DIR'):
+            pasta = tempfile.TemporaryDirectory()
+            self.addCleanup(pasta.cleanup)
+            pastas[setting] = pasta.name
+        self.media_root = pastas['MEDIA_ROOT']
+        configuracao = override_settings(**pastas)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.dono = criar_funcionario('dono_job')
+        self.job = Job.objects.create(tipo='folhas_ponto_lote', status='concluido', criado_por=self.dono.usuario)
+        anexar_resultado(self.job, 'folhas.zip', b'PK-zip')
+        self.job.save()
+
+    def test_resultado_fora_do_media_root_e_sem_url(self):
+        caminho = self.job.arquivo_resultado.path
+        self.assertTrue(caminho.startswith(os.path.realpath(self.job.arquivo_resultado.storage.location)))
+        self.assertFalse(os.path.realpath(caminho).startswith(os.path.realpath(self.media_root)))
+        self.assertNotEqual(os.path.basename(caminho), f'job_{self.job.pk}.zip')
+        with self.assertRaises(ValueError):
+            self.job.arquivo_resultado.url
+
+    def test_download_so_pelo_dono(self):
+        url = reverse('job_download', args=[self.job.pk])
+        self.client.login(username='dono_job', password='senha-teste')
+        resposta = self.client.get(url)
+        self.assertEqual(b''.join(resposta.streaming_content), b'PK-zip')
+        self.assertIn('folhas.zip', resposta['Content-Disposition'])
+
+        criar_funcionario('outro_job')
+        self.client.login(username='outro_job', password='senha-teste')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_job_expirado_leva_o_arquivo(self):
+        caminho = self.job.arquivo_resultado.path
+        Job.objects.filter(pk=self.job.pk).update(finalizado_em=timezone.now() - timedelta(days=30))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(limpar_jobs_antigos(), 1)
+
+        self.assertFalse(Job.objects.filter(pk=self.job.pk).exists())
+        self.assertFalse(os.path.exists(caminho))
+
+
+@override_settings(JOBS_ASSINCRONOS=False)
+class JobNaRequisicaoTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(JOBS_ARQUIVOS_DIR=pasta.name, PDF_CACHE_DIR=pasta.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_falha_termina_com_erro_sem_nova_tentativa(self):
+        def falhar(job):
+            raise RuntimeError("falhou")
+
+        with mock.patch.dict(TAREFAS, {'teste_falha': falhar}), self.assertLogs('core_rh.jobs', 'ERROR'):
+            job = enfileirar('teste_falha')
+        self.assertEqual(job.status, 'erro')
+        self.assertEqual(job.tentativas, 1)
+        self.assertIn('falhou', job.erro)
+
+    @mock.patch('core_rh.pdf.ProcessPoolExecutor', side_effect=AssertionError("fork dentro da requisição"))
+    def test_lote_nao_cria_processos(self, pool):
+        criar_funcionario('lote_1')
+        criar_funcionario('lote_2')
+        job = enfileirar('folhas_ponto_lote', {'mes': 5, 'ano': 2026})
+        self.assertEqual(job.status, 'concluido', job.erro)
+        self.assertEqual(job.resultado['geradas'], 2)
+        pool.assert_not_called()
+
+
+def func_falso(pk, nome, cpf='', matricula=''):
+    return SimpleNamespace(pk=pk, nome_completo=nome, cpf=cpf, matricula=matricula)
+
+
+class AutomatoTests(SimpleTestCase):
+    def test_acha_padroes_sobrepostos(self):
+        automato = _Automato({'he': 'he', 'she': 'she', 'hers': 'hers'})
+        self.assertEqual(
+            sorted(automato.ocorrencias('ushers')),
+            [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')],
+        )
+
+
+class IdentificadorFuncionariosTests(SimpleTestCase):
+    def setUp(self):
+        self.ana = func_falso(1, 'Ana Silva', cpf='111.111.111-11', matricula='A10')
+        self.ana_souza = func_falso(2, 'Ana Silva Souza', cpf='222.222.222-22', matricula='A20')
+        self.jose = func_falso(3, 'José da Conceição', cpf='333.333.333-33')
+        self.identificador = IdentificadorFuncionarios([self.ana, self.ana_souza, self.jose])
+
+    def assertIdentifica(self, texto, esperado):
+        func, motivo = self.identificador.identificar(texto)
+        self.assertIs(func, esperado, motivo)
+
+    def test_vale_o_nome_mais_longo(self):
+        self.assertIdentifica("Funcionário: ANA SILVA SOUZA  Cargo: Analista", self.ana_souza)
+
+    def test_nome_repetido_na_pagina(self):
+        self.assertIdentifica("ANA SILVA SOUZA  Salário ...  Assinatura: Ana Silva Souza", self.ana_souza)
+
+    def test_nome_que_e_prefixo_de_outro(self):
+        self.assertIdentifica("Funcionário: ANA SILVA  Cargo: Analista", self.ana)
+
+    def test_so_palavras_inteiras(self):
+        func, motivo = self.identificador.identificar("Funcionário: JOANA SILVAS")
+        self.assertIsNone(func)
+        self.assertEqual(motivo, 'Nome não encontrado no texto.')
+
+    def test_sem_acento_e_sem_diferenca_de_caixa(self):
+        self.assertIdentifica("FUNCIONARIO: JOSE DA CONCEICAO", self.jose)
+        self.assertIdentifica("funcionário: josé  da   conceição", self.jose)
+
+    def test_cpf_tem_prioridade_sobre_o_nome(self):
+        # Nome de uma pessoa (ex.: gestor citado na página) e CPF de outra: vale o CPF
+        self.assertIdentifica("ANA SILVA SOUZA - Aprovado por ANA SILVA CPF 11111111111", self.ana)
+        self.assertIdentifica("Gestor: ANA SILVA SOUZA  CPF: 333.333.333-33", self.jose)
+
+    def test_matricula_tem_prioridade_sobre_o_nome(self):
+        self.assertIdentifica("ANA SILVA SOUZA  Matrícula: A10", self.ana)
+
+    def test_varios_documentos_desempata_pelo_nome(self):
+        self.assertIdentifica("ANA SILVA SOUZA CPF 222.222.222-22 / gestor CPF 333.333.333-33", self.ana_souza)
+
+    def test_pagina_ambigua_e_recusada(self):
+        func, motivo = self.identificador.identificar("ANA SILVA SOUZA e JOSE DA CONCEICAO")
+        self.assertIsNone(func)
+        self.assertIn('Mais de um funcionário', motivo)
+
+    def test_homonimos_sem_documento_sao_ambiguos(self):
+        outra_ana = func_falso(4, 'ANA SILVA')
+        identificador = IdentificadorFuncionarios([self.ana, outra_ana])
+        func, motivo = identificador.identificar("Funcionário: Ana Silva")
+        self.assertIsNone(func)
+        self.assertIn('Mais de um funcionário', motivo)
+        # Com o CPF na página, deixa de ser ambíguo
+        self.assertIs(identificador.identificar("Ana Silva CPF 111.111.111-11")[0], self.ana)
+
+
+class ArquivosPorConteudoTests(TestCase):
+    def setUp(self):
+        pasta_media = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta_media.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta_media.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.funcionario = criar_funcionario('blobs')
+        self.outro = criar_funcionario('blobs_outro')
+
+    def contracheque(self, funcionario, conteudo, mes=1):
+        return Contracheque.objects.create(
+            funcionario=funcionario, mes=mes, ano=2026, arquivo=SimpleUploadedFile('holerite.pdf', conteudo)
+        )
+
+    def envelhecer(self, nome, horas=2):
+        """Simula a passagem do tempo: marcação e mtime do blob ficam `horas` no passado."""
+        antes = timezone.now() - timedelta(hours=horas)
+        ArquivoOrfao.objects.filter(nome=nome).update(desde=antes)
+        os.utime(armazenamento_por_conteudo.path(nome), (antes.timestamp(), antes.timestamp()))
+
+    def test_mesmo_conteudo_um_blob_e_duas_referencias(self):
+        primeiro = self.contracheque(self.funcionario, b'%PDF-igual')
+        segundo = self.contracheque(self.outro, b'%PDF-igual')
+        self.assertEqual(primeiro.arquivo.name, segundo.arquivo.name)
+        self.assertEqual(ReferenciaArquivo.objects.filter(nome=primeiro.arquivo.name).count(), 2)
+
+        primeiro.delete()
+        self.envelhecer(segundo.arquivo.name)
+        self.assertEqual(apagar_arquivos_orfaos(), 0)
+        self.assertTrue(armazenamento_por_conteudo.exists(segundo.arquivo.name))
+        self.assertFalse(ArquivoOrfao.objects.exists())
+
+    def test_ultima_referencia_apagada_sai_na_varredura(self):
+        contracheque = self.contracheque(self.funcionario, b'%PDF-unico')
+        nome = contracheque.arquivo.name
+        contracheque.delete()
+        self.assertTrue(ArquivoOrfao.objects.filter(nome=nome).exists())
+
+        # Dentro da carência o arquivo fica
+        self.assertEqual(apagar_arquivos_orfaos(), 0)
+        self.assertTrue(armazenamento_por_conteudo.exists(nome))
+
+        self.envelhecer(nome)
+        self.assertEqual(apagar_arquivos_orfaos(), 1)
+        self.assertFalse(armazenamento_por_conteudo.exists(nome))
+        self.assertFalse(ArquivoOrfao.objects.exists())
+
+    def test_arquivo_trocado_vira_orfao(self):
+        contracheque = self.contracheque(self.funcionario, b'%PDF-antigo')
+        antigo = contracheque.arquivo.name
+        contracheque.arquivo = SimpleUploadedFile('holerite.pdf', b'%PDF-novo')
+        contracheque.save()
+
+        self.envelhecer(antigo)
+        self.assertEqual(apagar_arquivos_orfaos(), 1)
+        self.assertFalse(armazenamento_por_conteudo.exists(antigo))
+        self.assertTrue(armazenamento_por_conteudo.exists(contracheque.arquivo.name))
+
+    def test_blob_reaproveitado_antes_do_commit_nao_e_apagado(self):
+        contracheque = self.contracheque(self.funcionario, b'%PDF-disputado')
+        nome = contracheque.arquivo.name
+        contracheque.delete()
+        self.envelhecer(nome)
+
+        # Outro upload com os mesmos bytes já gravou (deduplicou) mas ainda não fez commit da referência
+        self.assertEqual(armazenamento_por_conteudo.save('holerite.pdf', ContentFile(b'%PDF-disputado')), nome)
+        self.assertEqual(apagar_arquivos_orfaos(), 0)
+        self.assertTrue(armazenamento_por_conteudo.exists(nome))
+
+        # A referência chega: a marcação é descartada na próxima varredura
+        self.contracheque(self.outro, b'%PDF-disputado')
+        self.envelhecer(nome)
+        self.assertEqual(apagar_arquivos_orfaos(), 0)
+        self.assertTrue(armazenamento_por_conteudo.exists(nome))
+        self.assertFalse(ArquivoOrfao.objects.exists())
+
+    def test_transacao_desfeita_nao_marca(self):
+        contracheque = self.contracheque(self.funcionario, b'%PDF-mantido')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            contracheque.delete()
+            raise RuntimeError
+        self.assertFalse(ArquivoOrfao.objects.exists())
+
+
+class ZipEmStreamTests(SimpleTestCase):
+    def test_zip_valido_e_ignora_arquivo_sumido(self):
+        sumido = SimpleNamespace(open=mock.Mock(side_effect=FileNotFoundError))
+        arquivos = [('a.pdf', ContentFile(b'%PDF-a' * 1000)), ('sumido.pdf', sumido), ('b.pdf', ContentFile(b''))]
+        with zipfile.ZipFile(io.BytesIO(b''.join(zip_em_stream(arquivos)))) as arquivo_zip:
+            self.assertIsNone(arquivo_zip.testzip())
+            self.assertEqual(arquivo_zip.namelist(), ['a.pdf', 'b.pdf'])
+            self.assertEqual(arquivo_zip.read('a.pdf'), b'%PDF-a' * 1000)
+            self.assertEqual(arquivo_zip.getinfo('a.pdf').compress_type, zipfile.ZIP_STORED)
+
+    def test_envia_antes_de_ler_o_proximo_arquivo(self):
+        abertos = []
+
+        def arquivos():
+            for nome in ['a.pdf', 'b.pdf']:
+                abertos.append(nome)
+                yield nome, ContentFile(b'x' * 100)
+
+        with mock.patch.object(arquivos_zip, 'TAMANHO_BLOCO', 10):
+            partes = zip_em_stream(arquivos())
+            primeira = next(partes)
+            self.assertEqual(abertos, ['a.pdf'])
+            resto = list(partes)
+
+        self.assertGreater(len(resto), 10)
+        with zipfile.ZipFile(io.BytesIO(primeira + b''.join(resto))) as arquivo_zip:
+            self.assertEqual(arquivo_zip.read('b.pdf'), b'x' * 100)
+
+
+class DownloadLoteEquipeTests(TestCase):
+    def setUp(self):
+        pasta_media = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta_media.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=pasta_media.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.equipe = Equipe.objects.create(nome='Suporte')
+        competencia = FolhaMensal.competencia_de(3, 2026)
+        for username, conteudo in [('ana', b'%PDF-ana'), ('bia', b'%PDF-bia')]:
+            FolhaMensal.objects.create(
+                funcionario=criar_funcionario(username, nome_completo=username.title(), equipe=self.equipe),
+                competencia=competencia, arquivo_assinado=SimpleUploadedFile('folha.pdf', conteudo),
+            )
+        # Sem arquivo assinado e de outra equipe: ficam de fora
+        FolhaMensal.objects.create(funcionario=criar_funcionario('caio', equipe=self.equipe), competencia=competencia)
+        FolhaMensal.objects.create(
+            funcionario=criar_funcionario('davi', equipe=Equipe.objects.create(nome='Vendas')),
+            competencia=competencia, arquivo_assinado=SimpleUploadedFile('folha.pdf', b'%PDF-davi'),
+        )
+
+        User.objects.create_superuser('rh', 'rh@exemplo.com', 'senha-teste')
+        self.client.login(username='rh', password='senha-teste')
+
+    def test_zip_da_equipe_em_stream(self):
+        resposta = self.client.get(reverse('rh_batch_download', args=[self.equipe.id]), {'mes': 3, 'ano': 2026})
+        self.assertTrue(resposta.streaming)
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="Pontos_Suporte_3_2026.zip"')
+        with zipfile.ZipFile(io.BytesIO(b''.join(resposta.streaming_content))) as arquivo_zip:
+            self.assertEqual(arquivo_zip.namelist(), ['Ana_03-2026.pdf', 'Bia_03-2026.pdf'])
+            self.assertEqual(arquivo_zip.read('Bia_03-2026.pdf'), b'%PDF-bia')
+
+    def test_sem_folhas_assinadas_volta_com_aviso(self):
+        resposta = self.client.get(reverse('rh_batch_download', args=[self.equipe.id]), {'mes': 4, 'ano': 2026})
+        self.assertEqual(resposta.status_code, 302)
+
+
+class BuscarFuncionariosTests(TestCase):
+    def setUp(self):
+        self.antonio = criar_funcionario('antonio', nome_completo='Antônio Souza', matricula='M-100')
+        self.mariana = criar_funcionario('mariana', nome_completo='Mariana Antunes', matricula='M-200')
+        criar_funcionario('carla', nome_completo='Carla Dias', matricula='X-300')
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar('  JOÃO   da Conceição\t'), 'joao da conceicao')
+
+    def test_sqlite_icontains_com_relevancia(self):
+        resultado = buscar_funcionarios(Funcionario.objects.all(), ' ant ')
+        self.assertEqual(dict(resultado.values_list('pk', 'relevancia')), {self.antonio.pk: 1000, self.mariana.pk: 500})
+        self.assertEqual(list(buscar_funcionarios(Funcionario.objects.all(), 'm-200')), [self.mariana])
+
+    def test_outros_campos_e_prefixo(self):
+        resultado = buscar_funcionarios(Funcionario.objects.all(), 'carla@', outros_campos=['email'])
+        self.assertEqual([f.usuario.username for f in resultado], ['carla'])
+        Ferias.objects.create(funcionario=self.mariana, data_inicio=date(2026, 7, 1), data_fim=date(2026, 7, 10))
+        self.assertEqual(buscar_funcionarios(Ferias.objects.all(), 'antunes', prefixo='funcionario__').count(), 1)
+
+    def test_postgres_usa_a_expressao_indexada(self):
+        migracao = importlib.import_module('core_rh.migrations.0016_busca_funcionario_trgm')
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            sql = str(buscar_funcionarios(Funcionario.objects.all(), 'Antônio').query)
+
+        # O índice só é usado se a consulta repetir core_rh_unaccent(lower(campo)) igual à migração
+        for campo in ['nome_completo', 'matricula']:
+            with self.subTest(campo=campo):
+                self.assertIn(f'core_rh_unaccent(lower({campo}))', ' '.join(migracao.CRIAR))
+                self.assertIn(f'core_rh_unaccent(LOWER("core_rh_funcionario"."{campo}"))', sql)
+        self.assertIn('<%', sql)
+        self.assertIn('word_similarity', sql)
+        self.assertIn('antonio', sql)
+
+
+class MigracaoBuscaTests(SimpleTestCase):
+    def setUp(self):
+        self.migracao = importlib.import_module('core_rh.migrations.0016_busca_funcionario_trgm')
+
+    def executar(self, comandos, vendor):
+        schema_editor = mock.Mock(connection=SimpleNamespace(vendor=vendor))
+        self.migracao._executar(comandos)(None, schema_editor)
+        return [chamada.args[0] for chamada in schema_editor.execute.call_args_list]
+
+    def test_postgres_cria_extensoes_antes_dos_indices(self):
+        self.assertEqual(self.executar(self.migracao.CRIAR, 'postgresql'), self.migracao.CRIAR)
+        self.assertIn('pg_trgm', self.migracao.CRIAR[0])
+        self.assertIn('IMMUTABLE', self.migracao.CRIAR[2])
+        self.assertEqual(self.executar(self.migracao.REMOVER, 'postgresql'), self.migracao.REMOVER)
+
+    def test_outros_bancos_nao_executam_nada(self):
+        self.assertEqual(self.executar(self.migracao.CRIAR, 'sqlite'), [])
+
+
+class MigracaoTestCase(TransactionTestCase):
+    """Volta o banco para `anterior`, grava dados com os modelos históricos e aplica `migracao`."""
+    anterior = None
+    migracao = None
+
+    def setUp(self):
+        for nome in ['MEDIA_ROOT', 'JOBS_ARQUIVOS_DIR']:
+            pasta = tempfile.TemporaryDirectory()
+            self.addCleanup(pasta.cleanup)
+            configuracao = override_settings(**{nome: pasta.name})
+            configuracao.enable()
+            self.addCleanup(configuracao.disable)
+        self.addCleanup(self.migrar, None)
+        self.apps = self.migrar(self.anterior)
+
+    def migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        alvos = [('core_rh', alvo)] if alvo else executor.loader.graph.leaf_nodes()
+        executor.migrate(alvos)
+        executor.loader.build_graph()
+        return executor.loader.project_state(alvos).apps
+
+    def aplicar(self):
+        return self.migrar(self.migracao)
+
+    def criar_funcionario(self, username):
+        User = self.apps.get_model('auth', 'User')
+        Cargo = self.apps.get_model('core_rh', 'Cargo')
+        return self.apps.get_model('core_rh', 'Funcionario').objects.create(
+            usuario=User.objects.create(username=username), nome_completo=username.title(), cpf=username,
+            email=f'{username}@exemplo.com', cargo=Cargo.objects.get_or_create(titulo='Analista')[0],
+        )
+
+
+class MigracaoArquivosPorConteudoTests(MigracaoTestCase):
+    anterior = '0017_versao_perfil_acesso'
+    migracao = '0018_arquivos_por_conteudo'
+
+    def test_registra_referencias_dos_arquivos_existentes(self):
+        funcionario = self.criar_funcionario('ana')
+        folha = self.apps.get_model('core_rh', 'FolhaMensal').objects.create(
+            funcionario=funcionario, competencia=date(2026, 3, 1), arquivo_assinado='ponto_assinado/ana.pdf',
+        )
+        ferias = self.apps.get_model('core_rh', 'Ferias').objects.create(
+            funcionario=funcionario, data_inicio=date(2026, 7, 1), data_fim=date(2026, 7, 10),
+            arquivo_aviso='ferias/aviso.pdf', recibo_assinado='ferias/recibo.pdf',
+        )
+        self.apps.get_model('core_rh', 'FolhaMensal').objects.create(funcionario=funcionario, competencia=date(2026, 4, 1))
+
+        apps = self.aplicar()
+        referencias = apps.get_model('core_rh', 'ReferenciaArquivo').objects.values_list('nome', 'modelo', 'objeto_id', 'campo')
+        self.assertCountEqual(referencias, [
+            ('ponto_assinado/ana.pdf', 'core_rh.folhamensal', folha.pk, 'arquivo_assinado'),
+            ('ferias/aviso.pdf', 'core_rh.ferias', ferias.pk, 'arquivo_aviso'),
+            ('ferias/recibo.pdf', 'core_rh.ferias', ferias.pk, 'recibo_assinado'),
+        ])
+
+
+class MigracaoHashAvisoTests(MigracaoTestCase):
+    anterior = '0018_arquivos_por_conteudo'
+    migracao = '0019_ferias_hash_aviso'
+
+    def test_avisos_existentes_sao_mantidos(self):
+        funcionario = self.criar_funcionario('ana')
+        FeriasAntiga = self.apps.get_model('core_rh', 'Ferias')
+        com_aviso = FeriasAntiga.objects.create(
+            funcionario=funcionario, data_inicio=date(2026, 7, 1), data_fim=date(2026, 7, 10), arquivo_aviso='ferias/aviso.pdf',
+        )
+        sem_aviso = FeriasAntiga.objects.create(funcionario=funcionario, data_inicio=date(2026, 9, 1), data_fim=date(2026, 9, 10))
+
+        self.aplicar()
+        # Sem hash, o aviso já anexado conta como feito à mão e não é gerado de novo
+        self.assertEqual(Ferias.objects.get(pk=com_aviso.pk).hash_aviso, '')
+        self.assertTrue(aviso_ferias_atualizado(Ferias.objects.get(pk=com_aviso.pk)))
+        self.assertFalse(aviso_ferias_atualizado(Ferias.objects.get(pk=sem_aviso.pk)))
+
+
+class MigracaoMiniaturaTests(MigracaoTestCase):
+    anterior = '0019_ferias_hash_aviso'
+    migracao = '0020_contracheque_miniatura'
+
+    def test_contracheques_antigos_geram_miniatura_no_primeiro_acesso(self):
+        nome = armazenamento_por_conteudo.save('contracheques/antigo.pdf', ContentFile(b'%PDF-antigo'))
+        antigo = self.apps.get_model('core_rh', 'Contracheque').objects.create(
+            funcionario=self.criar_funcionario('ana'), mes=1, ano=2026, arquivo=nome,
+        )
+
+        self.aplicar()
+        contracheque = Contracheque.objects.get(pk=antigo.pk)
+        self.assertFalse(contracheque.miniatura)
+        self.assertEqual(contracheque.miniatura_origem, '')
+
+        with mock.patch.object(contracheques, 'pypdfium2', object()), \
+                mock.patch.object(contracheques, 'miniatura_png', return_value=b'PNG') as gerar:
+            self.assertEqual(obter_miniatura(contracheque).read(), b'PNG')
+            obter_miniatura(Contracheque.objects.get(pk=antigo.pk))
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(Contracheque.objects.get(pk=antigo.pk).miniatura_origem, nome)
+
+
+class MigracaoArquivosPrivadosTests(MigracaoTestCase):
+    anterior = '0020_contracheque_miniatura'
+    migracao = '0021_job_arquivos_privados'
+
+    def test_move_arquivos_dos_jobs_para_fora_do_media(self):
+        entrada = default_storage.save('jobs/entrada/job_1.PDF', ContentFile(b'%PDF-entrada'))
+        resultado = default_storage.save('jobs/resultado/job_1.zip', ContentFile(b'ZIP'))
+        JobAntigo = self.apps.get_model('core_rh', 'Job')
+        movido = JobAntigo.objects.create(tipo='contracheques', arquivo_entrada=entrada, arquivo_resultado=resultado)
+        sumido = JobAntigo.objects.create(tipo='folhas_ponto', arquivo_resultado='jobs/resultado/job_2.zip')
+        sem_arquivo = JobAntigo.objects.create(tipo='folhas_ponto')
+
+        self.aplicar()
+        job = Job.objects.get(pk=movido.pk)
+        self.assertRegex(job.arquivo_entrada.name, r'^entrada/[0-9a-f]{32}\.pdf$')
+        self.assertRegex(job.arquivo_resultado.name, r'^resultado/[0-9a-f]{32}\.zip$')
+        self.assertEqual(job.arquivo_entrada.read(), b'%PDF-entrada')
+        self.assertEqual(job.arquivo_resultado.read(), b'ZIP')
+        self.assertFalse(default_storage.exists(entrada))
+        self.assertFalse(default_storage.exists(resultado))
+
+        # Arquivo que já não existia perde a referência em vez de apontar para o vazio
+        self.assertFalse(Job.objects.get(pk=sumido.pk).arquivo_resultado)
+        self.assertFalse(Job.objects.get(pk=sem_arquivo.pk).arquivo_entrada)
@@ -20,6 +20,8 @@ urlpatterns = [
     path('rh/', views.rh_summary_view, name='rh_summary'),
     path('rh/folhas-ponto/<int:equipe_id>/', views.rh_team_detail_view, name='rh_team_detail'),
     path('rh/download-lote/<int:equipe_id>/', views.rh_batch_download_view, name='rh_batch_download'),
+    path('rh/gerar-folhas/', views.rh_gerar_folhas_lote_view, name='rh_gerar_folhas_empresa'),
+    path('rh/gerar-folhas/<int:equipe_id>/', views.rh_gerar_folhas_lote_view, name='rh_gerar_folhas_equipe'),
     path('rh/liberar-edicao/<int:func_id>/<int:mes>/<int:ano>/', views.rh_unlock_timesheet_view, name='rh_unlock_timesheet'),
 
     # --- INTEGRAÇÃO COM DJANGO ADMIN (AJAX) ---
@@ -28,6 +30,11 @@ urlpatterns = [
     path('api/admin/ferias-partial/', views.admin_ferias_partial_view, name='admin_ferias_partial'),
     path('api/admin/contracheque/partial/', views.admin_contracheque_partial, name='admin_contracheque_partial'),
 
+    # --- TAREFAS EM SEGUNDO PLANO (PDFs e importações) ---
+    path('tarefas/<int:job_id>/', views.acompanhar_job_view, name='acompanhar_job'),
+    path('api/tarefas/<int:job_id>/status/', views.job_status_view, name='job_status'),
+    path('tarefas/<int:job_id>/download/', views.job_download_view, name='job_download'),
+
 
     # --- MÓDULO DE FÉRIAS ---
     path('minhas-ferias/', views.minhas_ferias_view, name='minhas_ferias'),
@@ -35,6 +42,7 @@ urlpatterns = [
     
     # [CORREÇÃO] Esta rota estava faltando e causava o erro 500
     path('ferias/gerar-aviso/<int:ferias_id>/', views.gerar_aviso_ferias_pdf, name='gerar_aviso_ferias_pdf'),
+    path('ferias/gerar-avisos/', views.rh_gerar_avisos_ferias_lote_view, name='gerar_avisos_ferias_lote'),
     
     # --- AUTENTICAÇÃO E SENHAS ---
     path('accounts/login/', auth_views.LoginView.as_view(), name='login'),
@@ -48,6 +56,8 @@ urlpatterns = [
     path('reset/done/', auth_views.PasswordResetCompleteView.as_view(), name='password_reset_complete'),
     path('meus-contracheques/', views.meus_contracheques, name='meus_contracheques'),
     path('assinar-contracheque/<int:pk>/', views.assinar_contracheque_local, name='assinar_contracheque_local'),
+    path('contracheque/<int:pk>/miniatura/', views.contracheque_miniatura_view, name='contracheque_miniatura'),
+    path('contracheque/<int:pk>/pdf/', views.contracheque_pdf_view, name='contracheque_pdf'),
 
 path('meus-contracheques/', views.meus_contracheques, name='meus_contracheques'),
     path('assinar-contracheque/<int:pk>/', views.assinar_contracheque_local, name='assinar_contracheque_local'),
@@ -1,7 +1,5 @@
 from django.db.models import Q
 from django.shortcuts import render, redirect
-import zipfile
-import io
 import os
 import base64
 from django.contrib.staticfiles import finders
@@ -11,17 +9,18 @@ from django.contrib.auth.views import PasswordResetView, PasswordResetDoneView
 from django.contrib.auth.forms import PasswordResetForm
 from django.urls import reverse_lazy
 from django.utils import timezone 
-from django.http import HttpResponse 
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from datetime import date, time, datetime, timedelta 
 from calendar import monthrange 
 from django.template.loader import render_to_string 
 from django.conf import settings
-from .models import RegistroPonto, Funcionario, Equipe, Contracheque, Ferias
+from .models import RegistroPonto, FolhaMensal, Funcionario, Equipe, Contracheque, Ferias, Job
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
 
 
 
@@ -31,7 +30,6 @@ try:
 except ImportError:
     print("AVISO: WeasyPrint não instalado. Instale com 'pip install weasyprint'")
 
-import holidays 
 
 try:
     from .models import RegistroPonto, Funcionario
@@ -39,45 +37,19 @@ except ImportError:
     print("AVISO: Modelos 'RegistroPonto' ou 'Funcionario' não encontrados.")
 
 from .forms import CpfPasswordResetForm
+from .arquivos_zip import zip_em_stream
+from .busca import buscar_funcionarios
+from .contracheques import obter_miniatura
+from .jobs import aviso_ferias_atualizado, enfileirar, enfileirar_aviso_ferias
+from .middleware import SESSAO_PRIMEIRO_ACESSO
+from .pdf import folha_ponto_pdf, nome_arquivo_aviso_ferias, nome_arquivo_folha
+from .perfil import funcionario_logado, perfil_acesso
+from .ponto import (
+    MESES_PT, RESUMO_VAZIO, format_delta, get_calendario_competencia, get_datas_competencia, resumo_equipes,
+    salvar_competencia, totais_horas,
+)
 
 User = get_user_model()
-def usuario_eh_rh(user):
-    """
-    Retorna True se o usuário for Superuser, ou estiver na equipe 'RH' 
-    (seja como principal ou secundária).
-    """
-    if not user.is_authenticated: return False
-    if user.is_superuser: return True
-    
-    # Verifica grupos do Django Admin (legado)
-    if user.groups.filter(name='RH').exists(): return True
-
-    try:
-        func = user.funcionario
-        # Verifica Equipe Principal (Nome exato 'RH' ou 'Recursos Humanos')
-        if func.equipe and func.equipe.nome in ['RH', 'Recursos Humanos', 'Gestão de Pessoas']:
-            return True
-        
-        # Verifica Equipes Secundárias
-        if func.outras_equipes.filter(nome__in=['RH', 'Recursos Humanos', 'Gestão de Pessoas']).exists():
-            return True
-            
-    except AttributeError:
-        # Usuário sem funcionário vinculado
-        pass
-        
-    return False
-
-DIAS_SEMANA_PT = {
-    0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira', 3: 'Quinta-feira',
-    4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'
-}
-
-MESES_PT = {
-    1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
-    5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
-    9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
-}
 
 
 
@@ -96,18 +68,59 @@ def get_competencia_anterior(mes, ano):
         return 12, ano - 1
     return mes - 1, ano
 
-def get_datas_competencia(mes_referencia, ano_referencia):
-    if mes_referencia == 1:
-        mes_anterior = 12
-        ano_anterior = ano_referencia - 1
+# Linhas por página nos painéis AJAX do admin (carregamento incremental)
+TAMANHO_PAGINA = 50
+
+def paginar_por_nome(funcionarios, cursor, tamanho=TAMANHO_PAGINA, por_relevancia=False):
+    """
+    Paginação por cursor (keyset) ordenada por (nome_completo, id).
+    `cursor` é "nome|id" do último funcionário da página anterior.
+    Com `por_relevancia` (resultado de buscar_funcionarios) a ordem passa a ser
+    (-relevancia, nome_completo, id) e o cursor "relevancia|nome|id".
+    Retorna (itens, proximo_cursor); proximo_cursor é None na última página.
+    Cursor inválido (editado na URL) devolve uma página vazia: voltar ao
+    início repetiria linhas no carregamento incremental.
+    """
+    if por_relevancia:
+        funcionarios = funcionarios.order_by('-relevancia', 'nome_completo', 'id')
     else:
-        mes_anterior = mes_referencia - 1
-        ano_anterior = ano_referencia
-        
-    data_inicio = date(ano_anterior, mes_anterior, 16)
-    data_fim = date(ano_referencia, mes_referencia, 15)
-    
-    return data_inicio, data_fim
+        funcionarios = funcionarios.order_by('nome_completo', 'id')
+
+    if cursor:
+        relevancia = None
+        if por_relevancia:
+            relevancia, _, cursor = cursor.partition('|')
+        # O nome pode conter "|": o id é sempre o que vem depois do último
+        nome, separador, ultimo_id = cursor.rpartition('|')
+        if not (separador and ultimo_id.isdigit() and (relevancia is None or relevancia.isdigit())):
+            return [], None
+        depois = Q(nome_completo__gt=nome) | Q(nome_completo=nome, id__gt=int(ultimo_id))
+        if relevancia is not None:
+            depois = Q(relevancia__lt=int(relevancia)) | (Q(relevancia=int(relevancia)) & depois)
+        funcionarios = funcionarios.filter(depois)
+
+    itens = list(funcionarios[:tamanho + 1])
+    if len(itens) <= tamanho:
+        return itens, None
+    itens = itens[:tamanho]
+    ultimo = itens[-1]
+    proximo_cursor = f"{ultimo.nome_completo}|{ultimo.id}"
+    if por_relevancia:
+        proximo_cursor = f"{ultimo.relevancia}|{proximo_cursor}"
+    return itens, proximo_cursor
+
+def url_proxima_pagina(request, proximo_cursor):
+    """Mesma URL (com todos os filtros) apontando para a próxima página."""
+    if not proximo_cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = proximo_cursor
+    return f"{request.path}?{params.urlencode()}"
+
+def url_arquivo_folha(nome_arquivo):
+    if not nome_arquivo:
+        return None
+    return FolhaMensal._meta.get_field('arquivo_assinado').storage.url(nome_arquivo)
 
 def calcular_horas_trabalhadas(entrada_1_str, saida_1_str, entrada_2_str, saida_2_str):
     total = timedelta()
@@ -135,12 +148,11 @@ def home(request):
     is_gestor = False
     tem_ferias = False # Padrão: Não mostra o card
     
-    try:
-        # Tenta pegar o funcionário vinculado ao usuário
-        funcionario = Funcionario.objects.get(usuario=request.user)
-        
+    # Funcionário vinculado ao usuário (None para admin puro)
+    funcionario = funcionario_logado(request)
+    if funcionario is not None:
         # Verifica se é gestor
-        if funcionario.equipes_lideradas.exists():
+        if perfil_acesso(request).eh_gestor:
             is_gestor = True
 
         # --- NOVA LÓGICA DE FÉRIAS ---
@@ -152,11 +164,8 @@ def home(request):
                 tem_ferias = True
         except ImportError:
             pass
-            
-    except Funcionario.DoesNotExist: 
-        pass 
     
-    can_access_rh_area = usuario_eh_rh(request.user)
+    can_access_rh_area = perfil_acesso(request).eh_rh
     
     return render(request, 'core_rh/index.html', {
         'is_gestor': is_gestor or request.user.is_superuser, 
@@ -177,91 +186,43 @@ def salvar_ponto_view(request):
         
     redirect_url = reverse_lazy('folha_ponto') + f"?mes={mes}&ano={ano}"
 
-    try:
-        funcionario = Funcionario.objects.get(usuario=request.user)
-    except Funcionario.DoesNotExist:
+    funcionario = funcionario_logado(request)
+    if funcionario is None:
         messages.error(request, "Perfil de funcionário não encontrado.")
         return redirect('folha_ponto')
 
-    data_inicio, data_fim = get_datas_competencia(mes, ano)
+    if request.FILES.get('pdf_assinado'):
+        data_inicio, data_fim = get_datas_competencia(mes, ano)
+        folha = FolhaMensal.obter(funcionario, mes, ano)
 
-    if RegistroPonto.objects.filter(funcionario=funcionario, data__range=[data_inicio, data_fim], assinado_gestor=True).exists():
-        messages.error(request, "ERRO: Esta folha já foi fechada e assinada pelo gestor. Solicite o desbloqueio ao RH.")
-        return redirect(redirect_url)
+        if folha.assinado_gestor:
+            messages.error(request, "ERRO: Esta folha já foi fechada e assinada pelo gestor. Solicite o desbloqueio ao RH.")
+            return redirect(redirect_url)
 
-    if request.FILES.get('pdf_assinado'):
         arquivo = request.FILES['pdf_assinado']
         
         
         nome_limpo = funcionario.nome_completo.strip().replace(' ', '_')
         arquivo.name = f"Folha_{nome_limpo}_{mes:02d}_{ano}_Assinado_Colab.pdf"
         
-        registros = RegistroPonto.objects.filter(funcionario=funcionario, data__range=[data_inicio, data_fim])
-        
-        if registros.exists():
-            registros.update(
-                assinado_funcionario=True,
-                assinado_gestor=False 
-            )
-            primeiro_reg = registros.first()
-            primeiro_reg.arquivo_anexo = arquivo
-            primeiro_reg.save()
+        if RegistroPonto.objects.filter(funcionario=funcionario, data__range=[data_inicio, data_fim]).exists():
+            folha.arquivo_assinado = arquivo
+            folha.assinado_funcionario = True
+            folha.assinado_gestor = False
+            folha.data_assinatura_funcionario = timezone.now()
+            folha.data_assinatura_gestor = None
+            folha.save()
             messages.success(request, "Documento enviado com sucesso! A assinatura do gestor foi resetada (se houver).")
         else:
              messages.error(request, "Nenhum registro de ponto encontrado para anexar o arquivo.")
         return redirect(redirect_url)
 
-    delta_dias = (data_fim - data_inicio).days
-
-    for i in range(delta_dias + 1):
-        data_ponto = data_inicio + timedelta(days=i)
-        dia_num = data_ponto.day
-        
-        entrada_1_str = request.POST.get(f'entrada_1_{dia_num}', '').strip()
-        saida_1_str = request.POST.get(f'saida_1_{dia_num}', '').strip()
-        entrada_2_str = request.POST.get(f'entrada_2_{dia_num}', '').strip()
-        saida_2_str = request.POST.get(f'saida_2_{dia_num}', '').strip()
-        entrada_extra_str = request.POST.get(f'entrada_extra_{dia_num}', '').strip()
-        saida_extra_str = request.POST.get(f'saida_extra_{dia_num}', '').strip()
-        observacoes = request.POST.get(f'observacoes_{dia_num}', '').strip()
-        
-        try:
-            registro = RegistroPonto.objects.get(funcionario=funcionario, data=data_ponto)
-            registro_existe = True
-        except RegistroPonto.DoesNotExist:
-            registro_existe = False
-            
-        if not any([entrada_1_str, saida_1_str, entrada_2_str, saida_2_str, entrada_extra_str, saida_extra_str, observacoes]):
-            if registro_existe:
-                registro.delete()
-            continue
-            
-        try:
-            entrada_1 = time.fromisoformat(entrada_1_str) if entrada_1_str else None
-            saida_1 = time.fromisoformat(saida_1_str) if saida_1_str else None
-            entrada_2 = time.fromisoformat(entrada_2_str) if entrada_2_str else None
-            saida_2 = time.fromisoformat(saida_2_str) if saida_2_str else None
-            entrada_extra = time.fromisoformat(entrada_extra_str) if entrada_extra_str else None
-            saida_extra = time.fromisoformat(saida_extra_str) if saida_extra_str else None
-        except ValueError:
-            continue 
-
-        RegistroPonto.objects.update_or_create(
-            funcionario=funcionario, 
-            data=data_ponto,
-            defaults={
-                'entrada_manha': entrada_1,    
-                'saida_almoco': saida_1,      
-                'volta_almoco': entrada_2,     
-                'saida_tarde': saida_2,        
-                'extra_entrada': entrada_extra,
-                'extra_saida': saida_extra,    
-                'observacao': observacoes,     
-            }
-        )
+    # Uma leitura do período + escrita em lote (ver core_rh/ponto.py)
+    if not salvar_competencia(funcionario, mes, ano, request.POST):
+        messages.error(request, "ERRO: Esta folha já foi fechada e assinada pelo gestor. Solicite o desbloqueio ao RH.")
+        return redirect(redirect_url)
 
-    if not request.FILES.get('pdf_assinado'):
-        messages.success(request, "Dados de ponto salvos com sucesso!")        
+    messages.success(request, "Dados de ponto salvos com sucesso!")        
     
     return redirect(redirect_url)
 
@@ -279,114 +240,28 @@ def gerar_pdf_ponto_view(request):
         try:
             alvo = Funcionario.objects.get(id=target_func_id)
             # AQUI: Usa a nova verificação de RH
-            if usuario_eh_rh(request.user): 
+            if perfil_acesso(request).eh_rh: 
                 funcionario = alvo
             else:
-                try:
-                    gestor = Funcionario.objects.get(usuario=request.user)
-                    # Verifica se é gestor da equipe Principal OU das Secundárias do alvo
-                    equipes_alvo = [alvo.equipe] + list(alvo.outras_equipes.all())
-                    equipes_que_lidero = gestor.equipes_lideradas.all()
-                    
-                    if any(e in equipes_que_lidero for e in equipes_alvo if e):
-                        funcionario = alvo
-                    else: return HttpResponse("Acesso negado.", status=403)
-                except Funcionario.DoesNotExist: return HttpResponse("Perfil não encontrado.", status=403)
+                # Verifica se é gestor da equipe Principal OU das Secundárias do alvo
+                equipes_alvo = [alvo.equipe_id, *alvo.outras_equipes.values_list('id', flat=True)]
+                if perfil_acesso(request).lidera_alguma(equipes_alvo):
+                    funcionario = alvo
+                else: return HttpResponse("Acesso negado.", status=403)
         except Funcionario.DoesNotExist: return HttpResponse("Funcionário não encontrado.", status=404)
     else:
-        try: funcionario = Funcionario.objects.get(usuario=request.user)
-        except Funcionario.DoesNotExist: return HttpResponse("Perfil não encontrado.", status=404)
-
-    feriados_br = holidays.BR(state='DF', years=ano) 
-    if hasattr(funcionario, 'estado_sigla') and funcionario.estado_sigla:
-        try: feriados_br = holidays.BR(state=funcionario.estado_sigla, years=ano)
-        except: pass
-            
-    data_inicio, data_fim = get_datas_competencia(mes, ano)
-    registros_dict = {r.data.day: r for r in RegistroPonto.objects.filter(funcionario=funcionario, data__range=[data_inicio, data_fim]).order_by('data')}
-    
-    dias_do_mes = []
-    total_horas_delta = timedelta()
-    total_extras_delta = timedelta()
-    
-    delta_dias = (data_fim - data_inicio).days
-    for i in range(delta_dias + 1):
-        data_atual = data_inicio + timedelta(days=i)
-        registro = registros_dict.get(data_atual.day)
-        
-        if registro:
-            td_normal = timedelta()
-            if registro.entrada_manha and registro.saida_almoco:
-                dt_e1 = datetime.combine(date.min, registro.entrada_manha)
-                dt_s1 = datetime.combine(date.min, registro.saida_almoco)
-                if dt_s1 > dt_e1: td_normal += (dt_s1 - dt_e1)
-            if registro.volta_almoco and registro.saida_tarde:
-                dt_e2 = datetime.combine(date.min, registro.volta_almoco)
-                dt_s2 = datetime.combine(date.min, registro.saida_tarde)
-                if dt_s2 > dt_e2: td_normal += (dt_s2 - dt_e2)
-            total_horas_delta += td_normal
-
-            td_extra = timedelta()
-            if registro.extra_entrada and registro.extra_saida:
-                dt_ex_ent = datetime.combine(date.min, registro.extra_entrada)
-                dt_ex_sai = datetime.combine(date.min, registro.extra_saida)
-                if dt_ex_sai > dt_ex_ent: td_extra = dt_ex_sai - dt_ex_ent
-            total_extras_delta += td_extra
-            
-            if td_extra.total_seconds() > 0:
-                registro.horas_extra = format_delta(td_extra)
-            else:
-                registro.horas_extra = ""
-
-        eh_feriado = data_atual in feriados_br
-        nome_feriado = feriados_br.get(data_atual).upper() if eh_feriado else ""
-
-        dias_do_mes.append({
-            'data': data_atual,
-            'dia_semana_nome': DIAS_SEMANA_PT[data_atual.weekday()],
-            'eh_feriado': eh_feriado,
-            'nome_feriado': nome_feriado,
-            'registro': registro
-        })
-
-    logo_data = None
-    possiveis_caminhos = [
-        os.path.join(settings.BASE_DIR, 'core', 'static', 'images', 'dividata-logo.png'),
-        os.path.join(settings.BASE_DIR, 'staticfiles', 'images', 'dividata-logo.png'),
-        os.path.join(settings.BASE_DIR, 'static', 'images', 'dividata-logo.png')
-    ]
-    for path in possiveis_caminhos:
-        if os.path.exists(path):
-            try:
-                with open(path, "rb") as image_file:
-                    logo_data = base64.b64encode(image_file.read()).decode('utf-8')
-                break
-            except Exception: pass
-
-    context = {
-        'funcionario': funcionario,
-        'empresa': 'Dividata Processamento de Dados Ltda', 
-        'cnpj': '20.914.172/0001-88',
-        'endereco': 'Praça Governador Benedito Valadares, 84 - Sobreloja, Divinópolis - MG',
-        'mes_ano': f"{mes:02d}/{ano}",
-        'dias_do_mes': dias_do_mes,
-        'nome_mes': f"{MESES_PT[data_inicio.month]}/{MESES_PT[mes]} {ano}",
-        'total_horas': format_delta(total_horas_delta),
-        'total_horas_extras': format_delta(total_extras_delta),
-        'user_mock': request.user,
-        'logo_b64': logo_data,
-    }
-
-    html_string = render_to_string('core_rh/pdf_folha_ponto.html', context)
-    response = HttpResponse(content_type='application/pdf')
-    nome_func = funcionario.nome_completo.strip().replace(' ', '_')
-    response['Content-Disposition'] = f'attachment; filename="Folha_{nome_func}_{mes:02d}_{ano}.pdf"'
-
-    try:
-        from weasyprint import HTML
-        HTML(string=html_string, base_url=str(settings.BASE_DIR)).write_pdf(response)
-    except ImportError:
-        response.write(html_string)
+        funcionario = funcionario_logado(request)
+        if funcionario is None: return HttpResponse("Perfil não encontrado.", status=404)
+
+    # PDF já gerado com os dados atuais (cache em core_rh/pdf.py): entrega na hora
+    pdf_bytes = folha_ponto_pdf(funcionario, mes, ano, somente_cache=True)
+    if pdf_bytes is None:
+        # Precisa renderizar: vai para a fila e a tela acompanha o job
+        job = enfileirar('folha_ponto_pdf', {'funcionario_id': funcionario.id, 'mes': mes, 'ano': ano}, usuario=request.user)
+        return redirect('acompanhar_job', job_id=job.id)
+
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo_folha(funcionario, mes, ano)}"'
     
     return response
 @login_required
@@ -414,19 +289,12 @@ def folha_ponto_view(request):
     elif is_anterior:
         next_mes, next_ano = mes_atual_real, ano_atual_real
 
-    funcionario = None
-    feriados_br = holidays.BR(state='DF', years=ano_solicitado)
-    try:
-        funcionario = Funcionario.objects.get(usuario=request.user)
-        if hasattr(funcionario, 'estado_sigla') and funcionario.estado_sigla:
-             feriados_br = holidays.BR(state=funcionario.estado_sigla, years=ano_solicitado)
-    except (Funcionario.DoesNotExist, NameError):
-        pass 
+    funcionario = funcionario_logado(request)
 
-    data_inicio, data_fim = get_datas_competencia(mes_solicitado, ano_solicitado)
+    calendario = get_calendario_competencia(funcionario.estado if funcionario else None, mes_solicitado, ano_solicitado)
+    data_inicio, data_fim = calendario.data_inicio, calendario.data_fim
     
-    dias_do_mes = []
-    registros_dict = {}
+    registros_banco = []
     is_locked = False
 
     if funcionario:
@@ -434,27 +302,14 @@ def folha_ponto_view(request):
             funcionario=funcionario, 
             data__range=[data_inicio, data_fim]
         )
-        registros_dict = {r.data.day: r for r in registros_banco}
         
-        if registros_banco.filter(assinado_gestor=True).exists():
-            is_locked = True
+        is_locked = FolhaMensal.objects.filter(
+            funcionario=funcionario,
+            competencia=FolhaMensal.competencia_de(mes_solicitado, ano_solicitado),
+            assinado_gestor=True
+        ).exists()
 
-    delta_dias = (data_fim - data_inicio).days
-    for i in range(delta_dias + 1):
-        data_atual = data_inicio + timedelta(days=i)
-        
-        eh_fim_de_semana = data_atual.weekday() >= 5
-        eh_feriado = data_atual in feriados_br
-        nome_feriado = feriados_br.get(data_atual) if eh_feriado else ""
-        
-        dias_do_mes.append({
-            'data': data_atual,
-            'dia_semana_nome': DIAS_SEMANA_PT[data_atual.weekday()],
-            'eh_fim_de_semana': eh_fim_de_semana,
-            'eh_feriado': eh_feriado,
-            'nome_feriado': nome_feriado.upper() if nome_feriado else "",
-            'registro': registros_dict.get(data_atual.day) 
-        })
+    dias_do_mes = calendario.com_registros(registros_banco)
 
     mes_anterior_num = data_inicio.month
     nome_mes_composto = f"{MESES_PT[mes_anterior_num]}/{MESES_PT[mes_solicitado]}"
@@ -520,13 +375,12 @@ class CustomPasswordResetDoneView(PasswordResetView):
 
 @login_required
 def area_gestor_view(request):
-    try:
-        gestor = Funcionario.objects.get(usuario=request.user)
-        equipes_lideradas = gestor.equipes_lideradas.all()
-    except Funcionario.DoesNotExist:
+    gestor = funcionario_logado(request)
+    if gestor is None:
         return redirect('home')
 
-    if not equipes_lideradas.exists() and not request.user.is_superuser:
+    equipes_lideradas = perfil_acesso(request).equipes_lideradas
+    if not equipes_lideradas and not request.user.is_superuser:
         return HttpResponse("Acesso negado. Você não é gestor de nenhuma equipe.")
 
     # --- LÓGICA DE NAVEGAÇÃO ---
@@ -560,26 +414,18 @@ def area_gestor_view(request):
     
     # ---------------------------
 
-    data_inicio, data_fim = get_datas_competencia(mes_solicitado, ano_solicitado)
-    
     funcionarios = Funcionario.objects.filter(
         equipe__in=equipes_lideradas
-    ).exclude(id=gestor.id).distinct()
+    ).exclude(id=gestor.id).distinct().com_status_folha(mes_solicitado, ano_solicitado)
     
     lista_equipe = []
     
     for func in funcionarios:
-        pontos = RegistroPonto.objects.filter(
-            funcionario=func, 
-            data__range=[data_inicio, data_fim]
-        )
-        
-        assinado_func = pontos.filter(assinado_funcionario=True).exists()
-        assinado_gest = pontos.filter(assinado_gestor=True).exists()
+        assinado_func = bool(func.folha_assinado_funcionario)
+        assinado_gest = bool(func.folha_assinado_gestor)
         pode_assinar = assinado_func and not assinado_gest
         
-        ponto_com_arquivo = pontos.exclude(arquivo_anexo='').first()
-        url_arquivo = ponto_com_arquivo.arquivo_anexo.url if ponto_com_arquivo and ponto_com_arquivo.arquivo_anexo else None
+        url_arquivo = url_arquivo_folha(func.folha_arquivo)
 
         nome_limpo = func.nome_completo.strip().replace(' ', '_')
         nome_download = f"Folha_{nome_limpo}_{mes_solicitado:02d}_{ano_solicitado}.pdf"
@@ -607,15 +453,10 @@ def area_gestor_view(request):
 def assinar_ponto_gestor(request, func_id, mes, ano):
     if request.method != 'POST':
         return redirect('area_gestor')
-    gestor = Funcionario.objects.get(usuario=request.user)
-    equipes_gestor = gestor.equipes_lideradas.all()
     alvo = Funcionario.objects.get(id=func_id)
     
-    
-    equipes_alvo = [alvo.equipe] + list(alvo.outras_equipes.all())
-    equipes_gestor = gestor.equipes_lideradas.all()
-    
-    is_authorized = any(e in equipes_gestor for e in equipes_alvo if e)
+    equipes_alvo = [alvo.equipe_id, *alvo.outras_equipes.values_list('id', flat=True)]
+    is_authorized = perfil_acesso(request).lidera_alguma(equipes_alvo)
 
     if not is_authorized and not request.user.is_superuser:
         messages.error(request, "Permissão negada.")
@@ -630,22 +471,13 @@ def assinar_ponto_gestor(request, func_id, mes, ano):
         nome_limpo = alvo.nome_completo.strip().replace(' ', '_')
         arquivo.name = f"Folha_{nome_limpo}_{mes}_{ano}_Assinada_Gestor.pdf"
         
-        registros = RegistroPonto.objects.filter(
-            funcionario=alvo,
-            data__range=[data_inicio, data_fim]
-        )
-        
-        if registros.exists():
-            
-            registros.update(assinado_gestor=True)
-            
-            
-            registro_com_arquivo = registros.exclude(arquivo_anexo='').first()
-            target_reg = registro_com_arquivo if registro_com_arquivo else registros.first()
-            
+        if RegistroPonto.objects.filter(funcionario=alvo, data__range=[data_inicio, data_fim]).exists():
             
-            target_reg.arquivo_anexo = arquivo
-            target_reg.save()
+            folha = FolhaMensal.obter(alvo, mes, ano)
+            folha.arquivo_assinado = arquivo
+            folha.assinado_gestor = True
+            folha.data_assinatura_gestor = timezone.now()
+            folha.save()
             
             messages.success(request, f"Ponto de {alvo.nome_completo} assinado e arquivo atualizado com sucesso!")
         else:
@@ -690,7 +522,7 @@ def historico_funcionario_view(request, func_id):
 
 @login_required
 def rh_summary_view(request):
-    if not usuario_eh_rh(request.user):
+    if not perfil_acesso(request).eh_rh:
         return HttpResponse("Acesso negado.", status=403)
     
     # --- LÓGICA DE NAVEGAÇÃO ---
@@ -714,32 +546,20 @@ def rh_summary_view(request):
         return redirect(f"{reverse('rh_summary')}?mes={mes_real}&ano={ano_real}")
     # ---------------------------
 
+    # Contagens de todas as equipes numa consulta só (ver ponto.resumo_equipes)
+    contagens = resumo_equipes(mes_solicitado, ano_solicitado)
     data_inicio, data_fim = get_datas_competencia(mes_solicitado, ano_solicitado)
-    
-    todas_equipes = Equipe.objects.all().order_by('nome')
+    horas_empresa = totais_horas(RegistroPonto.objects.filter(data__range=[data_inicio, data_fim]))
     resumo_rh = []
     
-    for equipe in todas_equipes:
-        membros = Funcionario.objects.filter(
-            Q(equipe=equipe) | Q(outras_equipes=equipe)
-        ).distinct()
-        
-        total_funcionarios_ativos = membros.count()
-        
-        membros_com_ponto = RegistroPonto.objects.filter(
-            funcionario__in=membros,
-            data__range=[data_inicio, data_fim]
-        ).values('funcionario').distinct().count()
-        
-        assinados_gestor = RegistroPonto.objects.filter(
-            funcionario__in=membros,
-            data__range=[data_inicio, data_fim],
-            assinado_gestor=True
-        ).values('funcionario').distinct().count()
+    for equipe in Equipe.objects.all().order_by('nome'):
+        dados = contagens.get(equipe.id, RESUMO_VAZIO)
+        membros_com_ponto = dados['total_pontos_enviados']
+        assinados_gestor = dados['total_assinados_gestor']
 
         resumo_rh.append({
             'equipe': equipe,
-            'total_membros': total_funcionarios_ativos,
+            'total_membros': dados['total_membros'],
             'total_pontos_enviados': membros_com_ponto,
             'total_assinados_gestor': assinados_gestor,
             'status_formatado': f"{assinados_gestor}/{membros_com_ponto}" if membros_com_ponto > 0 else "0/0",
@@ -749,6 +569,7 @@ def rh_summary_view(request):
 
     return render(request, 'core_rh/rh_summary.html', {
         'resumo_rh': resumo_rh,
+        **horas_empresa,
         'mes_atual': MESES_PT.get(mes_solicitado), # Nome do mês
         'mes_num': mes_solicitado, # Número para links
         'ano_atual': ano_solicitado,
@@ -758,7 +579,7 @@ def rh_summary_view(request):
 
 @login_required
 def rh_team_detail_view(request, equipe_id):
-    if not usuario_eh_rh(request.user):
+    if not perfil_acesso(request).eh_rh:
         return HttpResponse("Acesso negado.", status=403)
 
     equipe = get_object_or_404(Equipe, id=equipe_id)
@@ -784,23 +605,15 @@ def rh_team_detail_view(request, equipe_id):
         return redirect(f"{reverse('rh_team_detail', args=[equipe_id])}?mes={mes_real}&ano={ano_real}")
     # ---------------------------
 
+    membros = Funcionario.objects.filter(equipe=equipe).com_status_folha(mes_solicitado, ano_solicitado).order_by('nome_completo')
     data_inicio, data_fim = get_datas_competencia(mes_solicitado, ano_solicitado)
-
-    membros = Funcionario.objects.filter(equipe=equipe).order_by('nome_completo')
+    horas_equipe = totais_horas(RegistroPonto.objects.filter(funcionario__equipe=equipe, data__range=[data_inicio, data_fim]))
     lista_colaboradores = []
 
     for func in membros:
-        pontos_mes = RegistroPonto.objects.filter(
-            funcionario=func, 
-            data__range=[data_inicio, data_fim]
-        )
-        
-        registro_status = pontos_mes.first()
-        status_func = registro_status.assinado_funcionario if registro_status else False
-        status_gestor = registro_status.assinado_gestor if registro_status else False
-        
-        anexo_reg = pontos_mes.exclude(arquivo_anexo='').first()
-        url_arquivo = anexo_reg.arquivo_anexo.url if anexo_reg and anexo_reg.arquivo_anexo else None
+        status_func = bool(func.folha_assinado_funcionario)
+        status_gestor = bool(func.folha_assinado_gestor)
+        url_arquivo = url_arquivo_folha(func.folha_arquivo)
         
         nome_limpo = func.nome_completo.strip().replace(' ', '_')
         nome_para_download = f"Folha_{nome_limpo}_{mes_solicitado:02d}_{ano_solicitado}.pdf"
@@ -818,6 +631,7 @@ def rh_team_detail_view(request, equipe_id):
     return render(request, 'core_rh/rh_team_detail.html', {
         'equipe': equipe,
         'lista_colaboradores': lista_colaboradores,
+        **horas_equipe,
         'mes_atual': MESES_PT.get(mes_solicitado),
         'mes_num': mes_solicitado,
         'ano_atual': ano_solicitado,
@@ -825,80 +639,102 @@ def rh_team_detail_view(request, equipe_id):
         'nav_proximo': nav_proximo,
     })
 
+@login_required
 def rh_batch_download_view(request, equipe_id):
     """
-    Gera um ZIP com todos os PDFs assinados da equipe no mês selecionado.
+    Envia um ZIP com todos os PDFs assinados da equipe na competência selecionada.
+    O arquivo é montado enquanto é transmitido (memória constante, sem recompressão).
     Em caso de erro, redireciona de volta para a página atual com um alerta.
     """
+    if not (request.user.is_staff or perfil_acesso(request).eh_rh):
+        return HttpResponse("Acesso negado.", status=403)
+
     # 1. Captura parâmetros e Equipe
     equipe = get_object_or_404(Equipe, pk=equipe_id)
-    mes = request.GET.get('mes')
-    ano = request.GET.get('ano')
-
-    # Validação básica
-    if not mes or not ano:
+    try:
+        mes = int(request.GET.get('mes'))
+        ano = int(request.GET.get('ano'))
+    except (TypeError, ValueError):
         messages.error(request, "Mês e Ano não informados para download.")
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
-    # 2. Busca os registros com arquivo assinado
-    registros = RegistroPonto.objects.filter(
+    # 2. Uma consulta só: folhas da competência (16 a 15) com arquivo assinado + funcionário
+    folhas = list(FolhaMensal.objects.filter(
         funcionario__equipe=equipe,
-        data__month=mes,
-        data__year=ano
-    ).exclude(arquivo_anexo='').exclude(arquivo_anexo__isnull=True)
+        competencia=FolhaMensal.competencia_de(mes, ano)
+    ).exclude(arquivo_assinado='').exclude(arquivo_assinado__isnull=True)
+     .select_related('funcionario').order_by('funcionario__nome_completo'))
 
     # 3. Se não tiver arquivos, avisa e volta (NÃO renderiza página antiga)
-    if not registros.exists():
+    if not folhas:
         messages.warning(request, f"Nenhum ponto assinado encontrado para a equipe {equipe.nome} em {mes}/{ano}.")
         # O segredo: volta para a página de onde veio (o Admin)
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
-    # 4. Gera o ZIP em memória
-    zip_buffer = io.BytesIO()
-    arquivos_adicionados = 0
-
-    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-        for ponto in registros:
-            try:
-                # Caminho físico do arquivo
-                file_path = ponto.arquivo_anexo.path
-                if os.path.exists(file_path):
-                    # Nome bonito dentro do ZIP: "NomeFuncionario_Data.pdf"
-                    file_name = f"{ponto.funcionario.nome_completo}_{ponto.data.strftime('%d-%m-%Y')}.pdf"
-                    zip_file.write(file_path, file_name)
-                    arquivos_adicionados += 1
-            except Exception as e:
-                # Loga o erro mas tenta continuar com os outros
-                print(f"Erro ao adicionar arquivo {ponto}: {e}")
-                continue
-
-    # 5. Verifica se o ZIP não ficou vazio (arquivos podem não existir no disco)
-    if arquivos_adicionados == 0:
+    # 4. Descarta arquivos que sumiram do disco antes de começar a enviar
+    folhas = [f for f in folhas if f.arquivo_assinado.storage.exists(f.arquivo_assinado.name)]
+    if not folhas:
         messages.error(request, "Arquivos físicos não encontrados no servidor.")
         return redirect(request.META.get('HTTP_REFERER', '/'))
 
-    # 6. Finaliza e entrega o download
-    zip_buffer.seek(0)
-    response = HttpResponse(zip_buffer, content_type='application/zip')
+    # 5. Nome bonito dentro do ZIP: "NomeFuncionario_MM-AAAA.pdf"
+    arquivos = (
+        (f"{folha.funcionario.nome_completo}_{folha.competencia.strftime('%m-%Y')}.pdf", folha.arquivo_assinado)
+        for folha in folhas
+    )
+    response = StreamingHttpResponse(zip_em_stream(arquivos), content_type='application/zip')
     nome_zip = f"Pontos_{equipe.nome}_{mes}_{ano}.zip"
     response['Content-Disposition'] = f'attachment; filename="{nome_zip}"'
     
     return response
+
+@login_required
+def rh_gerar_folhas_lote_view(request, equipe_id=None):
+    """Gera (em segundo plano) as folhas de ponto da equipe, ou da empresa toda, num único ZIP."""
+    if not perfil_acesso(request).eh_rh:
+        return HttpResponse("Acesso negado.", status=403)
+
+    mes_atual, ano_atual = get_competencia_atual()
+    try:
+        mes = int(request.GET.get('mes', mes_atual))
+        ano = int(request.GET.get('ano', ano_atual))
+    except ValueError: return HttpResponse("Parâmetros inválidos.", status=400)
+
+    if equipe_id is not None:
+        get_object_or_404(Equipe, pk=equipe_id)
+
+    job = enfileirar('folhas_ponto_lote', {'equipe_id': equipe_id, 'mes': mes, 'ano': ano}, usuario=request.user)
+    return redirect('acompanhar_job', job_id=job.id)
+
+@login_required
+def rh_gerar_avisos_ferias_lote_view(request):
+    """Gera (em segundo plano) os avisos de todas as férias que começam no mês e baixa num ZIP."""
+    if not (request.user.is_staff or perfil_acesso(request).eh_rh):
+        return HttpResponse("Acesso negado.", status=403)
+
+    hoje = timezone.now().date()
+    try:
+        mes = int(request.GET.get('mes', hoje.month))
+        ano = int(request.GET.get('ano', hoje.year))
+        date(ano, mes, 1)
+    except ValueError: return HttpResponse("Parâmetros inválidos.", status=400)
+
+    job = enfileirar('avisos_ferias_lote', {'mes': mes, 'ano': ano}, usuario=request.user)
+    return redirect('acompanhar_job', job_id=job.id)
+
 @login_required
 def rh_unlock_timesheet_view(request, func_id, mes, ano):
-    if not usuario_eh_rh(request.user):
+    if not perfil_acesso(request).eh_rh:
         return HttpResponse("Acesso negado. Perfil RH necessário.", status=403)
         
     funcionario = get_object_or_404(Funcionario, id=func_id)
-    data_inicio, data_fim = get_datas_competencia(mes, ano)
 
-    registros = RegistroPonto.objects.filter(
+    desbloqueadas = FolhaMensal.objects.filter(
         funcionario=funcionario,
-        data__range=[data_inicio, data_fim]
-    )
+        competencia=FolhaMensal.competencia_de(mes, ano)
+    ).update(assinado_gestor=False, data_assinatura_gestor=None, updated_at=timezone.now())
 
-    if registros.exists():
-        registros.update(assinado_gestor=False)
+    if desbloqueadas:
         messages.success(request, f"Folha de {funcionario.nome_completo} desbloqueada com sucesso!")
     else:
         messages.error(request, "Nenhum registro encontrado para desbloquear.")
@@ -909,11 +745,9 @@ def rh_unlock_timesheet_view(request, func_id, mes, ano):
 
 @login_required
 def trocar_senha_obrigatoria(request):
-    try:
-        funcionario = request.user.funcionario
-        if not funcionario.primeiro_acesso:
-            return redirect('home')
-    except Funcionario.DoesNotExist:
+    funcionario = funcionario_logado(request)
+    if funcionario is None or not funcionario.primeiro_acesso:
+        request.session[SESSAO_PRIMEIRO_ACESSO] = False
         return redirect('home')
 
     if request.method == 'POST':
@@ -922,7 +756,8 @@ def trocar_senha_obrigatoria(request):
             user = form.save()
             update_session_auth_hash(request, user)
             funcionario.primeiro_acesso = False
-            funcionario.save()
+            funcionario.save(update_fields=['primeiro_acesso'])
+            request.session[SESSAO_PRIMEIRO_ACESSO] = False
             messages.success(request, 'Senha atualizada com sucesso! Bem-vindo.')
             return redirect('home')
         else:
@@ -932,12 +767,6 @@ def trocar_senha_obrigatoria(request):
         
     return render(request, 'core_rh/trocar_senha.html', {'form': form})
 
-def format_delta(td):
-    total_seconds = int(td.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    return f"{hours:02}:{minutes:02}"
-
 # core_rh/views.py (Adicione ao final)
 
 # --- COLE ISTO NO FINAL DO ARQUIVO core_rh/views.py ---
@@ -948,7 +777,7 @@ def admin_ponto_partial_view(request, func_id):
     Retorna o HTML da folha de ponto individual para a aba do Admin.
     """
     # Verifica se é RH ou Superuser
-    if not usuario_eh_rh(request.user):
+    if not perfil_acesso(request).eh_rh:
         return HttpResponse("Acesso negado", status=403)
 
     funcionario = get_object_or_404(Funcionario, pk=func_id)
@@ -978,28 +807,8 @@ def admin_ponto_partial_view(request, func_id):
         data__range=[data_inicio, data_fim]
     ).order_by('data')
 
-    registros_dict = {r.data.day: r for r in registros}
-    dias_do_mes = []
-    
-    # Feriados
-    feriados_br = holidays.BR(state='DF', years=ano)
-    if hasattr(funcionario, 'estado_sigla') and funcionario.estado_sigla:
-         try:
-             feriados_br = holidays.BR(state=funcionario.estado_sigla, years=ano)
-         except: pass
-
-    delta_dias = (data_fim - data_inicio).days
-    for i in range(delta_dias + 1):
-        data_atual = data_inicio + timedelta(days=i)
-        eh_feriado = data_atual in feriados_br
-        
-        dias_do_mes.append({
-            'data': data_atual,
-            'dia_semana_nome': DIAS_SEMANA_PT[data_atual.weekday()],
-            'eh_feriado': eh_feriado,
-            'nome_feriado': feriados_br.get(data_atual).upper() if eh_feriado else "",
-            'registro': registros_dict.get(data_atual.day)
-        })
+    # Feriados pela UF do funcionário (calendário compartilhado entre requisições)
+    dias_do_mes = get_calendario_competencia(funcionario.estado, mes, ano).com_registros(registros)
 
     context = {
         'funcionario': funcionario,
@@ -1028,7 +837,7 @@ def admin_gestor_partial_view(request):
     View parcial do painel de RH (renderizada via AJAX).
     Gerencia tanto o Modo Lista (Funcionários) quanto o Modo Resumo (Equipes).
     """
-    if not usuario_eh_rh(request.user):
+    if not perfil_acesso(request).eh_rh:
         return HttpResponse('<div class="alert alert-danger">Acesso Negado.</div>', status=403)
 
     # 1. Parâmetros
@@ -1040,12 +849,14 @@ def admin_gestor_partial_view(request):
         equipe_id = request.GET.get('equipe_id', '')
         estado_filtro = request.GET.get('estado', '') # Filtro de UF
         q = request.GET.get('q', '').strip() # Busca
+        cursor = request.GET.get('cursor', '') # Próxima página (carregamento incremental)
     except ValueError:
         mes, ano = mes_real, ano_real
         mode = 'list'
         equipe_id = ''
         estado_filtro = ''
         q = ''
+        cursor = ''
 
     # 2. Navegação de Datas
     mes_ant, ano_ant = get_competencia_anterior(mes, ano)
@@ -1076,13 +887,12 @@ def admin_gestor_partial_view(request):
         if q:
             todas_equipes = todas_equipes.filter(nome__icontains=q)
 
+        contagens = resumo_equipes(mes, ano)
         resumo_rh = []
         for equipe in todas_equipes:
-            membros = Funcionario.objects.filter(Q(equipe=equipe) | Q(outras_equipes=equipe)).distinct()
-            total = membros.count()
-            assinados = RegistroPonto.objects.filter(
-                funcionario__in=membros, data__range=[data_inicio, data_fim], assinado_gestor=True
-            ).values('funcionario').distinct().count()
+            dados = contagens.get(equipe.id, RESUMO_VAZIO)
+            total = dados['total_membros']
+            assinados = dados['total_assinados_gestor']
             
             progresso = int((assinados / total * 100)) if total > 0 else 0
             
@@ -1109,26 +919,23 @@ def admin_gestor_partial_view(request):
                 funcionarios_query = funcionarios_query.filter(Q(equipe=eq) | Q(outras_equipes=eq))
             except: pass
         
-        # 3. Busca Texto (Nome do Funcionário)
+        # 3. Busca Texto (Nome ou Matrícula, ordenada por semelhança)
         if q:
-            funcionarios_query = funcionarios_query.filter(nome_completo__icontains=q)
+            funcionarios_query = buscar_funcionarios(funcionarios_query, q)
             
-        funcionarios = funcionarios_query.distinct().order_by('nome_completo')
+        funcionarios, proximo_cursor = paginar_por_nome(
+            funcionarios_query.distinct().com_status_folha(mes, ano), cursor, por_relevancia=bool(q)
+        )
         
         # Dados da Tabela
         lista_colaboradores = []
         for func in funcionarios:
-            pontos = RegistroPonto.objects.filter(funcionario=func, data__range=[data_inicio, data_fim])
-            
-            status_func = pontos.filter(assinado_funcionario=True).exists()
-            status_gestor = pontos.filter(assinado_gestor=True).exists()
-            reg_anexo = pontos.exclude(arquivo_anexo='').first()
-            url_anexo = reg_anexo.arquivo_anexo.url if reg_anexo and reg_anexo.arquivo_anexo else None
+            url_anexo = url_arquivo_folha(func.folha_arquivo)
             
             lista_colaboradores.append({
                 'funcionario': func,
-                'status_func': status_func,
-                'status_gestor': status_gestor,
+                'status_func': bool(func.folha_assinado_funcionario),
+                'status_gestor': bool(func.folha_assinado_gestor),
                 'arquivo_anexo': url_anexo,
                 'nome_download': f"Folha_{func.nome_completo.strip().replace(' ', '_')}_{mes:02d}_{ano}.pdf",
                 'mes': mes, 
@@ -1136,6 +943,12 @@ def admin_gestor_partial_view(request):
             })
             
         context['lista_colaboradores'] = lista_colaboradores
+        context['cursor'] = cursor
+        context['proxima_pagina'] = url_proxima_pagina(request, proximo_cursor)
+
+        # Páginas seguintes: só as linhas, anexadas à tabela pelo painel
+        if cursor:
+            return render(request, 'core_rh/includes/rh_area_linhas.html', context)
 
         # --- DADOS PARA OS DROPDOWNS (FILTROS) ---
         # A. Estados Disponíveis
@@ -1162,9 +975,8 @@ except ImportError:
 
 @login_required
 def minhas_ferias_view(request):
-    try:
-        funcionario = Funcionario.objects.get(usuario=request.user)
-    except Funcionario.DoesNotExist:
+    funcionario = funcionario_logado(request)
+    if funcionario is None:
         return redirect('home')
     
     lista_ferias = Ferias.objects.filter(funcionario=funcionario).order_by('-data_inicio')
@@ -1200,46 +1012,25 @@ try:
 except ImportError:
     pass
 
-@login_required
 @login_required
 def gerar_aviso_ferias_pdf(request, ferias_id):
     # Garante que é admin ou RH para gerar
-    if not (request.user.is_staff or usuario_eh_rh(request.user)):
+    if not (request.user.is_staff or perfil_acesso(request).eh_rh):
         return redirect('home')
         
-    ferias = get_object_or_404(Ferias, id=ferias_id)
-    func = ferias.funcionario
-    
-    # Dados calculados
-    dias_ferias = (ferias.data_fim - ferias.data_inicio).days + 1
-    
-    # HTML do Documento
-    html_string = render_to_string('core_rh/pdf_aviso_ferias.html', {
-        'ferias': ferias,
-        'func': func,
-        'dias_ferias': dias_ferias,
-        'hoje': timezone.now()
-    })
-
-    # Gera o PDF
-    # 'optimize_size' ajuda um pouco na velocidade e tamanho final
-    html = HTML(string=html_string)
-    pdf_file = html.write_pdf(optimize_size=('fonts', 'images'))
+    ferias = get_object_or_404(Ferias.objects.select_related('funcionario__cargo', 'funcionario__equipe'), id=ferias_id)
 
-    # Configura o nome do arquivo
-    nome_func = func.nome_completo.strip().replace(' ', '_')
-    periodo_limpo = ferias.periodo_aquisitivo.replace('/', '-')
-    filename = f"Notificação_de_Férias-{nome_func}-{periodo_limpo}.pdf"
+    # O aviso é gerado ao salvar o agendamento (ver signal_gerar_aviso_ferias): normalmente só entrega o arquivo
+    if aviso_ferias_atualizado(ferias):
+        return FileResponse(ferias.arquivo_aviso.open('rb'), as_attachment=True, filename=nome_arquivo_aviso_ferias(ferias))
 
-    # Retorna para download (attachment força o download)
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    # Ainda não gerado (ou dados mudaram): o worker gera, guarda e a tela baixa quando terminar
+    job = enfileirar_aviso_ferias(ferias.id, usuario=request.user, baixar=True)
+    return redirect('acompanhar_job', job_id=job.id)
 @login_required
 def admin_ferias_partial_view(request):
-    # --- CORREÇÃO AQUI: Usa a função usuario_eh_rh em vez de só is_staff ---
-    if not (request.user.is_staff or usuario_eh_rh(request.user)):
+    # --- CORREÇÃO AQUI: Usa o perfil de acesso (RH) em vez de só is_staff ---
+    if not (request.user.is_staff or perfil_acesso(request).eh_rh):
         return HttpResponse("Acesso negado", status=403)
     # Filtros Básicos
     q = request.GET.get('q', '').strip()
@@ -1278,17 +1069,17 @@ def admin_ferias_partial_view(request):
 
     # Filtro de Busca (Nome ou Matrícula)
     if q:
-        ferias_qs = ferias_qs.filter(
-            Q(funcionario__nome_completo__icontains=q) | 
-            Q(funcionario__matricula__icontains=q)
-        )
+        ferias_qs = buscar_funcionarios(ferias_qs, q, prefixo='funcionario__')
 
     # Filtro de Status
     if status_filtro:
         ferias_qs = ferias_qs.filter(status=status_filtro)
 
-    # Ordenação
-    ferias_qs = ferias_qs.order_by('data_inicio')
+    # Ordenação (na busca, os mais parecidos primeiro)
+    if q:
+        ferias_qs = ferias_qs.order_by('-relevancia', 'data_inicio')
+    else:
+        ferias_qs = ferias_qs.order_by('data_inicio')
 
     context = {
         'lista_ferias': ferias_qs,
@@ -1310,16 +1101,54 @@ def admin_ferias_partial_view(request):
 
 @login_required
 def meus_contracheques(request):
-    try:
-        funcionario = request.user.funcionario
+    funcionario = funcionario_logado(request)
+    if funcionario is not None:
         # Pega todos os contracheques desse funcionário
         lista = Contracheque.objects.filter(funcionario=funcionario).order_by('-ano', '-mes')
-    except AttributeError:
+    else:
         lista = []
         messages.error(request, "Seu usuário não está vinculado a um funcionário.")
 
     return render(request, 'core_rh/meus_contracheques.html', {'lista': lista})
 
+def _contracheque_do_usuario(request, pk):
+    """O próprio funcionário ou o RH; para os outros o contracheque 'não existe'."""
+    contracheque = get_object_or_404(Contracheque.objects.select_related('funcionario'), pk=pk)
+    if contracheque.funcionario.usuario_id != request.user.id and not (request.user.is_staff or perfil_acesso(request).eh_rh):
+        raise Http404
+    return contracheque
+
+@login_required
+def contracheque_miniatura_view(request, pk):
+    """PNG da primeira página, usado nos cartões de Meus Contracheques."""
+    contracheque = _contracheque_do_usuario(request, pk)
+    miniatura = obter_miniatura(contracheque)
+    if miniatura is None:
+        raise Http404
+
+    # O nome do blob é o hash do PNG: serve de ETag e o navegador recebe 304 enquanto não mudar
+    etag = f'"{os.path.splitext(os.path.basename(miniatura.name))[0]}"'
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    response = FileResponse(miniatura.open('rb'), content_type='image/png')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+def contracheque_pdf_view(request, pk):
+    """PDF completo, carregado só quando o cartão é aberto (ou baixado com ?download=1)."""
+    contracheque = _contracheque_do_usuario(request, pk)
+    if not contracheque.arquivo:
+        raise Http404
+    nome = f"Contracheque_{contracheque.mes:02d}_{contracheque.ano}.pdf"
+    return FileResponse(
+        contracheque.arquivo.open('rb'), content_type='application/pdf',
+        as_attachment=bool(request.GET.get('download')), filename=nome,
+    )
+
 @login_required
 def assinar_contracheque_local(request, pk):
     if request.method == "POST":
@@ -1359,6 +1188,7 @@ def admin_contracheque_partial(request):
         ano_atual = hoje.year
 
     termo_busca = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor', '')
 
     # 2. Navegação (Mês Anterior / Próximo)
     mes_anterior = mes_atual - 1 if mes_atual > 1 else 12
@@ -1367,19 +1197,21 @@ def admin_contracheque_partial(request):
     mes_proximo = mes_atual + 1 if mes_atual < 12 else 1
     ano_proximo = ano_atual if mes_atual < 12 else ano_atual + 1
 
-    # 3. Buscar Funcionários
-    funcionarios = Funcionario.objects.all().order_by('nome_completo')
+    # 3. Buscar Funcionários (uma página por vez)
+    funcionarios = Funcionario.objects.select_related('cargo')
     
     if termo_busca:
-        funcionarios = funcionarios.filter(nome_completo__icontains=termo_busca)
+        funcionarios = buscar_funcionarios(funcionarios, termo_busca)
+
+    funcionarios, proximo_cursor = paginar_por_nome(funcionarios, cursor, por_relevancia=bool(termo_busca))
 
     # 4. Montar a Lista com Status
     lista_equipe = []
     
-    # Busca otimizada dos contracheques do mês
+    # Busca otimizada dos contracheques do mês (só dos funcionários da página)
     contracheques_mes = {
         cc.funcionario_id: cc 
-        for cc in Contracheque.objects.filter(mes=mes_atual, ano=ano_atual)
+        for cc in Contracheque.objects.filter(mes=mes_atual, ano=ano_atual, funcionario__in=[f.id for f in funcionarios])
     }
 
     for func in funcionarios:
@@ -1405,7 +1237,13 @@ def admin_contracheque_partial(request):
         'nav_proximo': {'mes': mes_proximo, 'ano': ano_proximo},
         'q': termo_busca,
         'meses_choices': Contracheque.MESES, 
+        'cursor': cursor,
+        'proxima_pagina': url_proxima_pagina(request, proximo_cursor),
     }
+
+    # Páginas seguintes: só as linhas, anexadas à tabela pelo painel
+    if cursor:
+        return render(request, 'core_rh/includes/rh_contracheque_linhas.html', context)
     
     # Aponta para o include que você criou
     return render(request, 'core_rh/includes/rh_contracheque_moderno.html', context)
@@ -1420,8 +1258,6 @@ from django.urls import reverse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.files.base import ContentFile
-import io
 
 try:
     from pypdf import PdfReader, PdfWriter
@@ -1443,7 +1279,7 @@ def gerenciar_contracheques(request):
     next_url = request.POST.get('next') or request.GET.get('next') or fallback_url
 
     # 2. Verificação de Permissão
-    if not (request.user.is_staff or usuario_eh_rh(request.user)):
+    if not (request.user.is_staff or perfil_acesso(request).eh_rh):
         return render(request, 'core_rh/upload_log.html', {
             'erro_critico': 'Acesso Negado: Você não tem permissão para acessar esta área.',
             'next_url': next_url
@@ -1467,74 +1303,97 @@ def gerenciar_contracheques(request):
         })
 
     try:
-        arquivo = request.FILES['arquivo_pdf']
         mes_upload = int(request.POST.get('mes_upload'))
         ano_upload = int(request.POST.get('ano_upload'))
+    except (TypeError, ValueError):
+        return render(request, 'core_rh/upload_log.html', {
+            'erro_critico': 'Mês/ano de referência inválidos.',
+            'next_url': next_url
+        })
 
-        try:
-            reader = PdfReader(arquivo)
-        except Exception as e:
-            raise Exception(f"Arquivo inválido ou corrompido: {str(e)}")
+    # O PDF fica salvo no Job e a divisão roda no worker; o log é exibido em acompanhar_job_view
+    job = enfileirar(
+        'contracheques', {'mes': mes_upload, 'ano': ano_upload, 'next_url': next_url},
+        usuario=request.user, arquivo_entrada=request.FILES['arquivo_pdf'],
+    )
+    return redirect('acompanhar_job', job_id=job.id)
 
-        funcionarios_db = Funcionario.objects.all()
-        log_sucesso = []
-        log_erro = []
-        
-        for i, page in enumerate(reader.pages):
-            try:
-                texto = page.extract_text() or ""
-                texto = texto.upper()
-            except:
-                texto = ""
 
-            encontrou = False
-            
-            for func in funcionarios_db:
-                # Normaliza para evitar erros de espaços
-                nome_busca = func.nome_completo.strip().upper()
-                
-                if nome_busca and nome_busca in texto:
-                    writer = PdfWriter()
-                    writer.add_page(page)
-                    pdf_bytes = io.BytesIO()
-                    writer.write(pdf_bytes)
-                    
-                    cc, created = Contracheque.objects.update_or_create(
-                        funcionario=func, mes=mes_upload, ano=ano_upload,
-                        defaults={'arquivo': None}
-                    )
-                    
-                    nome_arq = f"holerite_{func.id}_{mes_upload}_{ano_upload}.pdf"
-                    cc.arquivo.save(nome_arq, ContentFile(pdf_bytes.getvalue()))
-                    
-                    log_sucesso.append({
-                        'pagina': i + 1,
-                        'nome': func.nome_completo,
-                        'status': 'Criado' if created else 'Atualizado'
-                    })
-                    encontrou = True
-                    break 
-            
-            if not encontrou:
-                log_erro.append({
-                    'pagina': i + 1,
-                    'motivo': 'Nome não encontrado no texto.'
-                })
-
-        # Renderiza o Log passando a next_url correta (/admin/core_rh/funcionario/)
-        context = {
+# --- TAREFAS EM SEGUNDO PLANO (ver core_rh/jobs.py) ---
+
+def _job_do_usuario(request, job_id):
+    job = get_object_or_404(Job, id=job_id)
+    if job.criado_por_id != request.user.id and not (request.user.is_staff or perfil_acesso(request).eh_rh):
+        raise Http404
+    return job
+
+@login_required
+def acompanhar_job_view(request, job_id):
+    """Tela de espera: consulta job_status_view até o job terminar."""
+    job = _job_do_usuario(request, job_id)
+
+    if job.tipo != 'contracheques':
+        return render(request, 'core_rh/job_aguardando.html', {'job': job})
+
+    parametros = job.parametros
+    context = {
+        'job': job,
+        'mes_nome': dict(Contracheque.MESES).get(parametros['mes'], parametros['mes']),
+        'ano': parametros['ano'],
+        'next_url': parametros.get('next_url'),
+    }
+    if job.status == 'erro':
+        context['erro_critico'] = f"Erro no processamento: {job.erro.strip().splitlines()[-1] if job.erro else ''}"
+    elif job.status == 'concluido':
+        log_sucesso, log_erro = job.resultado['log_sucesso'], job.resultado['log_erro']
+        context.update({
             'log_sucesso': log_sucesso,
             'log_erro': log_erro,
             'total_sucesso': len(log_sucesso),
             'total_erro': len(log_erro),
-            'mes_nome': dict(Contracheque.MESES).get(mes_upload, mes_upload),
-            'ano': ano_upload,
-            'next_url': next_url, 
-        }
-        return render(request, 'core_rh/upload_log.html', context)
+        })
+    return render(request, 'core_rh/upload_log.html', context)
 
-    except Exception as e:
-        return render(request, 'core_rh/upload_log.html', {
-            'erro_critico': f"Erro no processamento: {str(e)}",
-            'next_url': next_url
-        })
\ No newline at end of file
+@login_required
+def job_status_view(request, job_id):
+    job = _job_do_usuario(request, job_id)
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finalizado': job.finalizado,
+        'tentativas': job.tentativas,
+        'progresso': job.progresso,
+        # Contagens parciais (ex.: páginas do PDF de contracheques) enquanto o job roda
+        'detalhes': job.resultado if job.status == 'executando' else None,
+        'erro': job.erro.strip().splitlines()[-1] if job.status == 'erro' and job.erro else '',
+        'url_download': reverse('job_download', args=[job.id]) if _job_tem_download(job) else None,
+    })
+
+def _job_tem_download(job):
+    if job.status != 'concluido':
+        return False
+    # Lote de avisos de férias: o ZIP é montado na hora a partir dos arquivos guardados
+    return bool(job.arquivo_resultado) or job.tipo == 'avisos_ferias_lote'
+
+@login_required
+def job_download_view(request, job_id):
+    job = _job_do_usuario(request, job_id)
+    if not _job_tem_download(job):
+        raise Http404
+
+    if job.tipo == 'avisos_ferias_lote':
+        ferias = Ferias.objects.filter(pk__in=job.resultado['ferias_ids']).exclude(arquivo_aviso='') \
+            .select_related('funcionario').order_by('funcionario__nome_completo', 'data_inicio')
+        arquivos, nomes_usados = [], set()
+        for f in ferias:
+            nome = nome_arquivo_aviso_ferias(f)
+            if nome in nomes_usados:
+                nome = f"{f.pk}_{nome}"
+            nomes_usados.add(nome)
+            arquivos.append((nome, f.arquivo_aviso))
+        response = StreamingHttpResponse(zip_em_stream(arquivos), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{job.nome_arquivo}"'
+        return response
+
+    return FileResponse(job.arquivo_resultado.open('rb'), as_attachment=True, filename=job.nome_arquivo)
@@ -11,6 +11,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
 from django.contrib.auth.models import User
+from django.db import transaction
 from core_rh.models import Funcionario, Cargo, Equipe
 
 # --- CONFIGURAÇÕES ---
@@ -52,7 +53,9 @@ def importar():
     # -----------------------------------------------------------
 
     count = 0
-    with f:
+    # Uma transação para o arquivo todo (e um savepoint por linha): os poderes de RH
+    # dos importados são revisados uma vez só, no commit
+    with f, transaction.atomic():
         for linha in leitor:
             try:
                 # Remove espaços em branco das chaves e valores
@@ -77,47 +80,48 @@ def importar():
                 ent, sai_alm, volt_alm, sai = parse_horario_inteligente(horario_str)
                 texto_intervalo = f"{sai_alm} às {volt_alm}"
 
-                # Cria Dependências
-                cargo_obj, _ = Cargo.objects.get_or_create(titulo=cargo_nome)
-                equipe_obj, _ = Equipe.objects.get_or_create(nome=equipe_nome)
-
-                # Verifica usuário
-                if User.objects.filter(username=cpf_limpo).exists():
-                    print(f"PULANDO: {nome} (Usuário já existe)")
-                    continue
-
-                # Cria Login
-                nomes = nome.split()
-                first = nomes[0]
-                last = ' '.join(nomes[1:]) if len(nomes) > 1 else ''
-
-                user = User.objects.create_user(
-                    username=cpf_limpo,
-                    email=email,
-                    password=SENHA_PADRAO,
-                    first_name=first,
-                    last_name=last
-                )
-
-                # Cria Funcionário
-                Funcionario.objects.create(
-                    usuario=user,
-                    nome_completo=nome,
-                    email=email,
-                    cpf=cpf_limpo,
-                    cargo=cargo_obj,
-                    equipe=equipe_obj,
-                    numero_contrato=contrato,
-                    cep=cep,
-                    data_admissao=date.today(),
-                    primeiro_acesso=True,
-                    jornada_entrada=ent,
-                    jornada_saida=sai,
-                    intervalo_padrao=texto_intervalo
-                )
+                with transaction.atomic():
+                    # Cria Dependências
+                    cargo_obj, _ = Cargo.objects.get_or_create(titulo=cargo_nome)
+                    equipe_obj, _ = Equipe.objects.get_or_create(nome=equipe_nome)
+
+                    # Verifica usuário
+                    if User.objects.filter(username=cpf_limpo).exists():
+                        print(f"PULANDO: {nome} (Usuário já existe)")
+                        continue
+
+                    # Cria Login
+                    nomes = nome.split()
+                    first = nomes[0]
+                    last = ' '.join(nomes[1:]) if len(nomes) > 1 else ''
+
+                    user = User.objects.create_user(
+                        username=cpf_limpo,
+                        email=email,
+                        password=SENHA_PADRAO,
+                        first_name=first,
+                        last_name=last
+                    )
+
+                    # Cria Funcionário
+                    Funcionario.objects.create(
+                        usuario=user,
+                        nome_completo=nome,
+                        email=email,
+                        cpf=cpf_limpo,
+                        cargo=cargo_obj,
+                        equipe=equipe_obj,
+                        numero_contrato=contrato,
+                        cep=cep,
+                        data_admissao=date.today(),
+                        primeiro_acesso=True,
+                        jornada_entrada=ent,
+                        jornada_saida=sai,
+                        intervalo_padrao=texto_intervalo
+                    )
                 
-                print(f"SUCESSO: {nome}")
-                count += 1
+                    print(f"SUCESSO: {nome}")
+                    count += 1
 
             except Exception as e:
                 print(f"ERRO na linha de {linha.get('Nome Completo', 'Desconhecido')}: {e}")